@@ -1,11 +1,12 @@
 
 from django.contrib import admin
-from .models import Category, BlogPost
+from . import search
+from .models import Category, BlogPost, SiteStats
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'slug')
+    list_display = ('name', 'slug', 'published_count')
     prepopulated_fields = {'slug': ('name',)}
 
 
@@ -17,9 +18,12 @@ class BlogPostAdmin(admin.ModelAdmin):
     search_fields = ('title', 'content')
     date_hierarchy = 'created_at'
 
+    def get_search_results(self, request, queryset, search_term):
+        # The full-text index instead of LIKE '%term%' over every body
+        return search.filter_queryset(queryset, search_term), False
 
 
-
-
-
-
+@admin.register(SiteStats)
+class SiteStatsAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'total_articles', 'total_categories', 'total_views')
+    readonly_fields = ('total_articles', 'total_categories', 'total_views')
@@ -0,0 +1,160 @@
+# blog/async_views.py
+"""
+Async versions of the busiest public views, used instead of the ones in
+blog/views.py when settings.ASYNC_VIEWS is on (vleaks_project/asgi.py turns
+it on for ASGI deployments, see blog/urls.py).
+
+Same templates, context and caching as the sync views; the difference is
+that independent queries run at the same time. Django's async ORM methods
+(aget, alist, ...) all go through the one thread-sensitive executor, so
+they would still run one after another; gather() gives each query its own
+worker thread (and database connection) instead. Everything a template
+touches is evaluated in the view, since templates can't query from here.
+
+View counting is fire-and-forget (view_counter.record_view_later).
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache as django_cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import close_old_connections
+from django.http import Http404
+from django.shortcuts import render
+from django.utils.safestring import mark_safe
+
+from . import cache, trending, view_counter
+from .conditional import conditional_page, tag_validators
+from .models import BlogPost, Category, RelatedArticle, SiteStats
+from .pagination import KeysetPaginator
+from .views import SIDEBAR_TAGS, detail_validators, legacy_page_redirect
+
+
+def _run(query):
+    try:
+        return query()
+    finally:
+        # Worker threads outlive the request: honour CONN_MAX_AGE as a request would
+        close_old_connections()
+
+
+async def gather(*queries):
+    """Call each function on its own worker thread, concurrently"""
+    return await asyncio.gather(*[
+        sync_to_async(_run, thread_sensitive=False)(query) for query in queries
+    ])
+
+
+@conditional_page(tag_validators(cache.POSTS, cache.CATEGORIES, cache.TRENDING))
+async def home(request):
+    context = await cache.acached(
+        'home_context', [cache.POSTS, cache.CATEGORIES, cache.TRENDING],
+        build_home_context,
+    )
+    return render(request, 'blog/home.html', context)
+
+
+async def build_home_context():
+    """blog.views.build_home_context with the four lookups in parallel"""
+    published = BlogPost.objects.published().for_cards()
+    featured_article, latest_articles, categories, stats = await gather(
+        lambda: next(iter(trending.top(1)), None),
+        lambda: list(published.order_by('-created_at')[:6]),
+        lambda: list(Category.objects.all()),
+        SiteStats.load,
+    )
+    return {
+        'featured_article': featured_article,
+        'latest_articles': latest_articles,
+        'categories': categories,
+        'total_articles': stats.total_articles,
+        'total_categories': stats.total_categories,
+        'total_views': stats.total_views,
+    }
+
+
+@conditional_page(tag_validators(*SIDEBAR_TAGS))
+async def blog_list(request):
+    published = BlogPost.objects.published().for_cards()
+    paginator = KeysetPaginator(
+        published, 5, count=lambda: SiteStats.load().total_articles
+    )
+    if redirect := await sync_to_async(legacy_page_redirect)(request, paginator):
+        return redirect
+    cursor = request.GET.get('cursor')
+
+    # The sidebar fragment is looked up here rather than by {% cache %},
+    # so its four queries only run when it has to be rendered
+    sidebar_version = await cache.aversion_key(*SIDEBAR_TAGS)
+    sidebar_html = await django_cache.aget(
+        make_template_fragment_key('blog_list_sidebar', [sidebar_version])
+    )
+    queries = [lambda: paginator.get_page(cursor), lambda: paginator.count]
+    if sidebar_html is None:
+        queries += [
+            lambda: list(published.order_by('-created_at')[:3]),
+            lambda: trending.top(5),
+            lambda: list(published.filter(recommended=True).order_by('-created_at')[:3]),
+            lambda: list(Category.objects.all()),
+        ]
+    articles, _, *sidebar = await gather(*queries)
+
+    context = {
+        'articles': articles,
+        'sidebar_version': sidebar_version,
+        'sidebar_timeout': cache.DEFAULT_TIMEOUT,
+    }
+    if sidebar_html is None:
+        context.update(zip(
+            ['latest_articles', 'popular_articles', 'recommended_articles', 'categories'],
+            sidebar,
+        ))
+    else:
+        context['sidebar_html'] = mark_safe(sidebar_html)
+    return render(request, 'blog/list.html', context)
+
+
+@conditional_page(
+    detail_validators,
+    on_not_modified=lambda request, id: view_counter.record_view_later(id),
+)
+async def blog_detail(request, id):
+    (article, body), related_articles, pending = await gather(
+        lambda: article_and_body(id),
+        lambda: [
+            entry.related for entry in RelatedArticle.objects.filter(
+                post_id=id, related__status='published'
+            ).select_related(
+                'related__author', 'related__category'
+            ).defer('related__content', 'related__content_html')
+        ],
+        lambda: view_counter.pending_views(id),
+    )
+    if article is None:
+        raise Http404("Article not found")
+
+    # Only show published articles to the public (authors see their drafts)
+    if article.status != 'published':
+        if await request.auser() != article.author:
+            raise Http404("Article not found")
+    else:
+        view_counter.record_view_later(article.id)
+        article.views += pending + 1
+
+    context = {
+        'article': article,
+        'article_body': body,
+        'related_articles': related_articles,
+    }
+    return render(request, 'blog/detail.html', context)
+
+
+def article_and_body(id):
+    """
+    The article and its sanitized body. safe_content may have to re-clean
+    (bleach, slow) a row stored under an older policy, so it is resolved
+    here on the worker thread rather than by the template on the loop.
+    """
+    article = BlogPost.objects.select_related('author', 'category').filter(id=id).first()
+    return article, article.safe_content if article else None
@@ -0,0 +1,97 @@
+# blog/cache.py
+"""
+Version-tag caching.
+
+Cached values are stored under a key that embeds the current version of
+every tag they depend on ('posts', 'categories', ...). Saving or deleting a
+model bumps its tag once the transaction commits (see blog/signals.py), so
+the next read misses and rebuilds - nothing has to be deleted explicitly.
+
+A tag version is the time.time_ns() of its last bump, so it doubles as a
+"last modified" stamp.
+"""
+
+import time
+
+from django.core.cache import cache
+
+# How long an entry lives even if no tag is bumped. View counts are
+# written with queryset.update() (no signals), so this bounds their staleness.
+DEFAULT_TIMEOUT = 60
+
+POSTS = 'posts'
+CATEGORIES = 'categories'
+TRENDING = 'trending'
+RELATED = 'related'
+
+
+def _version_key(tag):
+    return f'version:{tag}'
+
+
+def get_versions(*tags):
+    """Current version of each tag, creating missing ones. One cache round trip."""
+    keys = {tag: _version_key(tag) for tag in tags}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for tag, key in keys.items():
+        if key in found:
+            versions[tag] = found[key]
+        else:
+            versions[tag] = time.time_ns()
+            cache.add(key, versions[tag], timeout=None)
+    return versions
+
+
+def bump(*tags):
+    """Invalidate everything cached under these tags."""
+    now = time.time_ns()
+    cache.set_many({_version_key(tag): now for tag in tags}, timeout=None)
+
+
+def version_key(*tags):
+    """The current versions of `tags` as one string, e.g. for {% cache %} vary-on"""
+    versions = get_versions(*tags)
+    return ':'.join(str(versions[tag]) for tag in tags)
+
+
+def cached(name, tags, builder, timeout=DEFAULT_TIMEOUT):
+    """Return builder() cached under `name` + the current versions of `tags`."""
+    key = f'{name}:{version_key(*tags)}'
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, timeout)
+    return value
+
+
+# ============================================
+# ASYNC (blog/async_views.py)
+# ============================================
+
+async def aget_versions(*tags):
+    keys = {tag: _version_key(tag) for tag in tags}
+    found = await cache.aget_many(keys.values())
+    versions = {}
+    for tag, key in keys.items():
+        if key in found:
+            versions[tag] = found[key]
+        else:
+            versions[tag] = time.time_ns()
+            await cache.aadd(key, versions[tag], timeout=None)
+    return versions
+
+
+async def aversion_key(*tags):
+    versions = await aget_versions(*tags)
+    return ':'.join(str(versions[tag]) for tag in tags)
+
+
+async def acached(name, tags, builder, timeout=DEFAULT_TIMEOUT):
+    """cached() for a coroutine function `builder`"""
+    key = f'{name}:{await aversion_key(*tags)}'
+    value = await cache.aget(key)
+    if value is None:
+        value = await builder()
+        await cache.aset(key, value, timeout)
+    return value
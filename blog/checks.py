@@ -0,0 +1,46 @@
+# blog/checks.py
+"""
+System checks for settings that only work with a cache shared between
+processes.
+
+Version tags (blog/cache.py), page cache purges (blog/page_cache.py) and
+the 'cache' view counter buffer all live in the default cache. With a
+per-process backend every worker bumps, purges and buffers only its own
+copy: other workers keep serving stale pages, and a flush only sees the
+views its own process counted.
+"""
+
+from django.conf import settings
+from django.core import checks
+
+PER_PROCESS_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def _per_process_cache():
+    return settings.CACHES['default']['BACKEND'] in PER_PROCESS_BACKENDS
+
+
+@checks.register(checks.Tags.caches)
+def check_view_counter_backend(app_configs, **kwargs):
+    if settings.VIEW_COUNTER_BACKEND == 'cache' and _per_process_cache():
+        return [checks.Error(
+            "VIEW_COUNTER_BACKEND='cache' needs a cache shared between processes.",
+            hint="Point CACHE_BACKEND at Memcached or Redis, or use VIEW_COUNTER_BACKEND='local'.",
+            id='blog.E001',
+        )]
+    return []
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if _per_process_cache():
+        return [checks.Warning(
+            'The default cache is per process: with more than one worker, cache '
+            'invalidations and page cache purges only reach the worker that made them.',
+            hint='Point CACHE_BACKEND at Memcached or Redis.',
+            id='blog.W001',
+        )]
+    return []
@@ -0,0 +1,105 @@
+# blog/conditional.py
+"""
+Conditional GET (ETag / Last-Modified) for the public pages.
+
+Validators come from cache tag versions (blog/cache.py), which are bumped
+whenever posts, categories, etc. change, plus at most one indexed lookup
+(the article's updated_at on blog_detail). A request whose If-None-Match /
+If-Modified-Since still matches gets a 304 before the view runs: no
+queryset, no template.
+
+Only saves move a validator. View counts are written by queryset.update()
+(blog/view_counter.py) and don't, so a page revalidated with a 304 can show
+a count that is behind; the trending rollup bumps its own tag.
+"""
+
+import hashlib
+from datetime import timezone
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from . import cache
+
+
+def validators(*parts, timestamps=()):
+    """(etag, last_modified) from arbitrary parts and timestamps (seconds)"""
+    raw = ':'.join(str(part) for part in (*parts, *timestamps))
+    etag = hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+    return etag, max(timestamps, default=0)
+
+
+def tag_validators(*tags):
+    """Validator function for pages that only depend on cache tags"""
+    def compute(request, *args, **kwargs):
+        versions = cache.get_versions(*tags)
+        return validators(timestamps=[versions[tag] / 1e9 for tag in tags])
+    return compute
+
+
+def conditional_page(compute, on_not_modified=None):
+    """
+    Like django.views.decorators.http.condition, with one function returning
+    (etag, last_modified_seconds) or None (no validators, always render),
+    and a hook run for 304s (blog_detail still counts the view).
+
+    Works on async views too: `compute` then runs in a thread, the hook is
+    called on the event loop.
+    """
+    def not_modified(request, found):
+        etag, last_modified = quote_etag(found[0]), int(found[1])
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        return response, etag, last_modified
+
+    def add_validators(response, etag, last_modified):
+        if response.status_code == 200:
+            response.headers.setdefault('ETag', etag)
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+        return response
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                found = await sync_to_async(compute)(request, *args, **kwargs)
+                if found is None:
+                    return await view(request, *args, **kwargs)
+
+                response, etag, last_modified = not_modified(request, found)
+                if response is not None:
+                    if response.status_code == 304 and on_not_modified:
+                        on_not_modified(request, *args, **kwargs)
+                    return response
+                return add_validators(await view(request, *args, **kwargs), etag, last_modified)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            found = compute(request, *args, **kwargs)
+            if found is None:
+                return view(request, *args, **kwargs)
+
+            response, etag, last_modified = not_modified(request, found)
+            if response is not None:
+                if response.status_code == 304 and on_not_modified:
+                    on_not_modified(request, *args, **kwargs)
+                return response
+            return add_validators(view(request, *args, **kwargs), etag, last_modified)
+        return wrapper
+    return decorator
+
+
+def timestamp(value):
+    """Seconds since the epoch for a datetime (aware or naive UTC)"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
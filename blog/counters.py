@@ -0,0 +1,98 @@
+# blog/counters.py
+"""
+Denormalized counters: Category.published_count and the SiteStats row.
+
+They are adjusted incrementally by the signal handlers in blog/signals.py
+(publish, unpublish, delete, category change) and by the view counter
+flush. `manage.py reconcile_counters` rebuilds them from scratch.
+"""
+
+from django.db.models import Count, F, Sum
+
+from .models import BlogPost, Category, SiteStats
+
+
+def post_state(post):
+    """The parts of a post the counters depend on, or None if it doesn't count"""
+    if post is None or post.status != 'published':
+        return None
+    return {'category_id': post.category_id, 'views': post.views}
+
+
+def apply_post_change(old, new):
+    """
+    Adjust counters for a post going from state `old` to `new`
+    (as returned by post_state; None = not published / not existing).
+    """
+    if old == new:
+        return
+
+    if old and new and old['category_id'] == new['category_id']:
+        # Still published in the same category: only views can have moved
+        adjust_site_stats(views=new['views'] - old['views'])
+        return
+
+    if old:
+        Category.objects.filter(pk=old['category_id']).update(
+            published_count=F('published_count') - 1
+        )
+    if new:
+        Category.objects.filter(pk=new['category_id']).update(
+            published_count=F('published_count') + 1
+        )
+
+    if bool(old) != bool(new):
+        adjust_site_stats(
+            articles=1 if new else -1,
+            views=(new or {'views': 0})['views'] - (old or {'views': 0})['views'],
+        )
+    else:
+        adjust_site_stats(views=new['views'] - old['views'])
+
+
+def adjust_site_stats(articles=0, categories=0, views=0):
+    if not (articles or categories or views):
+        return
+    updated = SiteStats.objects.filter(pk=1).update(
+        total_articles=F('total_articles') + articles,
+        total_categories=F('total_categories') + categories,
+        total_views=F('total_views') + views,
+    )
+    if not updated:
+        # No stats row yet: build it from the tables
+        reconcile_site_stats()
+
+
+# ============================================
+# RECONCILE (full rebuild)
+# ============================================
+
+def reconcile_categories():
+    """Recount published articles for every category. Returns categories fixed."""
+    counts = dict(
+        BlogPost.objects.filter(status='published')
+        .order_by()
+        .values('category')
+        .annotate(n=Count('id'))
+        .values_list('category', 'n')
+    )
+    stale = []
+    for category in Category.objects.only('id', 'published_count'):
+        actual = counts.get(category.id, 0)
+        if category.published_count != actual:
+            category.published_count = actual
+            stale.append(category)
+    Category.objects.bulk_update(stale, ['published_count'], batch_size=500)
+    return len(stale)
+
+
+def reconcile_site_stats():
+    totals = BlogPost.objects.filter(status='published').aggregate(
+        articles=Count('id'), views=Sum('views')
+    )
+    stats = SiteStats.load()
+    stats.total_articles = totals['articles']
+    stats.total_categories = Category.objects.count()
+    stats.total_views = totals['views'] or 0
+    stats.save()
+    return stats
@@ -0,0 +1,134 @@
+# blog/images.py
+"""
+Responsive derivatives for article cover images.
+
+When a cover is uploaded, generate_variants() writes resized WebP and JPEG
+copies for each use (card, detail, og:image), with EXIF and other metadata
+stripped, next to the original:
+
+    posts/2026/02/cover.png
+    posts/2026/02/derived/cover/card-400.webp, card-400.jpg, card-800.webp, ...
+
+The result is stored in BlogPost.image_variants and rendered as <picture>
+/ srcset by the {% cover_image %} tag (blog/templatetags/image_tags.py).
+"""
+
+import io
+import os
+import posixpath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# Variant name -> widths (px). 'og' is also cropped to the 1.91:1 share ratio.
+SIZES = {
+    'card': (400, 800),
+    'detail': (960, 1600),
+    'og': (1200,),
+}
+OG_RATIO = 1200 / 630
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Background for flattening transparent images into JPEG (site is dark)
+JPEG_BACKGROUND = (0, 0, 0)
+
+
+def derived_dir(source_name):
+    folder, filename = posixpath.split(source_name)
+    stem = os.path.splitext(filename)[0]
+    return posixpath.join(folder, 'derived', stem)
+
+
+def open_image(file):
+    file.seek(0)
+    image = Image.open(file)
+    image.seek(0)  # first frame of animated GIF/WebP
+    image = ImageOps.exif_transpose(image)  # apply, then drop, EXIF rotation
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    return image
+
+
+def resize(image, width, crop_ratio=None):
+    if crop_ratio:
+        height = round(min(width, image.width) / crop_ratio)
+        return ImageOps.fit(image, (min(width, image.width), height), Image.LANCZOS)
+    if image.width <= width:
+        return image.copy()
+    height = round(image.height * width / image.width)
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def encode(image, fmt):
+    pil_format, options = FORMATS[fmt]
+    if pil_format == 'JPEG' and image.mode == 'RGBA':
+        flat = Image.new('RGB', image.size, JPEG_BACKGROUND)
+        flat.paste(image, mask=image.getchannel('A'))
+        image = flat
+    buffer = io.BytesIO()
+    # No exif=/icc_profile=/info passed on: metadata is not copied
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def generate_variants(field_file, storage=None):
+    """
+    Build every derivative for an uploaded image (a FieldFile) and return
+    the dict stored in BlogPost.image_variants:
+
+        {'source': name, 'width': w, 'height': h,
+         'card': [{'width': 400, 'height': 225, 'webp': path, 'jpg': path}, ...],
+         ...}
+    """
+    storage = storage or default_storage
+    folder = derived_dir(field_file.name)
+
+    with field_file.open('rb') as file:
+        original = open_image(file)
+
+    variants = {
+        'source': field_file.name,
+        'width': original.width,
+        'height': original.height,
+    }
+    for name, widths in SIZES.items():
+        crop_ratio = OG_RATIO if name == 'og' else None
+        entries = []
+        seen_widths = set()
+        for width in widths:
+            resized = resize(original, width, crop_ratio)
+            if resized.width in seen_widths:
+                continue  # source smaller than this size: don't upscale
+            seen_widths.add(resized.width)
+            entry = {'width': resized.width, 'height': resized.height}
+            for fmt in FORMATS:
+                path = posixpath.join(folder, f'{name}-{resized.width}.{fmt}')
+                if storage.exists(path):
+                    storage.delete(path)
+                entry[fmt] = storage.save(path, ContentFile(encode(resized, fmt)))
+            entries.append(entry)
+        variants[name] = entries
+    return variants
+
+
+def variant_paths(variants):
+    """Every file listed in an image_variants dict"""
+    return [
+        entry[fmt]
+        for name in SIZES
+        for entry in (variants or {}).get(name, [])
+        for fmt in FORMATS
+        if entry.get(fmt)
+    ]
+
+
+def delete_variants(variants, storage=None, keep=None):
+    """Remove the files listed in an image_variants dict, except those in `keep`"""
+    storage = storage or default_storage
+    for path in set(variant_paths(variants)) - set(variant_paths(keep)):
+        storage.delete(path)
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from blog import text
+from blog.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill BlogPost.excerpt, word_count and reading_time for existing rows "
+        "in batches (new saves compute them automatically)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute every article, not just empty ones.')
+
+    def handle(self, *args, **options):
+        queryset = BlogPost.objects.order_by('pk')
+        if not options['all']:
+            queryset = queryset.filter(word_count=0)
+
+        done = 0
+        last_pk = 0
+        while True:
+            rows = list(
+                queryset.filter(pk__gt=last_pk)
+                .values_list('pk', 'content')[:options['batch_size']]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+
+            BlogPost.objects.bulk_update(
+                [BlogPost(pk=pk, **text.derive(content)) for pk, content in rows],
+                ['excerpt', 'word_count', 'reading_time'],
+            )
+            done += len(rows)
+            self.stdout.write(f'  {done:,}', ending='\r')
+
+        self.stdout.write(self.style.SUCCESS(f'\nUpdated {done:,} article(s).'))
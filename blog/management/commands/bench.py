@@ -0,0 +1,413 @@
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from blog import view_counter
+from blog.models import BlogPost, Category
+from blog.pagination import KeysetPaginator
+from blog.seed import seed
+
+# Share of replayed requests per endpoint
+MIX = {
+    'home': 25,
+    'blog_list': 20,
+    'blog_detail': 30,
+    'category_articles': 10,
+    'author_articles': 10,
+    'writer_dashboard': 5,
+}
+# Distinct URLs sampled per endpoint (articles, categories, authors, list pages)
+SAMPLE = 200
+LIST_PAGES = 10
+
+RESULTS_DIR = Path(settings.BASE_DIR) / 'var' / 'bench'
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark suite on a separate, kept database (the test database name):\n"
+        "  bench seed    fill it with synthetic writers, categories and articles\n"
+        "  bench replay  replay a weighted mix of public and writer pages and\n"
+        "                report req/s, latency percentiles, queries and peak\n"
+        "                memory per endpoint, saved as JSON for --compare."
+    )
+
+    def add_arguments(self, parser):
+        actions = parser.add_subparsers(dest='action', required=True)
+
+        seed_parser = actions.add_parser('seed', help='Seed the benchmark database.')
+        seed_parser.add_argument('--posts', type=int, default=10_000)
+        seed_parser.add_argument('--users', type=int, default=100)
+        seed_parser.add_argument('--categories', type=int, default=12)
+        seed_parser.add_argument('--fresh', action='store_true',
+                                 help='Drop and recreate the database first.')
+
+        replay = actions.add_parser('replay', help='Replay the request mix.')
+        replay.add_argument('--requests', type=int, default=2000,
+                            help='Measured requests (default 2000).')
+        replay.add_argument('--warmup', type=int, default=200,
+                            help='Unmeasured requests first (default 200).')
+        replay.add_argument('--server', action='store_true',
+                            help='Go through a local threaded WSGI server over HTTP '
+                                 'instead of the in-process test client.')
+        replay.add_argument('--page-cache', action='store_true',
+                            help='Leave the anonymous page cache on (off by default, '
+                                 'so the views are measured).')
+        replay.add_argument('--no-memory', action='store_true',
+                            help="Skip tracemalloc (it slows every request down).")
+        replay.add_argument('--seed', type=int, default=0, help='Random seed for the mix.')
+        replay.add_argument('--output', help='JSON results file (default var/bench/replay-<time>.json).')
+        replay.add_argument('--compare', help='Earlier results file to show the change against.')
+
+    def handle(self, *args, **options):
+        with bench_database(fresh=options.get('fresh', False)):
+            if options['action'] == 'seed':
+                self.seed(options)
+            else:
+                self.replay(options)
+
+    # ============================================
+    # SEED
+    # ============================================
+
+    def seed(self, options):
+        self.stdout.write(f"Seeding {options['posts']:,} articles...")
+        start = time.perf_counter()
+        seed(posts=options['posts'], users=options['users'],
+             categories=options['categories'], derived=True,
+             progress=lambda n: self.stdout.write(f'  {n:,}', ending='\r'))
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{options['posts']:,} articles in {elapsed:.1f} s "
+            f"({options['posts'] / elapsed:,.0f} rows/s); "
+            f"{BlogPost.objects.count():,} in the benchmark database"
+        ))
+
+    # ============================================
+    # REPLAY
+    # ============================================
+
+    def replay(self, options):
+        if not BlogPost.objects.published().exists():
+            raise CommandError('The benchmark database is empty; run `manage.py bench seed` first.')
+
+        rng = random.Random(options['seed'])
+        urls = self.sample_urls(rng)
+        mix = [(name, weight) for name, weight in MIX.items() if urls[name]]
+        names, weights = zip(*mix)
+        plan = [rng.choices(names, weights)[0] for _ in range(options['warmup'] + options['requests'])]
+        requests = [(name, *rng.choice(urls[name])) for name in plan]
+
+        overrides = {
+            'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver', '127.0.0.1'],
+            'SECURE_SSL_REDIRECT': False,
+        }
+        if not options['page_cache']:
+            overrides['PAGE_CACHE_TIMEOUT'] = 0
+        memory = not options['no_memory']
+
+        with override_settings(**overrides):
+            runner = ServerRunner(memory) if options['server'] else ClientRunner(memory)
+            with runner:
+                samples = self.run(runner, requests, options['warmup'])
+
+        results = self.summarize(samples, options)
+        self.report(results, options['compare'])
+        self.save(results, options['output'])
+
+    def sample_urls(self, rng):
+        """(url, user) choices per endpoint; user is who to log in as, or None"""
+        published = BlogPost.objects.published()
+        post_ids = list(published.order_by('?').values_list('pk', flat=True)[:SAMPLE])
+        slugs = list(Category.objects.filter(published_count__gt=0)
+                     .values_list('slug', flat=True)[:SAMPLE])
+        authors = list(User.objects.filter(blogpost__status='published').distinct()[:SAMPLE])
+
+        list_urls = [reverse('blog_list')]
+        page = KeysetPaginator(published, 5).get_page()
+        while page.has_next() and len(list_urls) < LIST_PAGES:
+            list_urls.append(f"{reverse('blog_list')}?cursor={page.next_cursor}")
+            page = page.paginator.get_page(page.next_cursor)
+
+        return {
+            'home': [(reverse('home'), None)],
+            'blog_list': [(url, None) for url in list_urls],
+            'blog_detail': [(reverse('blog_detail', args=[pk]), None) for pk in post_ids],
+            'category_articles': [(reverse('category_articles', args=[slug]), None) for slug in slugs],
+            'author_articles': [(reverse('author_articles', args=[a.username]), None) for a in authors],
+            'writer_dashboard': [(reverse('writer_dashboard'), author) for author in authors],
+        }
+
+    def run(self, runner, requests, warmup):
+        samples = []
+        started = None
+        for i, (name, url, user) in enumerate(requests):
+            if i == warmup:
+                started = time.perf_counter()
+            begin = time.perf_counter()
+            status, queries, peak = runner.get(url, user)
+            elapsed = time.perf_counter() - begin
+            if status != 200:
+                raise CommandError(f'{url} returned {status}')
+            if i >= warmup:
+                samples.append((name, elapsed, queries, peak))
+        self.wall_time = time.perf_counter() - (started or time.perf_counter())
+        return samples
+
+    def summarize(self, samples, options):
+        by_name = {}
+        for name, elapsed, queries, peak in samples:
+            by_name.setdefault(name, []).append((elapsed, queries, peak))
+
+        endpoints = {}
+        for name in MIX:
+            rows = by_name.get(name)
+            if not rows:
+                continue
+            ms = sorted(elapsed * 1000 for elapsed, _, _ in rows)
+            queries = [q for _, q, _ in rows]
+            peaks = [p for _, _, p in rows if p is not None]
+            endpoints[name] = {
+                'requests': len(rows),
+                'req_per_s': 1000 / statistics.mean(ms),
+                'p50_ms': percentile(ms, 50),
+                'p95_ms': percentile(ms, 95),
+                'p99_ms': percentile(ms, 99),
+                'queries_median': statistics.median(queries),
+                'queries_max': max(queries),
+                'peak_memory_kib': max(peaks) / 1024 if peaks else None,
+            }
+        return {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'mode': 'server' if options['server'] else 'client',
+            'database': connection.vendor,
+            'articles': BlogPost.objects.count(),
+            'page_cache': options['page_cache'],
+            'tracemalloc': not options['no_memory'],
+            'requests': len(samples),
+            'req_per_s': len(samples) / self.wall_time,
+            'endpoints': endpoints,
+        }
+
+    def report(self, results, compare):
+        previous = {}
+        if compare:
+            previous = json.loads(Path(compare).read_text())['endpoints']
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n{results['database']} - {results['articles']:,} articles, "
+            f"{results['requests']:,} requests via {results['mode']}: "
+            f"{results['req_per_s']:.0f} req/s"
+            + (' (with tracemalloc)' if results['tracemalloc'] else '')
+        ))
+        self.stdout.write(
+            f"{'':20}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'queries':>9}{'peak KiB':>10}"
+        )
+        for name, stats in results['endpoints'].items():
+            peak = stats['peak_memory_kib']
+            self.stdout.write(
+                f"{name:20}{stats['req_per_s']:>8.0f}{stats['p50_ms']:>9.2f}"
+                f"{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}"
+                f"{stats['queries_median']:>9g}{'-' if peak is None else round(peak):>10}"
+            )
+            before = previous.get(name)
+            if before:
+                self.stdout.write(
+                    f"{'  vs previous':20}"
+                    f"{change(before['req_per_s'], stats['req_per_s']):>8}"
+                    f"{change(before['p50_ms'], stats['p50_ms']):>9}"
+                    f"{change(before['p95_ms'], stats['p95_ms']):>9}"
+                    f"{change(before['p99_ms'], stats['p99_ms']):>9}"
+                    f"{stats['queries_median'] - before['queries_median']:>+9g}"
+                )
+
+    def save(self, results, output):
+        path = Path(output) if output else (
+            RESULTS_DIR / f"replay-{datetime.now():%Y%m%d-%H%M%S}.json"
+        )
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(results, indent=2))
+        self.stdout.write(f'\nSaved {path}')
+
+
+def percentile(sorted_values, p):
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def change(before, after):
+    return f'{(after - before) / before:+.0%}' if before else '-'
+
+
+@contextmanager
+def bench_database(fresh=False):
+    """
+    Point the default connection at the benchmark database (the test
+    database name, or var/bench.sqlite3 instead of an in-memory SQLite
+    test database) and keep it afterwards, so `seed` and `replay` can run
+    separately.
+    """
+    settings_dict = connection.settings_dict
+    if connection.vendor == 'sqlite' and not settings_dict['TEST'].get('NAME'):
+        settings_dict['TEST']['NAME'] = str(Path(settings.BASE_DIR) / 'var' / 'bench.sqlite3')
+        Path(settings_dict['TEST']['NAME']).parent.mkdir(parents=True, exist_ok=True)
+    old_name = settings_dict['NAME']
+    connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, keepdb=not fresh, serialize=False
+    )
+    try:
+        yield
+    finally:
+        view_counter.flush()  # buffered views belong to the benchmark database
+        connection.close()
+        settings_dict['NAME'] = old_name
+
+
+# ============================================
+# RUNNERS
+# ============================================
+
+class _Measure:
+    """Queries on this thread's connection and peak traced memory of one request"""
+
+    def __init__(self, memory):
+        self.memory = memory
+
+    @contextmanager
+    def __call__(self):
+        result = {}
+        with CaptureQueriesContext(connection) as queries:
+            if self.memory:
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+            yield result
+            if self.memory:
+                result['peak'] = tracemalloc.get_traced_memory()[1] - baseline
+        result['queries'] = len(queries)
+
+    def __enter__(self):
+        if self.memory:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.memory:
+            tracemalloc.stop()
+
+
+class ClientRunner(_Measure):
+    """In-process through django.test.Client (no HTTP)"""
+
+    def __init__(self, memory):
+        super().__init__(memory)
+        self.anonymous = Client()
+        self.writers = {}
+
+    def client(self, user):
+        if user is None:
+            return self.anonymous
+        if user.pk not in self.writers:
+            self.writers[user.pk] = Client()
+            self.writers[user.pk].force_login(user)
+        return self.writers[user.pk]
+
+    def get(self, url, user):
+        client = self.client(user)
+        with self() as measured:
+            response = client.get(url)
+        return response.status_code, measured['queries'], measured.get('peak')
+
+
+class _Server(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class ServerRunner(_Measure):
+    """
+    Real HTTP through wsgiref on a background thread of this process, so
+    the app runs with the same (benchmark) database settings. Query counts
+    and memory are measured around the app and sent back in headers.
+    """
+
+    def __init__(self, memory):
+        super().__init__(memory)
+        self.sessions = {}
+
+    def __enter__(self):
+        super().__enter__()
+        app = get_wsgi_application()
+
+        def measured_app(environ, start_response):
+            captured = {}
+
+            def capture(status, headers, exc_info=None):
+                captured.update(status=status, headers=headers)
+
+            with self() as measured:
+                result = app(environ, capture)
+                try:
+                    body = b''.join(result)
+                finally:
+                    result.close()  # request_finished, as a real server would
+            start_response(captured['status'], [
+                *captured['headers'],
+                ('X-Bench-Queries', str(measured['queries'])),
+                ('X-Bench-Peak', str(measured.get('peak', ''))),
+            ])
+            return [body]
+
+        self.server = make_server('127.0.0.1', 0, measured_app,
+                                  server_class=_Server, handler_class=_QuietHandler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        super().__exit__(*exc)
+
+    def cookie(self, user):
+        if user is None:
+            return {}
+        if user.pk not in self.sessions:
+            client = Client()
+            client.force_login(user)
+            self.sessions[user.pk] = client.cookies[settings.SESSION_COOKIE_NAME].value
+        return {'Cookie': f'{settings.SESSION_COOKIE_NAME}={self.sessions[user.pk]}'}
+
+    def get(self, url, user):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port)
+        try:
+            conn.request('GET', url, headers=self.cookie(user))
+            response = conn.getresponse()
+            response.read()
+            peak = response.getheader('X-Bench-Peak')
+            return (response.status, int(response.getheader('X-Bench-Queries', 0)),
+                    int(peak) if peak else None)
+        finally:
+            conn.close()
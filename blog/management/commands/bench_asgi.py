@@ -0,0 +1,240 @@
+import asyncio
+import importlib.util
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from blog.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the public pages under WSGI (gunicorn, sync views) and ASGI "
+        "(uvicorn, blog/async_views.py) on this machine and compare throughput "
+        "and tail latency. Starts both servers itself against the configured "
+        "database (needs gunicorn and uvicorn installed), or benchmarks servers "
+        "you started with --wsgi-url/--asgi-url."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Server processes for each deployment (default: CPU count).')
+        parser.add_argument('--threads', type=int, default=8,
+                            help='Threads per gunicorn worker (default 8).')
+        parser.add_argument('--concurrency', type=int, default=256,
+                            help='Simultaneous keep-alive clients (default 256).')
+        parser.add_argument('--duration', type=float, default=15,
+                            help='Seconds measured per deployment (default 15).')
+        parser.add_argument('--warmup', type=float, default=3,
+                            help='Seconds of load before measuring (default 3).')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Page to request, repeatable (default: home, list, newest article).')
+        parser.add_argument('--wsgi-url', help='Benchmark a running WSGI server instead.')
+        parser.add_argument('--asgi-url', help='Benchmark a running ASGI server instead.')
+        parser.add_argument('--page-cache', action='store_true',
+                            help='Leave the anonymous page cache on in started servers '
+                                 '(off by default, so the views are measured).')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or self.default_paths()
+        results = []
+        for name, url_option, command in [
+            ('WSGI', 'wsgi_url', self.gunicorn_command),
+            ('ASGI', 'asgi_url', self.uvicorn_command),
+        ]:
+            url = options[url_option]
+            if url:
+                results.append((name, self.load_test(url, paths, options)))
+                continue
+            port = free_port()
+            with self.server(command(port, options), port, options['page_cache']):
+                results.append((name, self.load_test(f'http://127.0.0.1:{port}', paths, options)))
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n{options['concurrency']} clients, {options['duration']:g} s, "
+            f"paths: {' '.join(paths)}"
+        ))
+        self.stdout.write(
+            f"{'':6}{'req/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}"
+            f"{'max ms':>10}{'errors':>9}"
+        )
+        for name, stats in results:
+            self.stdout.write(
+                f"{name:6}{stats['rps']:>10.0f}{stats['p50']:>10.1f}{stats['p90']:>10.1f}"
+                f"{stats['p99']:>10.1f}{stats['max']:>10.1f}{stats['errors']:>9}"
+            )
+
+    def default_paths(self):
+        newest = BlogPost.objects.published().order_by('-created_at').values_list(
+            'pk', flat=True
+        ).first()
+        if newest is None:
+            raise CommandError('No published articles to benchmark; seed the database first.')
+        return [reverse('home'), reverse('blog_list'), reverse('blog_detail', args=[newest])]
+
+    # ----- servers -----
+
+    def gunicorn_command(self, port, options):
+        if not _installed('gunicorn'):
+            raise CommandError('gunicorn is not installed (pip install gunicorn).')
+        return [
+            sys.executable, '-m', 'gunicorn', 'vleaks_project.wsgi:application',
+            '--bind', f'127.0.0.1:{port}', '--workers', str(options['workers']),
+            '--worker-class', 'gthread', '--threads', str(options['threads']),
+            '--log-level', 'warning',
+        ]
+
+    def uvicorn_command(self, port, options):
+        if not _installed('uvicorn'):
+            raise CommandError('uvicorn is not installed (pip install uvicorn).')
+        return [
+            sys.executable, '-m', 'uvicorn', 'vleaks_project.asgi:application',
+            '--host', '127.0.0.1', '--port', str(port),
+            '--workers', str(options['workers']),
+            '--log-level', 'warning', '--no-access-log',
+        ]
+
+    def server(self, command, port, page_cache):
+        env = dict(os.environ)
+        if not page_cache:
+            env['PAGE_CACHE_TIMEOUT'] = '0'
+        return _Server(command, port, env, cwd=settings.BASE_DIR)
+
+    # ----- load -----
+
+    def load_test(self, base_url, paths, options):
+        self.stdout.write(f'Loading {base_url} ...')
+        return asyncio.run(load(
+            base_url, paths, options['concurrency'], options['warmup'], options['duration']
+        ))
+
+
+def _installed(module):
+    return importlib.util.find_spec(module) is not None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class _Server:
+    """Run a server process for the duration of a with block"""
+
+    def __init__(self, command, port, env, cwd, timeout=30):
+        self.command, self.port, self.env, self.cwd = command, port, env, cwd
+        self.timeout = timeout
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, env=self.env, cwd=self.cwd)
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError(f'{self.command[2]} exited with {self.process.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise CommandError(f'{self.command[2]} did not start listening on {self.port}')
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+# ============================================
+# LOAD GENERATOR
+# ============================================
+
+async def load(base_url, paths, concurrency, warmup, duration):
+    """
+    `concurrency` keep-alive HTTP/1.1 clients requesting `paths` in turn.
+    Latencies are kept for requests that start after `warmup` seconds.
+    """
+    url = urlsplit(base_url)
+    host, port = url.hostname, url.port or 80
+    started = time.monotonic()
+    measure_from, stop_at = started + warmup, started + warmup + duration
+    latencies, errors = [], [0]
+
+    async def client(offset):
+        reader = writer = None
+        i = offset
+        while time.monotonic() < stop_at:
+            path = paths[i % len(paths)]
+            i += 1
+            begin = time.monotonic()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(host, port)
+                status, keep_alive = await request(reader, writer, host, path)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                status, keep_alive = None, False
+            if begin >= measure_from:
+                if status == 200:
+                    latencies.append(time.monotonic() - begin)
+                else:
+                    errors[0] += 1
+            if not keep_alive and writer is not None:
+                writer.close()
+                reader = writer = None
+        if writer is not None:
+            writer.close()
+
+    await asyncio.gather(*[client(n) for n in range(concurrency)])
+    latencies.sort()
+    ms = [latency * 1000 for latency in latencies] or [0]
+    return {
+        'rps': len(latencies) / duration,
+        'p50': statistics.median(ms),
+        'p90': ms[int(len(ms) * 0.90) - 1] if len(ms) > 1 else ms[0],
+        'p99': ms[int(len(ms) * 0.99) - 1] if len(ms) > 1 else ms[0],
+        'max': ms[-1],
+        'errors': errors[0],
+    }
+
+
+async def request(reader, writer, host, path):
+    """One GET on an open connection: (status, connection still usable)"""
+    # Look like the HTTPS proxy (SECURE_PROXY_SSL_HEADER), or production
+    # settings answer every plain-HTTP request with a 301 to https://
+    writer.write(
+        f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: text/html\r\n'
+        f'X-Forwarded-Proto: https\r\n\r\n'.encode()
+    )
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)  # chunk + CRLF
+            if size == 0:
+                break
+    else:
+        await reader.read()  # body runs to the end of the connection
+        return status, False
+    return status, headers.get('connection', '').lower() != 'close'
@@ -0,0 +1,123 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from blog.models import BlogPost
+from blog.seed import seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and compare EXPLAIN plans and timings "
+        "of the public article queries without and with the composite indexes "
+        "from migration 0005. Run it once per database config (SQLite / MySQL)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000,
+                            help='Articles to seed (default 100000).')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Timed runs per query; the median is reported.')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Reuse and keep the test database between runs.')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb']
+        )
+        try:
+            if not BlogPost.objects.exists():
+                self.stdout.write(f"Seeding {options['rows']:,} articles...")
+                seed(posts=options['rows'], users=200, categories=12,
+                     progress=lambda n: self.stdout.write(f'  {n:,}', ending='\r'))
+                self.stdout.write('')
+            self.run_benchmarks(options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb']
+            )
+
+    # ============================================
+    # QUERIES UNDER TEST
+    # ============================================
+
+    def access_paths(self):
+        """The querysets the public views actually run"""
+        published = BlogPost.objects.published().for_cards()
+        sample = BlogPost.objects.published().order_by('-created_at')
+        middle = sample.values_list('created_at', 'id')[sample.count() // 2]
+        busy_category = sample.values_list('category_id', flat=True).first()
+        busy_author = sample.values_list('author_id', flat=True).first()
+        return [
+            ('latest (home, sidebar)',
+             published.order_by('-created_at')[:6]),
+            ('popular / featured',
+             published.order_by('-views')[:5]),
+            ('recommended',
+             published.filter(recommended=True).order_by('-created_at')[:3]),
+            ('category page',
+             published.filter(category_id=busy_category)
+             .order_by('-created_at', '-id')[:11]),
+            ('author page',
+             published.filter(author_id=busy_author)
+             .order_by('-created_at', '-id')[:11]),
+            ('deep keyset page',
+             published.filter(created_at__lt=middle[0])
+             .order_by('-created_at', '-id')[:6]),
+        ]
+
+    # ============================================
+    # RUN
+    # ============================================
+
+    def run_benchmarks(self, repeat):
+        indexes = BlogPost._meta.indexes
+
+        with connection.schema_editor() as editor:
+            for index in indexes:
+                editor.remove_index(BlogPost, index)
+        self.analyze()
+        before = self.measure(repeat)
+
+        with connection.schema_editor() as editor:
+            for index in indexes:
+                editor.add_index(BlogPost, index)
+        self.analyze()
+        after = self.measure(repeat)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'\n{connection.vendor} - {BlogPost.objects.count():,} articles'
+        ))
+        for (name, plan_before, ms_before), (_, plan_after, ms_after) in zip(before, after):
+            self.stdout.write(self.style.MIGRATE_LABEL(f'\n{name}'))
+            self.stdout.write(f'  without indexes: {ms_before:8.2f} ms')
+            self.stdout.write(self.indent(plan_before))
+            self.stdout.write(f'  with indexes:    {ms_after:8.2f} ms'
+                              f'  ({ms_before / max(ms_after, 1e-6):.1f}x)')
+            self.stdout.write(self.indent(plan_after))
+
+    def measure(self, repeat):
+        results = []
+        for name, queryset in self.access_paths():
+            plan = queryset.explain()
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(queryset.all())  # .all() clones, so nothing is cached
+                timings.append((time.perf_counter() - start) * 1000)
+            results.append((name, plan, statistics.median(timings)))
+        return results
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute('ANALYZE TABLE blog_blogpost')
+                cursor.fetchall()
+            else:
+                cursor.execute('ANALYZE')
+
+    def indent(self, text):
+        return '\n'.join(f'      {line}' for line in text.splitlines())
@@ -0,0 +1,100 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Value
+from django.db.models.functions import Concat
+
+from blog import search
+from blog.models import BlogPost
+from blog.seed import WORDS, seed
+
+
+# Seeded articles all draw on the same few dozen words, so every one of them
+# matches every article. These are planted in one article out of N to give
+# queries of realistic selectivity.
+PLANTED_TERMS = [('whistleblower', 100), ('kompromat', 10_000)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and compare full-text search latency "
+        "against the LIKE '%term%' scan it replaces. Run it once per database "
+        "config (SQLite FTS5 / MySQL FULLTEXT)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000,
+                            help='Articles to seed (default 100000).')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Timed runs per query; the median is reported.')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Reuse and keep the test database between runs.')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb']
+        )
+        try:
+            if not BlogPost.objects.exists():
+                self.stdout.write(f"Seeding {options['rows']:,} articles...")
+                seed(posts=options['rows'], users=200, categories=12,
+                     progress=lambda n: self.stdout.write(f'  {n:,}', ending='\r'))
+                self.plant_terms()
+                self.stdout.write('\nBuilding the search index...')
+                start = time.perf_counter()
+                search.rebuild(
+                    progress=lambda n: self.stdout.write(f'  {n:,}', ending='\r')
+                )
+                self.stdout.write(f'\n  {time.perf_counter() - start:.1f} s')
+            self.run_benchmarks(options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb']
+            )
+
+    def plant_terms(self):
+        pks = list(BlogPost.objects.order_by('pk').values_list('pk', flat=True))
+        for term, every in PLANTED_TERMS:
+            BlogPost.objects.filter(pk__in=pks[::every]).update(
+                content=Concat('content', Value(f'<p>{term}</p>'))
+            )
+
+    def queries(self):
+        return [
+            ('in every article', WORDS[10]),
+            ('1 in 100', 'whistleblower'),
+            ('1 in 10,000', 'kompromat'),
+            ('prefix, 1 in 100', 'whistle'),
+            ('two words', f'whistleblower {WORDS[10]}'),
+            ('no match', 'nonexistentterm'),
+        ]
+
+    def run_benchmarks(self, repeat):
+        published = BlogPost.objects.published()
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'\n{connection.vendor} - {BlogPost.objects.count():,} articles'
+        ))
+        for name, query in self.queries():
+            index_ms = self.time(lambda: search.search(query, limit=10), repeat)
+            # Without the index: LIKE over the bodies, newest first (unranked)
+            like = published.order_by('-created_at')
+            for word in query.split():
+                like = like.filter(content__icontains=word)
+            like_ms = self.time(lambda: list(like.values_list('pk', flat=True)[:10]), repeat)
+            hits = len(search.search(query, limit=10))
+
+            self.stdout.write(self.style.MIGRATE_LABEL(f'\n{name} ({query!r}, {hits} hits)'))
+            self.stdout.write(f'  LIKE, newest 10:     {like_ms:8.2f} ms')
+            self.stdout.write(f'  full-text, best 10:  {index_ms:8.2f} ms'
+                              f'  ({like_ms / max(index_ms, 1e-6):.1f}x)')
+
+    def time(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
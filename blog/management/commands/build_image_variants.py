@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = "Generate responsive cover image derivatives for articles that lack them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Rebuild every cover, not just missing ones.')
+
+    def handle(self, *args, **options):
+        posts = BlogPost.objects.exclude(image='').only('id', 'image', 'image_variants')
+        built = failed = 0
+        for post in posts.iterator(chunk_size=200):
+            if not options['all'] and post.image_variants.get('source') == post.image.name:
+                continue
+            try:
+                post.update_image_variants()
+                built += 1
+            except (OSError, ValueError) as e:
+                failed += 1
+                self.stderr.write(f'Post {post.id} ({post.image.name}): {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Built variants for {built} article(s); {failed} failed.'
+        ))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog import related
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute the \"read next\" articles (TF-IDF nearest neighbours). "
+        "Incremental by default: only articles saved since the last run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Rebuild the vocabulary and every list from scratch.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options['full']:
+            done = related.build(
+                progress=lambda n: self.stdout.write(f'  {n:,}', ending='\r')
+            )
+            self.stdout.write('')
+        else:
+            done = related.update()
+        self.stdout.write(self.style.SUCCESS(
+            f'Related articles updated for {done:,} article(s) '
+            f'in {time.perf_counter() - start:.1f} s.'
+        ))
@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog import view_counter
+
+
+class Command(BaseCommand):
+    help = (
+        "Write buffered article views to the database. Only useful with "
+        "VIEW_COUNTER_BACKEND='cache'; the 'local' buffer lives inside "
+        "each web process and is flushed by its own thread."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep running and flush every VIEW_COUNTER_FLUSH_INTERVAL seconds.',
+        )
+
+    def handle(self, *args, **options):
+        if settings.VIEW_COUNTER_BACKEND != 'cache':
+            self.stderr.write(self.style.WARNING(
+                "VIEW_COUNTER_BACKEND is not 'cache'; this process has no "
+                "buffered views to flush."
+            ))
+
+        while True:
+            written = view_counter.flush()
+            self.stdout.write(f'Flushed {written} view(s).')
+            if not options['loop']:
+                break
+            time.sleep(max(settings.VIEW_COUNTER_FLUSH_INTERVAL, 1))
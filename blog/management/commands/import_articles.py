@@ -0,0 +1,94 @@
+import hashlib
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from blog import importer
+
+CHECKPOINT_DIR = Path(settings.BASE_DIR) / 'var' / 'import'
+
+
+class Command(BaseCommand):
+    help = (
+        "Import articles from a JSONL file or a directory of Markdown/HTML "
+        "files (see blog/importer.py for the fields). Inserts in batches, "
+        "ingests cover images in parallel and checkpoints after every batch, "
+        "so an interrupted import continues with --resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='A .jsonl file or a directory.')
+        parser.add_argument('--author', help='Username for records without one.')
+        parser.add_argument('--category', help='Category slug or name for records without one.')
+        parser.add_argument('--status', default='published', choices=['draft', 'published'],
+                            help='Status for records without one (default published).')
+        parser.add_argument('--create-missing', action='store_true',
+                            help='Create unknown authors (without a password) and categories.')
+        parser.add_argument('--skip-existing', action='store_true',
+                            help='Skip records whose own slug is already taken, '
+                                 'instead of importing them under a new slug.')
+        parser.add_argument('--images-dir',
+                            help='Where relative cover image paths in JSONL records are '
+                                 '(default: next to the file).')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Threads copying and resizing cover images (default 4).')
+        parser.add_argument('--checkpoint', help='Checkpoint file (default var/import/...).')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue after the last batch the checkpoint recorded.')
+
+    def handle(self, *args, **options):
+        source = Path(options['source']).resolve()
+        if source.is_dir():
+            read = importer.read_directory
+        elif source.is_file():
+            read = importer.read_jsonl
+        else:
+            raise CommandError(f'{source} does not exist.')
+
+        checkpoint = importer.Checkpoint(
+            options['checkpoint'] or self.default_checkpoint(source), source
+        )
+        start = checkpoint.load() if options['resume'] else 0
+        if start:
+            self.stdout.write(f'Resuming at record {start:,} ({checkpoint.path})')
+
+        run = importer.Importer(
+            default_author=options['author'],
+            default_category=options['category'],
+            status=options['status'],
+            create_missing=options['create_missing'],
+            skip_existing=options['skip_existing'],
+            images_dir=options['images_dir'] or (source if source.is_dir() else source.parent),
+            workers=options['workers'],
+            warn=self.warn,
+        )
+        started = time.perf_counter()
+
+        def progress(stats):
+            rate = stats.imported / (time.perf_counter() - started)
+            self.stdout.write(f'  {stats.imported:,} imported, {rate:,.0f} rows/s', ending='\r')
+
+        stats = run.run(read(source, start), options['batch_size'], checkpoint, progress)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write('\nUpdating counters, caches and the related-articles queue...')
+        run.finish()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {stats.imported:,} article(s) in {elapsed:.1f} s '
+            f'({stats.imported / elapsed if elapsed else 0:,.0f} rows/s); '
+            f'{stats.skipped:,} skipped, {stats.existing:,} already imported; '
+            f'{stats.images:,} cover image(s), {stats.image_failures:,} failed.'
+        ))
+
+    def warn(self, where, message):
+        # Positions are 0-based line / file numbers; slugs name imported rows
+        where = f'record {where + 1}' if isinstance(where, int) else where
+        self.stderr.write(f'\n  {where}: {message}')
+
+    def default_checkpoint(self, source):
+        digest = hashlib.md5(str(source).encode(), usedforsecurity=False).hexdigest()[:8]
+        return CHECKPOINT_DIR / f'{source.stem}-{digest}.json'
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Drop and rebuild the full-text search index from blog_blogpost "
+        "(needed after bulk_create/update() imports, which skip signals)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            done = search.rebuild(
+                batch_size=options['batch_size'],
+                progress=lambda n: self.stdout.write(f'  {n:,}', ending='\r'),
+            )
+        self.stdout.write(self.style.SUCCESS(f'\nIndexed {done:,} article(s).'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog import cache, counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild Category.published_count and the SiteStats row from blog_blogpost."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = counters.reconcile_categories()
+            stats = counters.reconcile_site_stats()
+        cache.bump(cache.POSTS, cache.CATEGORIES)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{fixed} category count(s) corrected. '
+            f'Site: {stats.total_articles} articles, '
+            f'{stats.total_categories} categories, {stats.total_views} views.'
+        ))
@@ -0,0 +1,78 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+
+from django.core.management.base import BaseCommand
+
+from blog import sanitizer
+from blog.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-sanitize article bodies stored with an outdated policy hash "
+        "(or never sanitized). Cleaning runs in a process pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes (default: CPU count).')
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Articles per worker task and per UPDATE batch.')
+        parser.add_argument('--all', action='store_true',
+                            help='Redo every article, not just stale ones.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        stale = BlogPost.objects.order_by('pk')
+        if not options['all']:
+            stale = stale.exclude(content_policy=sanitizer.POLICY_HASH)
+
+        total = stale.count()
+        if not total:
+            self.stdout.write(self.style.SUCCESS('All articles are up to date.'))
+            return
+        self.stdout.write(f'Re-sanitizing {total:,} article(s) '
+                          f'with {options["workers"]} worker(s)...')
+
+        # 'spawn' workers: blog.sanitizer needs no Django setup and the
+        # children must not inherit this process's DB connection
+        pool = ProcessPoolExecutor(
+            max_workers=options['workers'],
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+        done = 0
+        in_flight = deque()
+        with pool:
+            for rows in self.batches(stale, batch_size):
+                in_flight.append(pool.submit(sanitizer.clean_many, rows))
+                # Keep a bounded number of batches queued
+                if len(in_flight) >= options['workers'] * 2:
+                    done += self.store(in_flight.popleft().result())
+                    self.stdout.write(f'  {done:,}/{total:,}', ending='\r')
+            while in_flight:
+                done += self.store(in_flight.popleft().result())
+                self.stdout.write(f'  {done:,}/{total:,}', ending='\r')
+
+        self.stdout.write(self.style.SUCCESS(f'\nRe-sanitized {done:,} article(s).'))
+
+    def store(self, cleaned):
+        BlogPost.objects.bulk_update(
+            [BlogPost(pk=pk, content_html=html, content_policy=sanitizer.POLICY_HASH)
+             for pk, html in cleaned],
+            ['content_html', 'content_policy'],
+        )
+        return len(cleaned)
+
+    def batches(self, queryset, size):
+        """Keyset walk over (pk, content) so memory stays flat on big tables"""
+        last_pk = 0
+        while True:
+            rows = list(
+                queryset.filter(pk__gt=last_pk).values_list('pk', 'content')[:size]
+            )
+            if not rows:
+                return
+            last_pk = rows[-1][0]
+            yield rows
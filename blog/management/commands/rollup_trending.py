@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog import trending
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the trending list (decayed hourly views) used by the "
+        "featured slot and the popular sidebar, and prune old view buckets."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', type=int, metavar='SECONDS', default=0,
+            help='Keep running, rolling up every SECONDS seconds.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            rows = trending.rollup()
+            self.stdout.write(f'{len(rows)} trending article(s).')
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
@@ -0,0 +1,69 @@
+# Generated by Django 6.0.1 on 2026-10-18 11:27
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_counters(apps, schema_editor):
+    Category = apps.get_model("blog", "Category")
+    BlogPost = apps.get_model("blog", "BlogPost")
+    SiteStats = apps.get_model("blog", "SiteStats")
+
+    published = BlogPost.objects.filter(status="published")
+    counts = dict(
+        published.order_by()
+        .values("category")
+        .annotate(n=Count("id"))
+        .values_list("category", "n")
+    )
+    categories = list(Category.objects.all())
+    for category in categories:
+        category.published_count = counts.get(category.id, 0)
+    Category.objects.bulk_update(categories, ["published_count"], batch_size=500)
+
+    totals = published.aggregate(articles=Count("id"), views=Sum("views"))
+    SiteStats.objects.update_or_create(
+        pk=1,
+        defaults={
+            "total_articles": totals["articles"],
+            "total_categories": len(categories),
+            "total_views": totals["views"] or 0,
+        },
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0003_blogpost_recommended"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SiteStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("total_articles", models.IntegerField(default=0)),
+                ("total_categories", models.IntegerField(default=0)),
+                ("total_views", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Site stats",
+                "verbose_name_plural": "Site stats",
+            },
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="published_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 6.0.1 on 2026-10-18 11:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0004_category_published_count_sitestats"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="blogpost",
+            index=models.Index(
+                fields=["status", "created_at"], name="blog_post_status_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="blogpost",
+            index=models.Index(
+                fields=["status", "views"], name="blog_post_status_views_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="blogpost",
+            index=models.Index(
+                fields=["status", "recommended", "created_at"],
+                name="blog_post_status_recomm_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="blogpost",
+            index=models.Index(
+                fields=["category", "status", "created_at"],
+                name="blog_post_cat_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="blogpost",
+            index=models.Index(
+                fields=["author", "status", "created_at"],
+                name="blog_post_author_status_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 11:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0007_blogpost_excerpt_word_count_reading_time"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="blogpost",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-18 11:52
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from blog import search
+
+    backend = search.get_backend(schema_editor.connection)
+    if backend is None:
+        return  # other databases use the LIKE fallback
+    with schema_editor.connection.cursor() as cursor:
+        backend.create(cursor)
+
+    BlogPost = apps.get_model("blog", "BlogPost")
+    rows = BlogPost.objects.order_by("pk").values_list("pk", "title", "content")
+    batch = []
+    for row in rows.iterator(chunk_size=1000):
+        batch.append(row)
+        if len(batch) == 1000:
+            search.index_rows(batch, schema_editor.connection)
+            batch = []
+    search.index_rows(batch, schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from blog import search
+
+    backend = search.get_backend(schema_editor.connection)
+    if backend is not None:
+        with schema_editor.connection.cursor() as cursor:
+            backend.drop(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0009_blogpost_author_created_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:05
+
+from django.db import migrations
+
+BATCH_SIZE = 200
+
+
+def backfill_content_html(apps, schema_editor):
+    """Sanitize rows that predate content_html (0006 left them empty)"""
+    from blog import sanitizer
+
+    BlogPost = apps.get_model("blog", "BlogPost")
+    stale = BlogPost.objects.filter(content_policy="").order_by("pk")
+    last_pk = 0
+    while True:
+        rows = list(stale.filter(pk__gt=last_pk).values_list("pk", "content")[:BATCH_SIZE])
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        BlogPost.objects.bulk_update(
+            [
+                BlogPost(pk=pk, content_html=html, content_policy=sanitizer.POLICY_HASH)
+                for pk, html in sanitizer.clean_many(rows)
+            ],
+            ["content_html", "content_policy"],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0012_articleviewbucket_trendingarticle"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_content_html, migrations.RunPython.noop),
+    ]
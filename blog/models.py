@@ -1,11 +1,18 @@
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.utils.safestring import mark_safe
+
+from jobs.tasks import enqueue
+
+from . import images, sanitizer, text
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     slug = models.SlugField(max_length=100, unique=True)
+    # Denormalized: number of published articles (see blog/counters.py)
+    published_count = models.IntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name
@@ -14,6 +21,22 @@ class Category(models.Model):
         verbose_name_plural = "Categories"
 
 
+class BlogPostQuerySet(models.QuerySet):
+    """Shared querysets for article listings"""
+
+    def published(self):
+        return self.filter(status='published')
+
+    def for_cards(self):
+        """
+        What a listing card needs: author and category joined in, and no
+        article body (cards show the precomputed `excerpt`).
+        """
+        return self.select_related('author', 'category').defer(
+            'content', 'content_html'
+        )
+
+
 class BlogPost(models.Model):    
         
     STATUS_CHOICES = [
@@ -32,18 +55,167 @@ class BlogPost(models.Model):
     views = models.IntegerField(default=0)
     recommended = models.BooleanField(default=False)  # ← ADD THIS LINE!
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
+    # Sanitized copy of `content` and the policy it was cleaned with (blog/sanitizer.py)
+    content_html = models.TextField(blank=True, editable=False)
+    content_policy = models.CharField(max_length=64, blank=True, editable=False)
+    # Derived from `content` on save (blog/text.py)
+    excerpt = models.TextField(blank=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveSmallIntegerField(default=1, editable=False)  # minutes
+    # Resized WebP/JPEG copies of `image` and their sizes (blog/images.py)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    objects = BlogPostQuerySet.as_manager()
 
     def __str__(self):
         return self.title
+
+    DERIVED_FIELDS = ['content_html', 'content_policy', 'excerpt', 'word_count', 'reading_time']
+
+    def sanitize_content(self):
+        self.content_html = sanitizer.clean(self.content)
+        self.content_policy = sanitizer.POLICY_HASH
+
+    def update_derived_fields(self):
+        """Recompute everything stored alongside `content`"""
+        self.sanitize_content()
+        for field, value in text.derive(self.content).items():
+            setattr(self, field, value)
+
+    @property
+    def safe_content(self):
+        """
+        Sanitized body. Rows stored under an older policy are cleaned again
+        for this render only; `manage.py resanitize_content` stores them.
+        """
+        if self.content_policy != sanitizer.POLICY_HASH:
+            return mark_safe(sanitizer.clean(self.content))
+        return mark_safe(self.content_html)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            self.update_derived_fields()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *self.DERIVED_FIELDS}
+
+        # Counter signals (blog/signals.py) run inside the same transaction,
+        # which holds the row lock their pre_save lookup takes
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            if self.image_variants.get('source') != (self.image.name or None):
+                # Resizing is slow: leave it to the job worker (blog/tasks.py)
+                enqueue('blog.build_image_variants', post_id=self.pk,
+                        dedupe_key=f'image_variants:{self.pk}')
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
+    def update_image_variants(self):
+        """(Re)build the cover image derivatives and drop the old ones"""
+        old = self.image_variants
+        self.image_variants = images.generate_variants(self.image) if self.image else {}
+        BlogPost.objects.filter(pk=self.pk).update(image_variants=self.image_variants)
+        if old:
+            # A rebuild of the same cover rewrites the same paths: keep those
+            images.delete_variants(old, keep=self.image_variants)
+
     class Meta:
         ordering = ['-created_at']  # Newest first
         verbose_name = "Blog Post"
         verbose_name_plural = "Blog Posts"
+        # Composite indexes for the public access paths (status is always
+        # filtered on). See `manage.py bench_indexes`.
+        indexes = [
+            models.Index(fields=['status', 'created_at'],
+                         name='blog_post_status_created_idx'),
+            models.Index(fields=['status', 'views'],
+                         name='blog_post_status_views_idx'),
+            models.Index(fields=['status', 'recommended', 'created_at'],
+                         name='blog_post_status_recomm_idx'),
+            models.Index(fields=['category', 'status', 'created_at'],
+                         name='blog_post_cat_status_idx'),
+            models.Index(fields=['author', 'status', 'created_at'],
+                         name='blog_post_author_status_idx'),
+            # Writer dashboard: all of an author's posts, newest first
+            models.Index(fields=['author', 'created_at'],
+                         name='blog_post_author_created_idx'),
+        ]
 
 
-                                              
+class RelatedArticle(models.Model):
+    """Precomputed "read next" neighbours of an article, see blog/related.py"""
 
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE,
+                             related_name='related_entries')
+    related = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
 
+    def __str__(self):
+        return f"{self.post_id} -> {self.related_id} (#{self.rank})"
+
+    class Meta:
+        ordering = ['post', 'rank']
+        constraints = [
+            # Also the index blog_detail reads through
+            models.UniqueConstraint(fields=['post', 'rank'],
+                                    name='blog_related_post_rank_uniq'),
+        ]
 
 
+class ArticleViewBucket(models.Model):
+    """Views of one article in one clock hour, written by the view counter flush"""
 
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='+')
+    hour = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.post_id} @ {self.hour:%Y-%m-%d %H:00}: {self.views}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'hour'],
+                                    name='blog_viewbucket_post_hour_uniq'),
+        ]
+        indexes = [
+            # Rollup window and pruning
+            models.Index(fields=['hour'], name='blog_viewbucket_hour_idx'),
+        ]
+
+
+class TrendingArticle(models.Model):
+    """Materialized top-N by decayed recent views, see blog/trending.py"""
+
+    rank = models.PositiveSmallIntegerField(unique=True)
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    def __str__(self):
+        return f"#{self.rank}: {self.post_id} ({self.score:.1f})"
+
+    class Meta:
+        ordering = ['rank']
+
+
+class SiteStats(models.Model):
+    """Single row of site-wide counters, kept current by blog/counters.py"""
+
+    total_articles = models.IntegerField(default=0)
+    total_categories = models.IntegerField(default=0)
+    total_views = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return "Site stats"
+
+    @classmethod
+    def load(cls):
+        stats, created = cls.objects.get_or_create(pk=1)
+        return stats
+
+    class Meta:
+        verbose_name = "Site stats"
+        verbose_name_plural = "Site stats"
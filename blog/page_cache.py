@@ -0,0 +1,156 @@
+# blog/page_cache.py
+"""
+Full-page cache for anonymous visitors.
+
+The public pages (CACHEABLE_VIEWS) render the same HTML for everyone who is
+not logged in. PageCacheMiddleware sits near the top of MIDDLEWARE and
+answers a cached GET before sessions, auth or the URL resolver run:
+
+    key = page:<path version>:<path>?<query string>
+
+A request carrying a session cookie (logged-in writers, flash messages)
+always goes through to the view, and so does anything whose response sets
+a cookie.
+
+Each path has its own version tag (blog/cache.py), so purge(path) drops
+every query string of that path (e.g. all ?cursor= pages) at once.
+blog/signals.py purges the pages an article or category change shows up
+on; everything else (view counts, trending, author names, related cards)
+is at most PAGE_CACHE_TIMEOUT seconds stale.
+
+A cached hit on blog_detail still counts the view.
+"""
+
+import hashlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache as django_cache
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from . import cache, view_counter
+
+CACHEABLE_VIEWS = {
+    'home', 'blog_list', 'blog_detail',
+    'category_list', 'category_articles', 'author_articles',
+}
+# Cookies that can change what a page looks like
+BYPASS_COOKIES = (settings.SESSION_COOKIE_NAME, 'messages')
+
+
+def _path_tag(path):
+    return f'page:{path}'
+
+
+def _key(request, version):
+    url = request.get_full_path()
+    digest = hashlib.md5(url.encode(), usedforsecurity=False).hexdigest()
+    return f'page:{version}:{digest}'
+
+
+def purge(*paths):
+    """Drop the cached copies of these paths, whatever their query string"""
+    cache.bump(*[_path_tag(path) for path in paths])
+
+
+def purge_views(*names):
+    """purge() by URL name: purge_views(('blog_detail', [1]), 'home')"""
+    paths = []
+    for name in names:
+        name, args = (name, ()) if isinstance(name, str) else name
+        paths.append(reverse(name, args=args))
+    purge(*paths)
+
+
+class PageCacheMiddleware:
+    sync_capable = True
+    async_capable = True  # keeps the chain async under ASGI (blog/async_views.py)
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        key = self.key(request)
+        if key is None:
+            return self.get_response(request)
+        entry = django_cache.get(key)
+        if entry is not None:
+            if entry['view_post_id'] is not None:
+                view_counter.record_view(entry['view_post_id'])
+            return self.serve(request, entry)
+
+        response = self.get_response(request)
+        if self.should_store(request, response):
+            django_cache.set(key, self.entry(request, response), settings.PAGE_CACHE_TIMEOUT)
+        response.headers['X-Page-Cache'] = 'miss'
+        return response
+
+    async def __acall__(self, request):
+        key = await sync_to_async(self.key)(request)
+        if key is None:
+            return await self.get_response(request)
+        entry = await django_cache.aget(key)
+        if entry is not None:
+            if entry['view_post_id'] is not None:
+                view_counter.record_view_later(entry['view_post_id'])
+            return self.serve(request, entry)
+
+        response = await self.get_response(request)
+        if self.should_store(request, response):
+            await django_cache.aset(key, self.entry(request, response), settings.PAGE_CACHE_TIMEOUT)
+        response.headers['X-Page-Cache'] = 'miss'
+        return response
+
+    def key(self, request):
+        """Cache key for this request, or None if it must reach the view"""
+        if (
+            not settings.PAGE_CACHE_TIMEOUT
+            or request.method not in ('GET', 'HEAD')
+            or any(name in request.COOKIES for name in BYPASS_COOKIES)
+        ):
+            return None
+        tag = _path_tag(request.path)
+        return _key(request, cache.get_versions(tag)[tag])
+
+    def should_store(self, request, response):
+        match = request.resolver_match
+        return (
+            request.method == 'GET'
+            and match is not None
+            and match.url_name in CACHEABLE_VIEWS
+            and response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+        )
+
+    def entry(self, request, response):
+        match = request.resolver_match
+        return {
+            'content': response.content,
+            'headers': list(response.headers.items()),
+            # The view a hit stands in for still has to count it
+            'view_post_id': match.kwargs['id'] if match.url_name == 'blog_detail' else None,
+            'view': match.url_name,
+        }
+
+    def serve(self, request, entry):
+        response = HttpResponse(entry['content'])
+        for name, value in entry['headers']:
+            response.headers[name] = value
+        response.headers['X-Page-Cache'] = 'hit'
+        # The URL resolver never ran; name the view for metrics
+        request.page_cache_view = entry.get('view')
+        return get_conditional_response(
+            request,
+            etag=response.headers.get('ETag'),
+            last_modified=parse_http_date_safe(response.headers.get('Last-Modified', '')),
+            response=response,
+        )
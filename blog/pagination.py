@@ -0,0 +1,193 @@
+# blog/pagination.py
+"""
+Keyset (cursor) pagination.
+
+Paginator(qs, n) costs a COUNT(*) plus an OFFSET scan that grows with the
+page number. KeysetPaginator instead remembers the sort key of the first
+and last row on the page and asks for "the next n rows after this key",
+which an index on the ordering columns answers in the same time on page
+1 and page 10,000.
+
+Cursors are opaque url-safe tokens. The total (for "Page 3 of 40") is
+optional and supplied by the caller, usually from a denormalized counter.
+
+Old ?page=N links are translated with cursor_for_page(), which pays for
+one OFFSET query; normal paging never does.
+"""
+
+import base64
+import datetime
+import json
+import math
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder rounds datetimes to milliseconds; keys must be exact"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, number, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.number = number
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], 'next', self.number + 1)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        if self.number <= 2:
+            return ''  # first page has no cursor
+        return self.paginator.encode_cursor(self.object_list[0], 'prev', self.number - 1)
+
+
+class KeysetPaginator:
+    """
+    Paginate `queryset` over `ordering` (field names, '-' for descending).
+    The last field must be unique (normally the primary key).
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id'), count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self.fields = [f.lstrip('-') for f in self.ordering]
+        self._count = count
+
+    # ----- totals (optional) -----
+
+    @property
+    def count(self):
+        """Total rows if the caller supplied one (int or callable), else None"""
+        if callable(self._count):
+            self._count = self._count()
+        return self._count
+
+    @property
+    def num_pages(self):
+        if self.count is None:
+            return None
+        return max(1, math.ceil(self.count / self.per_page))
+
+    # ----- cursors -----
+
+    def encode_cursor(self, obj, direction, number):
+        return self._token(direction, number, [getattr(obj, field) for field in self.fields])
+
+    def _token(self, direction, number, values):
+        raw = json.dumps([direction, number, list(values)], cls=CursorEncoder)
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def cursor_for_page(self, number):
+        """Cursor of the page-`number` rows ('' for page 1), None past the last page"""
+        if number == 1:
+            return ''
+        start = (number - 1) * self.per_page
+        # The row before the page (the cursor) and the page's first row (it exists)
+        rows = list(
+            self.queryset.order_by(*self.ordering).values_list(*self.fields)[start - 1:start + 1]
+        )
+        if len(rows) < 2:
+            return None
+        return self._token('next', number, rows[0])
+
+    def decode_cursor(self, token):
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            direction, number, values = json.loads(base64.urlsafe_b64decode(padded))
+            model = self.queryset.model
+            values = [
+                model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values, strict=True)
+            ]
+        except Exception as e:
+            raise InvalidCursor(token) from e
+        if direction not in ('next', 'prev') or not isinstance(number, int):
+            raise InvalidCursor(token)
+        return direction, number, values
+
+    def _after(self, values, reverse=False):
+        """Q for rows strictly after `values` in ordering (before, if reverse)"""
+        condition = Q()
+        for i, name in enumerate(self.ordering):
+            descending = name.startswith('-')
+            lookup = 'lt' if descending != reverse else 'gt'
+            step = Q(**{f'{self.fields[i]}__{lookup}': values[i]})
+            for field, value in zip(self.fields[:i], values[:i]):
+                step &= Q(**{field: value})
+            condition |= step
+        return condition
+
+    # ----- pages -----
+
+    def get_page(self, cursor=None):
+        """Page for a cursor token; missing or invalid cursors give page 1"""
+        direction, number, values = 'next', 1, None
+        if cursor:
+            try:
+                direction, number, values = self.decode_cursor(cursor)
+            except InvalidCursor:
+                pass
+
+        if values is None:
+            rows = list(self.queryset.order_by(*self.ordering)[:self.per_page + 1])
+            return self._page(rows, 1, has_previous=False)
+
+        if direction == 'next':
+            rows = list(
+                self.queryset.filter(self._after(values))
+                .order_by(*self.ordering)[:self.per_page + 1]
+            )
+            return self._page(rows, number, has_previous=True)
+
+        reversed_ordering = [
+            f[1:] if f.startswith('-') else f'-{f}' for f in self.ordering
+        ]
+        rows = list(
+            self.queryset.filter(self._after(values, reverse=True))
+            .order_by(*reversed_ordering)[:self.per_page + 1]
+        )
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        return KeysetPage(rows, self, max(number, 1), True, has_previous)
+
+    def _page(self, rows, number, has_previous):
+        has_next = len(rows) > self.per_page
+        return KeysetPage(rows[:self.per_page], self, number, has_next, has_previous)
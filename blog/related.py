@@ -0,0 +1,275 @@
+# blog/related.py
+"""
+"Read next" suggestions: the TOP_K most similar published articles for each
+published article, stored in RelatedArticle so blog_detail needs one indexed
+query.
+
+Similarity is the cosine of TF-IDF vectors (scipy sparse) built from the
+body, the title (weighted up) and the category (a pseudo-term). The model
+(vocabulary, IDF weights, one vector per article) is saved to
+settings.RELATED_INDEX_PATH so later runs can be incremental:
+
+    build()   full rebuild: new vocabulary/IDF, every article recomputed
+    update()  only articles saved since the last run are re-vectorized
+              with the saved vocabulary; they get fresh neighbours, and so
+              does any article whose list they now enter or leave
+
+update() runs from the 'blog.update_related' job a few minutes after an
+edit (blog/signals.py) and from `manage.py build_related`. IDF weights drift
+as articles are added, so a periodic `build_related --full` is worthwhile.
+"""
+
+import math
+import os
+import re
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from . import cache, text
+from .models import BlogPost, RelatedArticle
+
+TOP_K = 4
+# Title words count as this many body words
+TITLE_WEIGHT = 3
+CATEGORY_WEIGHT = 2
+# Ignore terms in fewer than MIN_DF articles or in more than MAX_DF of them
+MIN_DF = 2
+MAX_DF = 0.5
+# Articles per block when multiplying against the whole matrix
+BLOCK_SIZE = 256
+
+TOKEN_RE = re.compile(r"[a-z][a-z0-9']{2,}")
+STOPWORDS = frozenset("""
+    about above after again against all also and any are because been before
+    being below between both but can could did does doing down during each few
+    for from further had has have having her here hers herself him himself his
+    how into its itself just more most myself nor not now off once only other
+    our ours ourselves out over own same she should some such than that the
+    their theirs them themselves then there these they this those through too
+    under until very was were what when where which while who whom why will
+    with would you your yours yourself yourselves
+""".split())
+
+
+# ============================================
+# VECTORS
+# ============================================
+
+def tokens(title, content, category_id):
+    words = [w for w in TOKEN_RE.findall(' '.join(text.plain_words(content)).lower())
+             if w not in STOPWORDS]
+    title_words = [w for w in TOKEN_RE.findall((title or '').lower()) if w not in STOPWORDS]
+    counts = Counter(words)
+    for word in title_words:
+        counts[word] += TITLE_WEIGHT
+    counts[f'category:{category_id}'] += CATEGORY_WEIGHT
+    return counts
+
+
+def fit(docs):
+    """Vocabulary (term -> column) and IDF weights from a list of token Counters"""
+    df = Counter()
+    for counts in docs:
+        df.update(counts.keys())
+    n = len(docs)
+    max_df = max(MIN_DF, MAX_DF * n)
+    kept = sorted(
+        term for term, freq in df.items()
+        if term.startswith('category:') or MIN_DF <= freq <= max_df
+    )
+    vocabulary = {term: i for i, term in enumerate(kept)}
+    idf = np.array([math.log((1 + n) / (1 + df[term])) + 1 for term in kept],
+                   dtype=np.float32)
+    return vocabulary, idf
+
+
+def vectorize(docs, vocabulary, idf):
+    """L2-normalised sublinear TF-IDF rows (CSR, float32)"""
+    indptr, indices, values = [0], [], []
+    for counts in docs:
+        for term, count in counts.items():
+            column = vocabulary.get(term)
+            if column is not None:
+                indices.append(column)
+                values.append((1 + math.log(count)) * idf[column])
+        indptr.append(len(indices))
+    matrix = sparse.csr_matrix(
+        (np.array(values, dtype=np.float32), np.array(indices, dtype=np.int32), indptr),
+        shape=(len(docs), len(vocabulary)),
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix, dtype=np.float32)
+
+
+def nearest(rows, row_ids, matrix, ids):
+    """
+    {post_id: [(related_id, score), ...]} for `rows` (vectors of the posts
+    `row_ids`) against every vector in `matrix` (posts `ids`), best first
+    """
+    position = {int(pk): i for i, pk in enumerate(ids)}
+    k = min(TOP_K, len(ids) - 1)
+    result = {}
+    for start in range(0, rows.shape[0], BLOCK_SIZE):
+        block_ids = [int(pk) for pk in row_ids[start:start + BLOCK_SIZE]]
+        scores = (rows[start:start + BLOCK_SIZE] @ matrix.T).toarray()
+        for offset, post_id in enumerate(block_ids):
+            if post_id in position:
+                scores[offset, position[post_id]] = 0  # not related to itself
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k > 0 else None
+        for offset, post_id in enumerate(block_ids):
+            row = scores[offset]
+            columns = sorted(top[offset], key=lambda i: -row[i]) if k > 0 else []
+            result[post_id] = [(int(ids[i]), float(row[i])) for i in columns if row[i] > 0]
+    return result
+
+
+# ============================================
+# STATE
+# ============================================
+
+def _load_state():
+    path = settings.RELATED_INDEX_PATH
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        return {
+            'ids': data['ids'],
+            'matrix': sparse.csr_matrix(
+                (data['data'], data['indices'], data['indptr']), shape=tuple(data['shape'])
+            ),
+            'terms': list(data['terms']),
+            'idf': data['idf'],
+            'built_at': float(data['built_at']),
+        }
+
+
+def _save_state(ids, matrix, vocabulary, idf, built_at):
+    path = settings.RELATED_INDEX_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    terms = sorted(vocabulary, key=vocabulary.get)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npz')
+    with os.fdopen(fd, 'wb') as file:
+        np.savez(
+            file, ids=ids, data=matrix.data, indices=matrix.indices,
+            indptr=matrix.indptr, shape=np.array(matrix.shape),
+            terms=np.array(terms, dtype=str), idf=idf, built_at=built_at,
+        )
+    os.replace(tmp, path)  # readers never see a half-written file
+
+
+def _published_docs(queryset):
+    rows = queryset.values_list('pk', 'title', 'content', 'category_id')
+    ids, docs = [], []
+    for pk, title, content, category_id in rows.iterator(chunk_size=2000):
+        ids.append(pk)
+        docs.append(tokens(title, content, category_id))
+    return np.array(ids, dtype=np.int64), docs
+
+
+def _store(neighbours, replace_all=False):
+    """Replace the RelatedArticle rows of the posts in `neighbours` (or all rows)"""
+    with transaction.atomic():
+        stale = RelatedArticle.objects.all()
+        if not replace_all:
+            stale = stale.filter(post_id__in=list(neighbours))
+        stale.delete()
+        RelatedArticle.objects.bulk_create([
+            RelatedArticle(post_id=post_id, related_id=related_id, rank=rank, score=score)
+            for post_id, related in neighbours.items()
+            for rank, (related_id, score) in enumerate(related, start=1)
+        ], batch_size=1000)
+    cache.bump(cache.RELATED)
+
+
+# ============================================
+# BUILD / UPDATE
+# ============================================
+
+def build(progress=None):
+    """Full rebuild. Returns the number of articles processed."""
+    started = time.time()
+    ids, docs = _published_docs(BlogPost.objects.published().order_by('pk'))
+    vocabulary, idf = fit(docs)
+    matrix = vectorize(docs, vocabulary, idf)
+
+    neighbours = {}
+    for start in range(0, len(ids), BLOCK_SIZE * 4):
+        stop = start + BLOCK_SIZE * 4
+        neighbours.update(nearest(matrix[start:stop], ids[start:stop], matrix, ids))
+        if progress:
+            progress(min(stop, len(ids)))
+
+    _store(neighbours, replace_all=True)
+    _save_state(ids, matrix, vocabulary, idf, started)
+    return len(ids)
+
+
+def update():
+    """
+    Recompute what changed since the last build()/update(). Falls back to a
+    full build() when there is no saved state. Returns the number of
+    articles whose neighbours were recomputed.
+    """
+    state = _load_state()
+    if state is None:
+        return build()
+
+    started = time.time()
+    built_at = datetime.fromtimestamp(state['built_at'], tz=timezone.utc)
+    vocabulary = {term: i for i, term in enumerate(state['terms'])}
+    ids, matrix = state['ids'], state['matrix']
+
+    published = set(BlogPost.objects.published().values_list('pk', flat=True))
+    changed_ids, changed_docs = _published_docs(
+        BlogPost.objects.published().filter(updated_at__gte=built_at).order_by('pk')
+    )
+    removed = {int(pk) for pk in ids if pk not in published}
+    stale = removed | set(changed_ids.tolist())
+    new = published - {int(pk) for pk in ids} - stale
+    if new:  # published without a save (e.g. a bulk status update)
+        extra_ids, extra_docs = _published_docs(BlogPost.objects.filter(pk__in=new))
+        changed_ids = np.concatenate([changed_ids, extra_ids])
+        changed_docs += extra_docs
+        stale |= set(extra_ids.tolist())
+    if not stale:
+        _save_state(ids, matrix, vocabulary, state['idf'], started)
+        return 0
+
+    # Swap the changed rows of the saved matrix for fresh vectors
+    keep = ~np.isin(ids, list(stale))
+    changed_matrix = vectorize(changed_docs, vocabulary, state['idf'])
+    ids = np.concatenate([ids[keep], changed_ids])
+    matrix = sparse.vstack([matrix[keep], changed_matrix], format='csr')
+
+    # Articles whose list mentions a changed/removed article, or that a
+    # changed article now beats the current last entry of
+    affected = set(
+        RelatedArticle.objects.filter(related_id__in=list(stale))
+        .values_list('post_id', flat=True)
+    )
+    kth = dict(
+        RelatedArticle.objects.filter(rank=TOP_K).values_list('post_id', 'score')
+    )
+    if changed_matrix.shape[0]:
+        for start in range(0, changed_matrix.shape[0], BLOCK_SIZE):
+            scores = (changed_matrix[start:start + BLOCK_SIZE] @ matrix.T).toarray().max(axis=0)
+            for i in np.nonzero(scores > 0)[0]:
+                if scores[i] > kth.get(int(ids[i]), 0):
+                    affected.add(int(ids[i]))
+    affected = (affected | set(changed_ids.tolist())) - removed
+
+    rows = np.nonzero(np.isin(ids, list(affected)))[0]
+    neighbours = nearest(matrix[rows], ids[rows], matrix, ids)
+    with transaction.atomic():
+        RelatedArticle.objects.filter(post_id__in=list(removed)).delete()
+        _store(neighbours)
+    _save_state(ids, matrix, vocabulary, state['idf'], started)
+    return len(neighbours)
@@ -0,0 +1,76 @@
+# blog/sanitizer.py
+"""
+HTML sanitizing policy for article bodies.
+
+Articles are cleaned once when saved (BlogPost.content_html) together with
+POLICY_HASH. Changing the lists below changes the hash, and rows cleaned
+under the old policy are redone by `manage.py resanitize_content` (run it
+after deploying a policy change; until then they are cleaned again on
+every render, never written back from a request).
+
+Kept free of Django imports so it can run in worker processes.
+"""
+
+import hashlib
+import json
+
+import bleach
+
+# Allowed HTML tags
+ALLOWED_TAGS = [
+    'p', 'br', 'hr',
+    'strong', 'b', 'em', 'i', 'u', 's',
+    'h2', 'h3', 'h4', 'h5', 'h6',
+    'ul', 'ol', 'li',
+    'a',
+    'blockquote',
+    'table', 'thead', 'tbody', 'tr', 'th', 'td',
+    'figure', 'figcaption',
+    'span', 'div',
+]
+
+# Allowed attributes per tag
+ALLOWED_ATTRIBUTES = {
+    'a': ['href', 'title', 'target'],
+    'img': ['src', 'alt', 'title'],
+    'table': ['class'],
+    'td': ['colspan', 'rowspan'],
+    'th': ['colspan', 'rowspan'],
+    '*': ['class'],  # Allow class on all tags
+}
+
+# Allowed URL schemes for links
+ALLOWED_PROTOCOLS = ['http', 'https', 'mailto']
+
+
+def _policy_hash():
+    policy = {
+        'tags': sorted(ALLOWED_TAGS),
+        'attributes': {tag: sorted(attrs) for tag, attrs in ALLOWED_ATTRIBUTES.items()},
+        'protocols': sorted(ALLOWED_PROTOCOLS),
+        'strip': True,
+        # Output can change between bleach releases too
+        'bleach': bleach.__version__,
+    }
+    return hashlib.sha256(json.dumps(policy, sort_keys=True).encode()).hexdigest()
+
+
+POLICY_HASH = _policy_hash()
+
+
+def clean(value):
+    """Sanitize an HTML string with the current policy"""
+    if not value:
+        return ''
+    return bleach.clean(
+        value,
+        tags=ALLOWED_TAGS,
+        attributes=ALLOWED_ATTRIBUTES,
+        protocols=ALLOWED_PROTOCOLS,
+        strip=True  # Remove disallowed tags entirely (don't escape them)
+    )
+
+
+def clean_many(rows):
+    """[(id, html), ...] -> [(id, clean html), ...] (used by worker pools)"""
+    return [(pk, clean(value)) for pk, value in rows]
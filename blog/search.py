@@ -0,0 +1,298 @@
+# blog/search.py
+"""
+Full-text search over articles.
+
+The index is a separate table holding each post's title and plain-text body,
+keyed by the post id:
+
+    SQLite (PythonAnywhere)  blog_search, an FTS5 virtual table, ranked by bm25()
+    MySQL                    blog_search with FULLTEXT indexes, ranked by
+                             MATCH ... AGAINST relevance, title weighted
+
+Every post is indexed whatever its status: the public search joins back to
+blog_blogpost and keeps published rows only, the admin searches everything.
+Signals (blog/signals.py) keep the index in sync on save/delete; rows written
+with bulk_create/update() need `manage.py rebuild_search_index`.
+
+    search.search('homelander serum', limit=10)  # [SearchHit(post_id, snippet), ...]
+    search.filter_queryset(BlogPost.objects.all(), 'serum')
+
+Other databases fall back to LIKE queries, so the site still works there.
+"""
+
+import re
+from collections import namedtuple
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from . import text
+
+TABLE = 'blog_search'
+# Words of query we look at; the rest is ignored
+MAX_TERMS = 8
+SNIPPET_WORDS = 30
+# A title hit counts this many times a body hit when ranking
+TITLE_WEIGHT = 5.0
+
+# Private-use characters mark highlights in snippets until they are escaped
+MARK_START, MARK_END = '\ue000', '\ue001'
+
+SearchHit = namedtuple('SearchHit', 'post_id snippet')
+
+
+def terms(query):
+    """Lowercased words of a user query, punctuation and operators dropped"""
+    return re.findall(r'\w+', (query or '').lower())[:MAX_TERMS]
+
+
+def document(title, content):
+    """(title, body) as stored in the index"""
+    return title or '', ' '.join(text.plain_words(content))
+
+
+def render_snippet(raw):
+    """Escape a snippet and turn the highlight markers into <mark>"""
+    escaped = escape(raw)
+    return mark_safe(
+        escaped.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+    )
+
+
+# ============================================
+# BACKENDS
+# ============================================
+
+class SQLiteBackend:
+    """FTS5 with Porter stemming; bm25() returns lower = better"""
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+            "title, body, tokenize = 'porter unicode61 remove_diacritics 2')"
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def remove(self, cursor, ids):
+        if not ids:
+            return
+        cursor.execute(
+            f"DELETE FROM {TABLE} WHERE rowid IN ({', '.join(['%s'] * len(ids))})",
+            list(ids),
+        )
+
+    def index(self, cursor, rows):
+        self.remove(cursor, [pk for pk, _, _ in rows])
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, title, body) VALUES (%s, %s, %s)', rows
+        )
+
+    def match(self, words):
+        # Each word quoted (no FTS operators from user input), last one as prefix
+        return ' '.join(f'"{word}"' for word in words) + '*'
+
+    def ids_sql(self, words):
+        return f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [self.match(words)]
+
+    def search(self, cursor, words, limit, offset):
+        # Rank first, then build snippets for the page only: snippet() in
+        # the ranking query would run for every match before the LIMIT
+        match = self.match(words)
+        cursor.execute(
+            f"WITH top AS ("
+            f"  SELECT s.rowid AS id, bm25({TABLE}, %s, 1.0) AS score"
+            f"  FROM {TABLE} s JOIN blog_blogpost p ON p.id = s.rowid"
+            f"  WHERE {TABLE} MATCH %s AND p.status = 'published'"
+            f"  ORDER BY score LIMIT %s OFFSET %s"
+            f") "
+            f"SELECT s.rowid, snippet({TABLE}, 1, %s, %s, '…', %s) "
+            f"FROM top JOIN {TABLE} s ON s.rowid = top.id "
+            f"WHERE {TABLE} MATCH %s ORDER BY top.score",
+            [TITLE_WEIGHT, match, limit, offset,
+             MARK_START, MARK_END, SNIPPET_WORDS, match],
+        )
+        return cursor.fetchall()
+
+
+class MySQLBackend:
+    """
+    InnoDB FULLTEXT: boolean mode requires every word, natural-language
+    relevance ranks. Words shorter than innodb_ft_min_token_size (3) or in
+    the stopword list are not indexed.
+    """
+
+    def create(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {TABLE} ('
+            '  post_id BIGINT NOT NULL PRIMARY KEY,'
+            '  title VARCHAR(200) NOT NULL,'
+            '  body LONGTEXT NOT NULL,'
+            f'  FULLTEXT KEY {TABLE}_title_ft (title),'
+            f'  FULLTEXT KEY {TABLE}_ft (title, body)'
+            ') ENGINE=InnoDB DEFAULT CHARSET=utf8mb4'
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def remove(self, cursor, ids):
+        if not ids:
+            return
+        cursor.execute(
+            f"DELETE FROM {TABLE} WHERE post_id IN ({', '.join(['%s'] * len(ids))})",
+            list(ids),
+        )
+
+    def index(self, cursor, rows):
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (post_id, title, body) VALUES (%s, %s, %s) '
+            'ON DUPLICATE KEY UPDATE title = VALUES(title), body = VALUES(body)',
+            rows,
+        )
+
+    def match(self, words):
+        return ' '.join(f'+{word}' for word in words) + '*'
+
+    def ids_sql(self, words):
+        return (
+            f'SELECT post_id FROM {TABLE} '
+            'WHERE MATCH (title, body) AGAINST (%s IN BOOLEAN MODE)',
+            [self.match(words)],
+        )
+
+    def search(self, cursor, words, limit, offset):
+        natural = ' '.join(words)
+        cursor.execute(
+            f'SELECT s.post_id, s.body FROM {TABLE} s '
+            'JOIN blog_blogpost p ON p.id = s.post_id '
+            "WHERE MATCH (s.title, s.body) AGAINST (%s IN BOOLEAN MODE) "
+            "AND p.status = 'published' "
+            'ORDER BY MATCH (s.title) AGAINST (%s) * %s '
+            '+ MATCH (s.title, s.body) AGAINST (%s) DESC '
+            'LIMIT %s OFFSET %s',
+            [self.match(words), natural, TITLE_WEIGHT, natural, limit, offset],
+        )
+        return [(pk, highlight(body, words)) for pk, body in cursor.fetchall()]
+
+
+def highlight(body, words):
+    """FTS5 snippet() in Python: a window of the body around the first hit"""
+    tokens = body.split()
+    pattern = re.compile(
+        r'\b(' + '|'.join(re.escape(word) for word in words) + r')', re.IGNORECASE
+    )
+    first = next((i for i, token in enumerate(tokens) if pattern.search(token)), 0)
+    start = max(0, first - SNIPPET_WORDS // 3)
+    window = ' '.join(tokens[start:start + SNIPPET_WORDS])
+    window = pattern.sub(lambda m: f'{MARK_START}{m.group(0)}{MARK_END}', window)
+    prefix = '…' if start else ''
+    suffix = '…' if start + SNIPPET_WORDS < len(tokens) else ''
+    return f'{prefix}{window}{suffix}'
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'mysql': MySQLBackend,
+}
+
+
+def get_backend(conn=None):
+    """The backend for a connection, or None (LIKE fallback)"""
+    backend = BACKENDS.get((conn or connection).vendor)
+    return backend() if backend else None
+
+
+# ============================================
+# INDEXING
+# ============================================
+
+def index_rows(rows, conn=None):
+    """Index (pk, title, content) tuples"""
+    conn = conn or connection
+    backend = get_backend(conn)
+    if backend and rows:
+        with conn.cursor() as cursor:
+            backend.index(cursor, [(pk, *document(title, content))
+                                   for pk, title, content in rows])
+
+
+def index_post(post):
+    index_rows([(post.pk, post.title, post.content)])
+
+
+def remove_post(pk):
+    backend = get_backend()
+    if backend:
+        with connection.cursor() as cursor:
+            backend.remove(cursor, [pk])
+
+
+def rebuild(batch_size=1000, progress=None):
+    """Recreate the index from every post. Returns the number indexed."""
+    from .models import BlogPost
+
+    backend = get_backend()
+    if not backend:
+        return 0
+    with connection.cursor() as cursor:
+        backend.drop(cursor)
+        backend.create(cursor)
+
+    done = last_pk = 0
+    queryset = BlogPost.objects.order_by('pk').values_list('pk', 'title', 'content')
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not rows:
+            return done
+        index_rows(rows)
+        last_pk = rows[-1][0]
+        done += len(rows)
+        if progress:
+            progress(done)
+
+
+# ============================================
+# QUERYING
+# ============================================
+
+def search(query, limit=10, offset=0):
+    """Published posts matching `query`, best first, with highlighted snippets"""
+    words = terms(query)
+    if not words:
+        return []
+    backend = get_backend()
+    if not backend:
+        return _like_search(words, limit, offset)
+    with connection.cursor() as cursor:
+        rows = backend.search(cursor, words, limit, offset)
+    return [SearchHit(pk, render_snippet(raw)) for pk, raw in rows]
+
+
+def filter_queryset(queryset, query):
+    """Narrow a BlogPost queryset to posts matching `query` (any status)"""
+    words = terms(query)
+    if not words:
+        return queryset
+    backend = get_backend()
+    if not backend:
+        for word in words:
+            queryset = queryset.filter(Q(title__icontains=word) | Q(content__icontains=word))
+        return queryset
+    sql, params = backend.ids_sql(words)
+    return queryset.filter(pk__in=RawSQL(sql, params))
+
+
+def _like_search(words, limit, offset):
+    from .models import BlogPost
+
+    queryset = filter_queryset(BlogPost.objects.published(), ' '.join(words))
+    rows = queryset.order_by('-created_at').values_list('pk', 'content')[offset:offset + limit]
+    return [
+        SearchHit(pk, render_snippet(highlight(document('', content)[1], words)))
+        for pk, content in rows
+    ]
@@ -0,0 +1,102 @@
+# blog/seed.py
+"""
+Synthetic data for benchmarks (bench_indexes, bench and friends).
+
+Everything is inserted with bulk_create, so model signals do not run;
+seed() finishes by rebuilding the denormalized counters. Pass derived=True
+to also fill what save() would (sanitized HTML, excerpt, reading time):
+slower, but pages then render like real ones.
+"""
+
+import random
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from . import counters
+from .models import BlogPost, Category
+
+WORDS = (
+    'vought supe cover leak memo board payout lab compound serum homelander '
+    'deep train maeve stormfront tower contract witness ledger offshore '
+    'statement hearing senator footage incident victims settlement press '
+    'investigation evidence source classified project budget shareholders'
+).split()
+
+
+@contextmanager
+def explicit_created_at():
+    """Let bulk_create keep the created_at we assign instead of now()"""
+    field = BlogPost._meta.get_field('created_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def paragraph(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def article_html(rng, paragraphs=6):
+    return '\n'.join(
+        f'<p>{paragraph(rng, rng.randint(40, 120))}</p>' for _ in range(paragraphs)
+    )
+
+
+def seed(posts=1000, users=50, categories=8, published_ratio=0.9,
+         recommended_ratio=0.05, paragraphs=6, days=5 * 365,
+         batch_size=2000, seed=0, derived=False, progress=None):
+    """
+    Insert `users` writers, `categories` categories and `posts` articles
+    spread over the last `days` days. Returns (users, categories).
+    """
+    rng = random.Random(seed)
+    run = uuid.uuid4().hex[:6]  # keeps usernames/slugs unique across runs
+
+    # Re-read after bulk_create: MySQL doesn't return the new primary keys
+    User.objects.bulk_create([
+        User(username=f'bench{run}u{i}', email=f'bench{run}u{i}@example.com')
+        for i in range(users)
+    ], batch_size=batch_size)
+    authors = list(User.objects.filter(username__startswith=f'bench{run}u'))
+
+    Category.objects.bulk_create([
+        Category(name=f'Bench {i}', slug=f'bench-{run}-{i}',
+                 description=paragraph(rng, 12))
+        for i in range(categories)
+    ], batch_size=batch_size)
+    cats = list(Category.objects.filter(slug__startswith=f'bench-{run}-'))
+
+    now = timezone.now()
+    created = 0
+    with explicit_created_at():
+        while created < posts:
+            batch = []
+            for i in range(created, min(created + batch_size, posts)):
+                when = now - timedelta(seconds=rng.randrange(days * 86400))
+                batch.append(BlogPost(
+                    title=paragraph(rng, 6)[:200],
+                    slug=f'bench-{run}-{i}',
+                    content=article_html(rng, paragraphs),
+                    author=rng.choice(authors),
+                    category=rng.choice(cats),
+                    created_at=when,
+                    views=int(rng.paretovariate(1.2) * 10),
+                    recommended=rng.random() < recommended_ratio,
+                    status='published' if rng.random() < published_ratio else 'draft',
+                ))
+                if derived:
+                    batch[-1].update_derived_fields()
+            BlogPost.objects.bulk_create(batch)
+            created += len(batch)
+            if progress:
+                progress(created)
+
+    counters.reconcile_categories()
+    counters.reconcile_site_stats()
+    return authors, cats
@@ -0,0 +1,160 @@
+# blog/signals.py
+
+from datetime import timedelta
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.contrib.auth.models import User
+from django.dispatch import receiver
+
+from jobs.tasks import enqueue
+
+from . import cache, counters, images, page_cache, search
+from .models import BlogPost, Category
+
+
+# ============================================
+# DENORMALIZED COUNTERS
+# ============================================
+
+@receiver(pre_save, sender=BlogPost)
+def remember_counted_state(sender, instance, **kwargs):
+    """
+    Look up the stored row so post_save can tell what changed. It is locked
+    until BlogPost.save()'s transaction ends: two concurrent saves would
+    otherwise both see 'draft' and both count the publish.
+    """
+    old = None
+    if instance.pk:
+        old = BlogPost.objects.select_for_update().filter(pk=instance.pk).only(
+            'status', 'category_id', 'views'
+        ).first()
+    instance._counted_state = counters.post_state(old)
+    instance._stored_category_id = old.category_id if old else None
+
+
+@receiver(post_save, sender=BlogPost)
+def update_post_counters(sender, instance, **kwargs):
+    old = getattr(instance, '_counted_state', None)
+    counters.apply_post_change(old, counters.post_state(instance))
+    instance._counted_state = counters.post_state(instance)
+
+
+@receiver(post_delete, sender=BlogPost)
+def remove_post_from_counters(sender, instance, **kwargs):
+    counters.apply_post_change(counters.post_state(instance), None)
+
+
+@receiver(post_save, sender=Category)
+def count_new_category(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust_site_stats(categories=1)
+
+
+@receiver(post_delete, sender=Category)
+def uncount_category(sender, instance, **kwargs):
+    counters.adjust_site_stats(categories=-1)
+
+
+# ============================================
+# FILE CLEANUP
+# ============================================
+
+@receiver(post_delete, sender=BlogPost)
+def delete_post_files(sender, instance, **kwargs):
+    """Remove the cover and its derivatives once the delete commits"""
+    paths = [instance.image.name] + images.variant_paths(instance.image_variants)
+    if any(paths):
+        enqueue('blog.delete_files', paths=[path for path in paths if path])
+
+
+# ============================================
+# SEARCH INDEX
+# ============================================
+
+@receiver(post_save, sender=BlogPost)
+def index_post_for_search(sender, instance, update_fields=None, **kwargs):
+    """Reindex unless the save was limited to fields search doesn't use"""
+    if update_fields is None or {'title', 'content'} & set(update_fields):
+        search.index_post(instance)
+
+
+@receiver(post_delete, sender=BlogPost)
+def remove_post_from_search(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+
+
+# ============================================
+# RELATED ARTICLES
+# ============================================
+
+# Edits within this window are picked up by one incremental update
+RELATED_UPDATE_DELAY = timedelta(minutes=5)
+
+
+@receiver(post_save, sender=BlogPost)
+def schedule_related_update(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'title', 'content', 'category', 'status'} & set(update_fields):
+        enqueue('blog.update_related', dedupe_key='related', delay=RELATED_UPDATE_DELAY)
+
+
+@receiver(post_delete, sender=BlogPost)
+def schedule_related_cleanup(sender, instance, **kwargs):
+    enqueue('blog.update_related', dedupe_key='related', delay=RELATED_UPDATE_DELAY)
+
+
+# ============================================
+# CACHE INVALIDATION
+# ============================================
+# Bumps and purges wait for the commit: done earlier, a request in between
+# would rebuild the cache from the old rows under the new version.
+
+@receiver([post_save, post_delete], sender=BlogPost)
+def bump_posts_version(sender, instance, **kwargs):
+    """Any article change invalidates cached listings and stats"""
+    transaction.on_commit(partial(cache.bump, cache.POSTS))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def bump_categories_version(sender, instance, **kwargs):
+    """Category edits show up on home, sidebars and category pages"""
+    transaction.on_commit(partial(cache.bump, cache.CATEGORIES))
+
+
+# ============================================
+# PAGE CACHE (blog/page_cache.py)
+# ============================================
+
+@receiver([post_save, post_delete], sender=BlogPost)
+def purge_post_pages(sender, instance, **kwargs):
+    """The article, its category (old and new) and author pages, and the listings"""
+    category_ids = {instance.category_id, getattr(instance, '_stored_category_id', None)}
+    slugs = Category.objects.filter(pk__in=category_ids - {None}).values_list('slug', flat=True)
+    username = User.objects.filter(pk=instance.author_id).values_list('username', flat=True).first()
+    transaction.on_commit(partial(
+        page_cache.purge_views,
+        'home', 'blog_list', 'category_list',  # published counts
+        ('blog_detail', [instance.pk]),
+        *[('category_articles', [slug]) for slug in slugs],
+        *([('author_articles', [username])] if username else []),
+    ))
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_slug(sender, instance, **kwargs):
+    instance._stored_slug = (
+        Category.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver([post_save, post_delete], sender=Category)
+def purge_category_pages(sender, instance, **kwargs):
+    """Articles only show the category name, so their pages just expire"""
+    slugs = {instance.slug, getattr(instance, '_stored_slug', None)} - {None}
+    transaction.on_commit(partial(
+        page_cache.purge_views,
+        'home', 'blog_list', 'category_list',
+        *[('category_articles', [slug]) for slug in slugs],
+    ))
@@ -0,0 +1,160 @@
+# blog/static_images.py
+"""
+Build-time derivatives for the hero PNGs in static/images/.
+
+The originals are 1.2-1.8MB each. During collectstatic, HeroImageStorage
+writes resized AVIF (when Pillow supports it), WebP and JPEG copies with
+content-hashed names, plus a manifest mapping logical names to them:
+
+    images/home.png
+    images/derived/home-320.3f9c1a2b7d4e.avif, home-320.8a0b....webp, ...
+    images/derived/manifest.json
+
+Hashed files never change under the same URL, so the web server can serve
+images/derived/ with "Cache-Control: public, max-age=31536000, immutable".
+
+Templates ask for a logical name ({% hero_image 'home' %}, see
+blog/templatetags/image_tags.py). The logical name is the file stem,
+lowercased, with spaces/dashes as underscores: 'Hero_time_thief.png' and
+'hero-stormfront.png' are 'hero_time_thief' and 'hero_stormfront'.
+"""
+
+import hashlib
+import io
+import json
+import os
+import posixpath
+
+from django.contrib.staticfiles.storage import StaticFilesStorage
+from django.core.files.base import ContentFile
+from PIL import features
+
+from .images import encode, open_image, resize
+
+SOURCE_DIR = 'images'
+DERIVED_DIR = 'images/derived'
+MANIFEST_NAME = 'images/derived/manifest.json'
+SOURCE_EXTENSIONS = ('.png',)
+
+# The heroes are displayed at most ~550px wide; 960 covers 2x screens
+WIDTHS = (320, 640, 960)
+
+# Best first: the <picture> tag lists <source>s in this order, the last one
+# is the plain <img> fallback
+FORMATS = {
+    'avif': ('AVIF', {'quality': 55, 'speed': 6}),
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+if not features.check('avif'):
+    del FORMATS['avif']
+
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpg': 'image/jpeg'}
+
+
+def logical_name(path):
+    stem = os.path.splitext(posixpath.basename(path))[0]
+    return stem.strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def is_source(path):
+    return (
+        posixpath.dirname(path) == SOURCE_DIR
+        and path.lower().endswith(SOURCE_EXTENSIONS)
+    )
+
+
+def _digest(content):
+    return hashlib.md5(content, usedforsecurity=False).hexdigest()
+
+
+def _hashed_name(name, width, fmt, content):
+    return posixpath.join(DERIVED_DIR, f'{name}-{width}.{_digest(content)[:12]}.{fmt}')
+
+
+def _encode_variant(image, fmt):
+    if fmt == 'jpg':
+        return encode(image, fmt)  # flattens transparency onto the dark background
+    pil_format, options = FORMATS[fmt]
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def build_entry(storage, path, source):
+    """Write every derivative of one source image and return its manifest entry"""
+    original = open_image(io.BytesIO(source))
+    name = logical_name(path)
+    entry = {
+        'source': path,
+        'source_hash': _digest(source),
+        'formats': list(FORMATS),
+        'width': original.width,
+        'height': original.height,
+        'variants': [],
+    }
+    seen_widths = set()
+    for width in WIDTHS:
+        resized = resize(original, width)
+        if resized.width in seen_widths:
+            continue  # source narrower than this width: don't upscale
+        seen_widths.add(resized.width)
+        variant = {'width': resized.width, 'height': resized.height}
+        for fmt in FORMATS:
+            content = _encode_variant(resized, fmt)
+            hashed = _hashed_name(name, resized.width, fmt, content)
+            if not storage.exists(hashed):
+                storage.save(hashed, ContentFile(content))
+            variant[fmt] = hashed
+        entry['variants'].append(variant)
+    return entry
+
+
+def read_manifest(storage):
+    try:
+        with storage.open(MANIFEST_NAME) as file:
+            return json.loads(file.read().decode())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _is_current(storage, entry, source_hash):
+    return (
+        entry
+        and entry.get('source_hash') == source_hash
+        and list(entry.get('formats', [])) == list(FORMATS)
+        and all(storage.exists(v[fmt]) for v in entry['variants'] for fmt in FORMATS)
+    )
+
+
+def build(storage, paths):
+    """
+    (Re)build derivatives for the source images among `paths` and rewrite the
+    manifest. Unchanged sources are skipped. Yields each processed path.
+    """
+    old = read_manifest(storage).get('images', {})
+    images = {}
+    for path in sorted(p for p in paths if is_source(p)):
+        name = logical_name(path)
+        with storage.open(path) as file:
+            source = file.read()
+        if _is_current(storage, old.get(name), _digest(source)):
+            images[name] = old[name]
+            continue
+        images[name] = build_entry(storage, path, source)
+        yield path
+
+    if storage.exists(MANIFEST_NAME):
+        storage.delete(MANIFEST_NAME)
+    payload = json.dumps({'version': 1, 'images': images}, indent=2, sort_keys=True)
+    storage.save(MANIFEST_NAME, ContentFile(payload.encode()))
+
+
+class HeroImageStorage(StaticFilesStorage):
+    """StaticFilesStorage that builds the hero image derivatives in collectstatic"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        for path in build(self, paths):
+            yield path, path, True
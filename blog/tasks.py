@@ -0,0 +1,36 @@
+# blog/tasks.py
+"""Deferred work for the blog app, run by `manage.py run_jobs` (see jobs/tasks.py)."""
+
+from django.core.files.storage import default_storage
+
+from jobs.tasks import task
+
+from . import images
+from .models import BlogPost
+
+
+@task('blog.build_image_variants')
+def build_image_variants(post_id):
+    """Generate cover derivatives unless they are already current"""
+    post = BlogPost.objects.filter(pk=post_id).only('id', 'image', 'image_variants').first()
+    if post is None:
+        return  # article deleted since
+    if post.image_variants.get('source') == (post.image.name or None):
+        return  # already done (retry, or an earlier job covered it)
+    post.update_image_variants()
+
+
+@task('blog.delete_files')
+def delete_files(paths):
+    """Remove files from storage (old covers and their derivatives)"""
+    for path in paths:
+        if path and default_storage.exists(path):
+            default_storage.delete(path)
+
+
+@task('blog.update_related')
+def update_related():
+    """Refresh "read next" lists for articles saved since the last run"""
+    from . import related  # numpy/scipy: only loaded in the worker
+
+    related.update()
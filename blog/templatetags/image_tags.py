@@ -0,0 +1,136 @@
+from functools import lru_cache
+
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from blog import static_images
+
+register = template.Library()
+
+# `sizes` hint per variant, matching the Bootstrap grid the images sit in
+SIZES_ATTR = {
+    'card': '(min-width: 992px) 33vw, (min-width: 768px) 50vw, 100vw',
+    'detail': '(min-width: 992px) 83vw, 100vw',
+    'og': '1200px',
+}
+HERO_SIZES_ATTR = '(min-width: 992px) 550px, 100vw'
+
+
+def _srcset(entries, fmt):
+    return ', '.join(
+        f"{default_storage.url(entry[fmt])} {entry['width']}w" for entry in entries
+    )
+
+
+def _variant_entries(article, variant):
+    """
+    The variant's sizes, or None if there are none or they were built from
+    a cover that has since been replaced (the rebuild job hasn't run yet)
+    """
+    variants = article.image_variants or {}
+    if not article.image or variants.get('source') != article.image.name:
+        return None
+    return variants.get(variant)
+
+
+@register.simple_tag
+def cover_image(article, variant='card', **attrs):
+    """
+    <picture> for an article cover: WebP and JPEG srcsets from
+    article.image_variants, or the original upload if none exist for the
+    current cover yet.
+
+        {% cover_image article 'card' class='card-img-top' %}
+    """
+    attrs.setdefault('alt', article.title)
+    entries = _variant_entries(article, variant)
+    if not entries:
+        return format_html('<img src="{}"{}>', article.image.url, flatatt(attrs))
+
+    largest = entries[-1]
+    attrs.setdefault('loading', 'lazy' if variant == 'card' else 'eager')
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}"{}>'
+        '</picture>',
+        _srcset(entries, 'webp'), SIZES_ATTR[variant],
+        default_storage.url(largest['jpg']), _srcset(entries, 'jpg'),
+        SIZES_ATTR[variant], largest['width'], largest['height'], flatatt(attrs),
+    )
+
+
+@register.filter
+def variant_url(article, variant):
+    """URL of the largest JPEG of a variant (e.g. og:image), or the original"""
+    entries = _variant_entries(article, variant)
+    if entries:
+        return default_storage.url(entries[-1]['jpg'])
+    return article.image.url if article.image else ''
+
+
+# ============================================
+# STATIC HERO IMAGES
+# ============================================
+
+@lru_cache(maxsize=1)
+def _hero_manifest():
+    if not settings.STATIC_IMAGE_VARIANTS:
+        return {}
+    return static_images.read_manifest(staticfiles_storage).get('images', {})
+
+
+@lru_cache(maxsize=1)
+def _hero_sources():
+    """Logical name -> original static path, for when there is no manifest"""
+    sources = {}
+    for finder in finders.get_finders():
+        for path, _ in finder.list([]):
+            path = path.replace('\\', '/')
+            if static_images.is_source(path):
+                sources.setdefault(static_images.logical_name(path), path)
+    return sources
+
+
+@register.simple_tag
+def hero_image(name, **attrs):
+    """
+    <picture> for a static hero image by logical name, using the derivatives
+    collectstatic built (blog/static_images.py). Falls back to the original
+    PNG when there is no manifest (development) or no entry for the name.
+
+        {% hero_image 'home' class='img-fluid hero-float' alt='Exposed Hero' %}
+    """
+    attrs.setdefault('alt', '')
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    sizes = attrs.pop('sizes', HERO_SIZES_ATTR)
+
+    entry = _hero_manifest().get(name)
+    if not entry:
+        source = _hero_sources().get(name, f'images/{name}.png')
+        return format_html('<img src="{}"{}>', static(source), flatatt(attrs))
+
+    variants = entry['variants']
+    largest = variants[-1]
+    *modern, fallback = entry['formats']
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((static_images.MIME_TYPES[fmt], _static_srcset(variants, fmt), sizes)
+         for fmt in modern),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}"{}></picture>',
+        sources, static(largest[fallback]), _static_srcset(variants, fallback), sizes,
+        largest['width'], largest['height'], flatatt(attrs),
+    )
+
+
+def _static_srcset(variants, fmt):
+    return ', '.join(f"{static(v[fmt])} {v['width']}w" for v in variants)
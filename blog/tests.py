@@ -1,8 +1,820 @@
+import asyncio
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO
+from pathlib import Path
+from unittest import mock
 
-from django.test import TestCase
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.models import User
+from django.core import checks as system_checks
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, include, path, reverse
+from PIL import Image
 
-# Create your tests here.
+from vleaks_project import metrics
+from vleaks_project.query_audit import QueryBudgetMixin, fingerprint
 
+from . import (
+    async_views, cache as tags, checks, images, importer, related, search, trending, urls,
+    view_counter,
+)
+from .models import ArticleViewBucket, BlogPost, Category, RelatedArticle, SiteStats
+from .templatetags import image_tags
 
 
+class FingerprintTests(TestCase):
 
+    def test_literals_and_lists_collapse(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id = 3 AND name = 'x''y'"),
+            fingerprint("SELECT * FROM t WHERE id = 12 AND name = 'z'"),
+        )
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s)'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s, %s)'),
+        )
+
+
+class MetricsTests(TestCase):
+
+    DEAD_PID = 2 ** 30  # above any pid_max: never a live process
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.directory = Path(directory)
+        self.enterContext(override_settings(
+            METRICS_ENABLED=True, METRICS_DIR=directory, METRICS_TOKEN='s3cret'))
+
+    def write(self, name, data):
+        (self.directory / name).write_text(json.dumps(data))
+
+    def test_token_is_required(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer nope'}).status_code, 401)
+        response = self.client.get(url, headers={'Authorization': 'Bearer s3cret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '# TYPE vleaks_http_request_duration_seconds histogram')
+
+    def test_no_token_only_with_debug(self):
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+            with override_settings(DEBUG=True):
+                self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    def test_processes_add_up_and_dead_ones_are_folded(self):
+        home = json.dumps(['home', '200'])
+        own = metrics.REQUESTS.values.get(home, 0)
+        buckets = [0] * (len(metrics.BUCKETS) + 1)
+        latency = {json.dumps(['home']): [*buckets[:2], 2, *buckets[3:], 0.03]}
+        self.write(f'{os.getpid()}-1.json', {
+            metrics.REQUESTS.name: {home: 3},
+            metrics.LATENCY.name: latency,
+        })
+        self.write(f'{self.DEAD_PID}-1.json', {
+            metrics.REQUESTS.name: {home: 5},
+            metrics.LATENCY.name: latency,
+            metrics.VIEWS_PENDING.name: {'[]': 7},
+        })
+        self.write(metrics.DEAD_FILE, {metrics.REQUESTS.name: {home: 10}})
+
+        totals = metrics.collect()
+        self.assertEqual(totals[metrics.REQUESTS.name][home], own + 18)
+        self.assertEqual(totals[metrics.LATENCY.name][json.dumps(['home'])][2], 4)
+        self.assertFalse((self.directory / f'{self.DEAD_PID}-1.json').exists())
+        dead = json.loads((self.directory / metrics.DEAD_FILE).read_text())
+        self.assertEqual(dead[metrics.REQUESTS.name][home], 15)
+        self.assertNotIn(metrics.VIEWS_PENDING.name, dead)  # gauges die with the process
+
+        text = metrics.render(totals)
+        self.assertIn(f'vleaks_http_requests_total{{view="home",status="200"}} {own + 18}', text)
+        self.assertIn('vleaks_http_request_duration_seconds_bucket{view="home",le="0.025"} 4', text)
+        self.assertIn('vleaks_http_request_duration_seconds_count{view="home"} 4', text)
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_SLOW_MS=60_000, PAGE_CACHE_TIMEOUT=0)
+class ProfilingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('editor', password='x', is_staff=True)
+        cls.reader = User.objects.create_user('reader', password='x')
+        category = Category.objects.create(name='Leaks', slug='leaks')
+        BlogPost.objects.create(title='Read me', slug='read-me', content='<p>x</p>',
+                                author=cls.staff, category=category, status='published')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing_for_staff(self):
+        self.client.force_login(self.staff)
+        timing = self.client.get(reverse('blog_list'))['Server-Timing']
+        self.assertEqual(re.findall(r'(\w+);dur=', timing), ['total', 'db', 'tpl', 'cache', 'app'])
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+
+    def test_no_server_timing_for_the_public(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('blog_list')).headers)
+        self.client.force_login(self.reader)
+        self.assertNotIn('Server-Timing', self.client.get(reverse('blog_list')).headers)
+
+    async def test_async_stack_checks_the_user_too(self):
+        response = await self.async_client.get(reverse('blog_list'))
+        self.assertNotIn('Server-Timing', response.headers)
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse('blog_list'))
+        self.assertIn('Server-Timing', response.headers)
+
+    @override_settings(DEBUG=True)
+    def test_server_timing_with_debug(self):
+        self.assertIn('Server-Timing', self.client.get(reverse('blog_list')).headers)
+
+    @override_settings(PROFILING_SLOW_MS=0)
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs('vleaks.profiling', 'WARNING') as logs:
+            self.client.get(reverse('blog_list'))
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual((entry['event'], entry['view'], entry['status']),
+                         ('slow_request', 'blog_list', 200))
+        self.assertGreater(entry['queries'], 0)
+        self.assertLessEqual(len(entry['top_queries']), 5)
+
+
+# Cold requests: no cached pages, fragments or contexts
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Public pages stay within blog.urls.QUERY_BUDGETS whatever the row count"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [User.objects.create_user(f'writer{i}', password='x') for i in range(2)]
+        cls.categories = [
+            Category.objects.create(name=f'Category {i}', slug=f'category-{i}')
+            for i in range(3)
+        ]
+        cls.posts = [
+            BlogPost.objects.create(
+                title=f'Article {i}', slug=f'article-{i}', content=f'<p>Body {i}</p>',
+                author=cls.authors[i % 2], category=cls.categories[i % 3],
+                status='published', recommended=i % 2 == 0,
+            )
+            for i in range(8)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def assertBudget(self, name, args=(), **extra):
+        return self.assertQueryBudget(urls.QUERY_BUDGETS, name, args, **extra)
+
+    def test_every_url_has_a_budget(self):
+        names = {p.name for p in get_resolver(urls).url_patterns if p.name}
+        self.assertEqual(names, set(urls.QUERY_BUDGETS))
+
+    def test_home(self):
+        self.assertBudget('home')
+
+    def test_blog_list(self):
+        self.assertBudget('blog_list')
+
+    def test_blog_detail(self):
+        self.assertBudget('blog_detail', [self.posts[0].pk])
+
+    def test_search_articles(self):
+        self.assertBudget('search_articles', data={'q': 'body'})
+
+    def test_category_list(self):
+        self.assertBudget('category_list')
+
+    def test_category_articles(self):
+        self.assertBudget('category_articles', [self.categories[0].slug])
+
+    def test_author_articles(self):
+        self.assertBudget('author_articles', [self.authors[0].username])
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer', password='x')
+        category = Category.objects.create(name='Leaks', slug='leaks')
+        cls.post = BlogPost.objects.create(title='Read me', slug='read-me', content='<p>x</p>',
+                                           author=author, category=category, status='published')
+
+    def setUp(self):
+        cache.clear()
+        self.enterContext(mock.patch.object(view_counter, '_buffer', view_counter.LocalViewBuffer()))
+
+    def test_unchanged_page_is_304_later(self):
+        url = reverse('blog_detail', args=[self.post.pk])
+        first = self.client.get(url)
+        with mock.patch('time.time', return_value=time.time() + 3600):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'],
+                                       HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(view_counter.pending_views(self.post.pk), 2)  # a 304 still counts
+
+    def test_edit_changes_the_validators(self):
+        first = self.client.get(reverse('blog_list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = 'Edited'
+            self.post.save()
+        response = self.client.get(reverse('blog_list'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=60)
+class PageCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer', password='x')
+        category = Category.objects.create(name='Leaks', slug='leaks')
+        cls.post = BlogPost.objects.create(title='Read me', slug='read-me', content='<p>x</p>',
+                                           author=author, category=category, status='published')
+
+    def setUp(self):
+        cache.clear()
+        self.enterContext(mock.patch.object(view_counter, '_buffer', view_counter.LocalViewBuffer()))
+
+    def test_second_anonymous_get_is_a_hit(self):
+        first = self.client.get(reverse('blog_list'))
+        self.assertEqual(first['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('blog_list'))
+        self.assertEqual(second['X-Page-Cache'], 'hit')
+        self.assertEqual(second.content, first.content)
+
+    def test_session_and_message_cookies_bypass(self):
+        self.client.get(reverse('blog_list'))
+        for name in ('sessionid', 'messages'):
+            with self.subTest(cookie=name):
+                self.client.cookies.clear()
+                self.client.cookies[name] = 'x'
+                self.assertNotIn('X-Page-Cache', self.client.get(reverse('blog_list')).headers)
+
+    def test_edit_purges_the_article(self):
+        url = reverse('blog_detail', args=[self.post.pk])
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'hit')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = 'Edited title'
+            self.post.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Edited title')
+
+    def test_cached_detail_still_counts_the_view(self):
+        url = reverse('blog_detail', args=[self.post.pk])
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'hit')
+        self.assertEqual(view_counter.pending_views(self.post.pk), 2)
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class SidebarFragmentTests(TestCase):
+    """blog_list renders its sidebar once per version of SIDEBAR_TAGS"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer', password='x')
+        cls.category = Category.objects.create(name='Leaks', slug='leaks')
+        cls.post = BlogPost.objects.create(title='Quiet story', slug='quiet', content='<p>x</p>',
+                                           author=author, category=cls.category,
+                                           status='published')
+
+    def setUp(self):
+        cache.clear()
+
+    def queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('blog_list'))
+        return response, len(queries)
+
+    def test_cached_fragment_skips_the_sidebar_queries(self):
+        _, cold = self.queries()
+        response, warm = self.queries()
+        # latest, recommended, categories, trending (+ its all-time fallback)
+        self.assertEqual(cold - warm, 5)
+        self.assertContains(response, 'Latest Exposés')
+
+    def test_changes_rerender_the_fragment(self):
+        self.queries()
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Brand new desk', slug='new-desk')
+        self.assertContains(self.queries()[0], 'Brand new desk')
+
+        self.assertNotContains(self.queries()[0], "Editor's Picks")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.recommended = True
+            self.post.save()
+        self.assertContains(self.queries()[0], "Editor's Picks")
+
+
+class AsyncURLs:
+    """The URLconf blog/urls.py builds with ASYNC_VIEWS on"""
+    urlpatterns = [
+        path('', async_views.home, name='home'),
+        path('blog/', async_views.blog_list, name='blog_list'),
+        path('blog/<int:id>/', async_views.blog_detail, name='blog_detail'),
+        *[pattern for pattern in urls.urlpatterns
+          if pattern.name not in ('home', 'blog_list', 'blog_detail')],
+        path('writer/', include('writer.urls')),
+    ]
+
+
+# gather() queries from worker threads, each on its own connection, so the
+# rows must be committed (TransactionTestCase) for them to see anything
+@override_settings(ASYNC_VIEWS=True, ROOT_URLCONF=AsyncURLs, PAGE_CACHE_TIMEOUT=0)
+class AsyncViewTests(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.enterContext(mock.patch.object(view_counter, '_buffer', view_counter.LocalViewBuffer()))
+        author = User.objects.create_user('writer', password='x')
+        category = Category.objects.create(name='Leaks', slug='leaks')
+        self.post, self.draft = [
+            BlogPost.objects.create(title=title, slug=slug, content=f'<p>{title} body</p>',
+                                    author=author, category=category, status=status)
+            for title, slug, status in [('Public story', 'public', 'published'),
+                                        ('Secret draft', 'secret', 'draft')]
+        ]
+
+    async def test_home_and_list(self):
+        for name in ('home', 'blog_list'):
+            with self.subTest(name):
+                response = await self.async_client.get(reverse(name))
+                self.assertContains(response, 'Public story')
+                self.assertNotContains(response, 'Secret draft')
+        # Second list request renders the cached sidebar fragment
+        self.assertContains(await self.async_client.get(reverse('blog_list')), 'Latest Exposés')
+
+    async def test_detail_counts_the_view(self):
+        response = await self.async_client.get(reverse('blog_detail', args=[self.post.pk]))
+        self.assertTrue(iscoroutinefunction(response.resolver_match.func))
+        self.assertContains(response, '<p>Public story body</p>')
+        self.assertEqual(response.context['article'].views, 1)
+        await asyncio.gather(*view_counter._background_tasks)
+        self.assertEqual(view_counter.pending_views(self.post.pk), 1)
+
+    async def test_detail_304_still_counts(self):
+        url = reverse('blog_detail', args=[self.post.pk])
+        first = await self.async_client.get(url)
+        response = await self.async_client.get(url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 304)
+        await asyncio.gather(*view_counter._background_tasks)
+        self.assertEqual(view_counter.pending_views(self.post.pk), 2)
+
+    async def test_drafts_are_404(self):
+        response = await self.async_client.get(reverse('blog_detail', args=[self.draft.pk]))
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get(reverse('blog_detail', args=[12345]))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class LegacyPageTests(TestCase):
+    """Old ?page=N links land on the same rows through a cursor"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer', password='x')
+        category = Category.objects.create(name='Leaks', slug='leaks')
+        cls.posts = [
+            BlogPost.objects.create(title=f'Article {i}', slug=f'article-{i}', content='<p>x</p>',
+                                    author=author, category=category, status='published')
+            for i in range(12)
+        ]
+
+    def test_page_redirects_to_its_cursor(self):
+        response = self.client.get(reverse('blog_list'), {'page': 2})
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn('page=', response.url)
+        page = self.client.get(response.url).context['articles']
+        self.assertEqual(page.number, 2)
+        self.assertEqual(list(page), list(BlogPost.objects.order_by('-created_at', '-id')[5:10]))
+
+    def test_page_one_drops_the_parameter(self):
+        response = self.client.get(reverse('blog_list'), {'page': 1})
+        self.assertRedirects(response, reverse('blog_list'))
+
+    def test_unknown_pages_are_404(self):
+        for page in ('4', '0', 'last'):
+            with self.subTest(page=page):
+                self.assertEqual(self.client.get(reverse('blog_list'), {'page': page}).status_code, 404)
+
+
+class ImporterTests(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user('writer', password='x')
+        self.category = Category.objects.create(name='Leaks', slug='leaks')
+        BlogPost.objects.create(title='Taken', slug='taken', content='<p>x</p>',
+                                author=self.author, category=self.category)
+        self.dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.source = self.dir / 'articles.jsonl'
+        records = [
+            {'title': 'Taken', 'content': '<p>One</p>', 'status': 'published'},
+            {'title': 'Taken', 'content': '<p>Two two</p>', 'status': 'published'},
+            {'title': 'No body'},
+            {'title': 'New', 'content': '<p>Three</p>', 'category': 'Fresh'},
+            {'title': 'Numeric author', 'content': '<p>Four</p>', 'author': 42},
+        ]
+        self.source.write_text('\n'.join(json.dumps(r) for r in records))
+
+    def run_import(self, **options):
+        run = importer.Importer(default_author='writer', default_category='leaks',
+                                create_missing=True, **options)
+        checkpoint = importer.Checkpoint(self.dir / 'checkpoint.json', self.source)
+        start = checkpoint.load()
+        stats = run.run(importer.read_jsonl(self.source, start), 2, checkpoint)
+        run.finish()
+        return stats
+
+    def test_import(self):
+        stats = self.run_import()
+        self.assertEqual((stats.imported, stats.skipped), (4, 1))
+        self.assertEqual(
+            set(BlogPost.objects.values_list('slug', flat=True)),
+            {'taken', 'taken-2', 'taken-3', 'new', 'numeric-author'},
+        )
+        post = BlogPost.objects.get(slug='taken-3')
+        self.assertEqual(post.word_count, 2)
+        self.assertEqual(post.content_html, '<p>Two two</p>')
+        self.assertEqual(Category.objects.get(slug='leaks').published_count, 3)
+        self.assertEqual(Category.objects.get(name='Fresh').published_count, 1)
+        self.assertEqual(User.objects.get(username='42').blogpost_set.count(), 1)
+        self.assertEqual(SiteStats.load().total_articles, 4)
+
+    def test_resume_skips_committed_batches(self):
+        self.run_import()
+        self.assertEqual(self.run_import().imported, 0)
+        self.assertEqual(BlogPost.objects.count(), 5)
+
+    def test_failed_batch_removes_its_covers(self):
+        cover = self.dir / 'cover.png'
+        Image.new('RGB', (800, 500), (0, 0, 200)).save(cover)
+        self.source.write_text(json.dumps(
+            {'title': 'Cover', 'content': '<p>x</p>', 'image': str(cover)}
+        ))
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        with override_settings(MEDIA_ROOT=media), \
+                mock.patch.object(BlogPost.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.run_import()
+            self.assertEqual([files for _, _, files in os.walk(media) if files], [])
+
+    def test_markdown(self):
+        self.assertEqual(
+            importer.markdown_to_html('Some **bold** and [a](https://x.org)\n\n- one\n- two'),
+            '<p>Some <strong>bold</strong> and <a href="https://x.org">a</a></p>\n'
+            '<ul><li>one</li><li>two</li></ul>',
+        )
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer', password='x')
+        category = Category.objects.create(name='Leaks', slug='leaks')
+
+        def post(slug, title, content, status='published'):
+            return BlogPost.objects.create(title=title, slug=slug, content=content,
+                                           author=author, category=category, status=status)
+
+        cls.in_body = post('body', 'Vought memo', '<p>The serum shipments were <b>delayed</b>.</p>')
+        cls.in_title = post('title', 'Serum shipments', '<p>Nothing to see here.</p>')
+        cls.draft = post('draft', 'Serum draft', '<p>serum</p>', status='draft')
+        post('other', 'Unrelated', '<p>Homelander & the Seven</p>')
+
+    def test_published_matches_title_first(self):
+        hits = search.search('serum')
+        self.assertEqual([hit.post_id for hit in hits], [self.in_title.pk, self.in_body.pk])
+
+    def test_stemming_and_prefix(self):
+        self.assertEqual([hit.post_id for hit in search.search('shipment')][:1], [self.in_title.pk])
+        self.assertEqual({hit.post_id for hit in search.search('ser')},
+                         {self.in_title.pk, self.in_body.pk})
+
+    def test_snippet_is_highlighted_and_escaped(self):
+        BlogPost.objects.filter(pk=self.in_body.pk).update(content='<p>serum <script></p>')
+        search.index_post(BlogPost.objects.get(pk=self.in_body.pk))
+        snippet = {hit.post_id: hit.snippet for hit in search.search('serum')}[self.in_body.pk]
+        self.assertIn('<mark>serum</mark>', snippet)
+        self.assertNotIn('<script>', snippet)
+
+    def test_operators_are_plain_words(self):
+        self.assertEqual(search.search('serum OR "NEAR(" *'), [])
+        self.assertEqual(search.search('  !!  '), [])
+
+    def test_filter_queryset_includes_drafts(self):
+        found = search.filter_queryset(BlogPost.objects.all(), 'serum')
+        self.assertEqual(set(found), {self.in_body, self.in_title, self.draft})
+
+    def test_deleted_posts_leave_the_index(self):
+        self.in_title.delete()
+        self.assertEqual([hit.post_id for hit in search.search('serum')], [self.in_body.pk])
+
+    def test_results_page(self):
+        response = self.client.get(reverse('search_articles'), {'q': 'serum'})
+        self.assertContains(response, '<mark>')
+        self.assertNotContains(response, 'Serum draft')
+
+    def test_highlight_windows_the_first_hit(self):
+        body = ' '.join(['filler'] * 50 + ['Serum'] + ['tail'] * 50)
+        snippet = search.highlight(body, ['serum'])
+        self.assertTrue(snippet.startswith('…') and snippet.endswith('…'))
+        self.assertIn(f'{search.MARK_START}Serum{search.MARK_END}', snippet)
+
+
+class RelatedArticlesTests(TestCase):
+
+    TOPICS = {
+        'serum': 'serum compound vought laboratory',
+        'senate': 'senate ballot election campaign',
+        'reef': 'ocean reef coral diving',
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer', password='x')
+        category = Category.objects.create(name='Leaks', slug='leaks')
+        cls.posts = {
+            (topic, i): BlogPost.objects.create(
+                title=f'{topic.title()} story {i}', slug=f'{topic}-{i}',
+                content=f'<p>{words} report{i} notes{i}</p>',
+                author=author, category=category, status='published',
+            )
+            for topic, words in cls.TOPICS.items() for i in range(3)
+        }
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.enterContext(override_settings(
+            RELATED_INDEX_PATH=os.path.join(directory, 'related.npz')))
+
+    def related(self, key, top=related.TOP_K):
+        """Slugs of the `top` best neighbours (the shared category links everything weakly)"""
+        return set(RelatedArticle.objects.filter(post=self.posts[key], rank__lte=top)
+                   .values_list('related__slug', flat=True))
+
+    def test_build_ranks_the_same_topic_first(self):
+        self.assertEqual(related.build(), 9)
+        for topic in self.TOPICS:
+            self.assertEqual(self.related((topic, 0), top=2), {f'{topic}-1', f'{topic}-2'})
+        ranks = RelatedArticle.objects.filter(post=self.posts['serum', 0]).values_list('rank', flat=True)
+        self.assertEqual(sorted(ranks), list(range(1, related.TOP_K + 1)))
+
+    def test_update_recomputes_only_what_changed(self):
+        related.build()
+        moved = self.posts['reef', 2]
+        moved.content = f"<p>{self.TOPICS['serum']}</p>"
+        moved.save()
+        unpublished = self.posts['senate', 2]
+        unpublished.status = 'draft'
+        unpublished.save()
+
+        self.assertLess(related.update(), 9)
+        self.assertIn('reef-2', self.related(('serum', 0), top=3))
+        self.assertEqual(self.related(('reef', 0), top=1), {'reef-1'})
+        self.assertLessEqual(self.related(('reef', 2), top=2), {'serum-0', 'serum-1', 'serum-2'})
+        self.assertEqual(self.related(('senate', 0), top=1), {'senate-1'})
+        self.assertNotIn('senate-2', self.related(('senate', 0)))
+        self.assertEqual(self.related(('senate', 2)), set())
+
+    def test_update_without_saved_state_builds(self):
+        self.assertEqual(related.update(), 9)
+
+
+class TrendingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer', password='x')
+        category = Category.objects.create(name='Leaks', slug='leaks')
+        cls.old, cls.fresh, cls.stale, cls.draft = [
+            BlogPost.objects.create(title=slug, slug=slug, content='<p>x</p>', author=author,
+                                    category=category, status=status, views=views)
+            for slug, status, views in [('old', 'published', 500), ('fresh', 'published', 0),
+                                        ('stale', 'published', 0), ('draft', 'draft', 0)]
+        ]
+
+    def setUp(self):
+        self.now = trending.current_hour()
+
+    def views(self, post, count, hours_ago):
+        trending.record_views({post.pk: count}, now=self.now - timedelta(hours=hours_ago))
+
+    def test_views_add_up_per_hour(self):
+        self.views(self.fresh, 2, 0)
+        self.views(self.fresh, 3, 0)
+        self.views(self.fresh, 1, 1)
+        self.assertEqual(
+            list(ArticleViewBucket.objects.filter(post=self.fresh).order_by('hour')
+                 .values_list('views', flat=True)),
+            [1, 5],
+        )
+
+    def test_recent_views_outweigh_older_ones(self):
+        self.views(self.old, 100, 48)    # two half-lives: scores 25
+        self.views(self.fresh, 30, 0)    # scores 30
+        self.views(self.stale, 1000, 24 * 8)  # outside the window
+        self.views(self.draft, 1000, 0)
+        rows = trending.rollup(now=self.now)
+
+        self.assertEqual([row.post_id for row in rows], [self.fresh.pk, self.old.pk])
+        self.assertAlmostEqual(rows[1].score, 25.0, places=3)
+        self.assertEqual(trending.top(5), [self.fresh, self.old])
+        self.assertFalse(ArticleViewBucket.objects.filter(post=self.stale).exists())
+
+    def test_rollup_bumps_the_trending_tag(self):
+        before = tags.get_versions(tags.TRENDING)[tags.TRENDING]
+        trending.rollup(now=self.now)
+        self.assertNotEqual(tags.get_versions(tags.TRENDING)[tags.TRENDING], before)
+
+    def test_all_time_views_before_the_first_rollup(self):
+        self.assertEqual(trending.top(1), [self.old])
+
+
+class SafeContentTests(TestCase):
+
+    def test_stale_policy_is_cleaned_without_writing(self):
+        author = User.objects.create_user('writer', password='x')
+        category = Category.objects.create(name='Leaks', slug='leaks')
+        post = BlogPost.objects.create(title='Old', slug='old', author=author, category=category,
+                                       content='<p>Body</p><script>x()</script>')
+        BlogPost.objects.filter(pk=post.pk).update(content_html='', content_policy='')
+        post.refresh_from_db()
+        with self.assertNumQueries(0):
+            self.assertEqual(post.safe_content, '<p>Body</p>x()')
+        self.assertEqual(BlogPost.objects.get(pk=post.pk).content_policy, '')
+
+
+class CacheInvalidationTests(TestCase):
+
+    def test_versions_are_bumped_after_the_commit(self):
+        cache.clear()
+        before = tags.get_versions(tags.POSTS, tags.CATEGORIES)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Category.objects.create(name='Leaks', slug='leaks')
+            self.assertEqual(tags.get_versions(tags.POSTS, tags.CATEGORIES), before)
+        self.assertTrue(callbacks)
+        after = tags.get_versions(tags.POSTS, tags.CATEGORIES)
+        self.assertEqual(after[tags.POSTS], before[tags.POSTS])
+        self.assertNotEqual(after[tags.CATEGORIES], before[tags.CATEGORIES])
+
+    @override_settings(VIEW_COUNTER_BACKEND='cache', CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }})
+    def test_cache_view_counter_needs_a_shared_cache(self):
+        errors = checks.check_view_counter_backend(None)
+        self.assertEqual([error.id for error in errors], ['blog.E001'])
+        self.assertEqual(errors[0].level, system_checks.ERROR)
+
+
+class ImageVariantTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+
+    def test_rebuilding_keeps_the_files_it_wrote(self):
+        buffer = BytesIO()
+        Image.new('RGB', (1000, 600), (200, 0, 0)).save(buffer, 'PNG')
+        author = User.objects.create_user('writer', password='x')
+        category = Category.objects.create(name='Leaks', slug='leaks')
+        post = BlogPost.objects.create(title='Cover', slug='cover', content='<p>x</p>',
+                                       author=author, category=category)
+        post.image.save('cover.png', ContentFile(buffer.getvalue()), save=False)
+
+        post.update_image_variants()
+        post.update_image_variants()
+        paths = images.variant_paths(post.image_variants)
+        self.assertTrue(paths)
+        self.assertTrue(all(default_storage.exists(path) for path in paths))
+
+    def test_variants_of_a_replaced_cover_are_not_served(self):
+        post = BlogPost(title='Cover', image='posts/new.png', image_variants={
+            'source': 'posts/old.png',
+            'card': [{'width': 400, 'height': 240, 'webp': 'old-400.webp', 'jpg': 'old-400.jpg'}],
+        })
+        html = image_tags.cover_image(post, 'card')
+        self.assertIn(post.image.url, html)
+        self.assertNotIn('old-400', html)
+        self.assertEqual(image_tags.variant_url(post, 'card'), post.image.url)
+
+        post.image_variants['source'] = 'posts/new.png'
+        self.assertIn('old-400.webp', image_tags.cover_image(post, 'card'))
+
+
+class ViewBufferTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_local_buffer(self):
+        buffer = view_counter.LocalViewBuffer()
+        buffer.add(1)
+        buffer.add(1)
+        buffer.add(2, 3)
+        self.assertEqual((buffer.pending(1), buffer.total()), (2, 5))
+        self.assertEqual(buffer.drain(), {1: 2, 2: 3})
+        self.assertEqual(buffer.total(), 0)
+        buffer.restore({1: 2})
+        self.assertEqual((buffer.pending(1), buffer.total()), (2, 2))
+
+    def test_cache_buffer(self):
+        buffer = view_counter.CacheViewBuffer()
+        buffer.add(1)
+        buffer.add(1)
+        buffer.add(2)
+        self.assertEqual((buffer.pending(1), buffer.total()), (2, 3))
+        self.assertEqual(buffer.drain(), {1: 2, 2: 1})
+        self.assertEqual((buffer.pending(1), buffer.total()), (0, 0))
+        # Drained posts are queued again by their next view
+        buffer.add(1)
+        self.assertEqual(buffer.drain(), {1: 1})
+        buffer.restore({2: 4})
+        self.assertEqual(buffer.drain(), {2: 4})
+
+    def queue_without_slot(self, buffer, post_id):
+        """add() stopped between taking a slot number and writing the slot"""
+        buffer._incr(buffer._key('count', post_id))
+        buffer._incr(buffer._key('total'))
+        cache.add(buffer._key('dirty', post_id), 1)
+        return buffer._incr(buffer._key('seq'))
+
+    def test_cache_buffer_waits_for_a_slot_being_written(self):
+        buffer = view_counter.CacheViewBuffer()
+        slot = self.queue_without_slot(buffer, 7)
+        buffer.add(8)  # queued after the slot in flight
+        self.assertEqual(buffer.drain(), {})
+        cache.set(buffer._key('slot', slot), 7)
+        self.assertEqual(buffer.drain(), {7: 1, 8: 1})
+
+    def test_cache_buffer_skips_an_evicted_slot(self):
+        buffer = view_counter.CacheViewBuffer()
+        self.queue_without_slot(buffer, 7)
+        buffer.add(8)
+        self.assertEqual(buffer.drain(), {})
+        self.assertEqual(buffer.drain(), {8: 1})
+        # Once its marker expires, the next view queues the post again
+        cache.delete(buffer._key('dirty', 7))
+        buffer.add(7)
+        self.assertEqual(buffer.drain(), {7: 2})
+
+
+@override_settings(VIEW_COUNTER_FLUSH_INTERVAL=30, VIEW_COUNTER_BACKGROUND_FLUSH=False)
+class ViewCounterFlushTests(TestCase):
+
+    def setUp(self):
+        author = User.objects.create_user('writer', password='x')
+        category = Category.objects.create(name='Leaks', slug='leaks')
+        self.post = BlogPost.objects.create(title='Read me', slug='read-me', content='<p>x</p>',
+                                            author=author, category=category, status='published')
+        self.enterContext(mock.patch.object(view_counter, '_buffer', view_counter.LocalViewBuffer()))
+
+    def test_flush_writes_buffered_views(self):
+        for _ in range(3):
+            view_counter.record_view(self.post.pk)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.views, view_counter.pending_views(self.post.pk)), (0, 3))
+
+        self.assertEqual(view_counter.flush(), 3)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 3)
+        self.assertEqual(SiteStats.load().total_views, 3)
+        self.assertEqual(view_counter.pending_total(), 0)
+
+    def test_failed_flush_keeps_the_views(self):
+        view_counter.record_view(self.post.pk)
+        with mock.patch.object(view_counter, '_apply', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                view_counter.flush()
+        self.assertEqual(view_counter.pending_views(self.post.pk), 1)
+        self.assertEqual(view_counter.flush(), 1)
+
+    def test_discard_writes_nothing(self):
+        view_counter.record_view(self.post.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(view_counter.discard(), 1)
+        self.assertEqual((view_counter.pending_total(), view_counter.flush()), (0, 0))
@@ -0,0 +1,26 @@
+# blog/text.py
+"""Plain-text fields derived from an article body (excerpt, word count, reading time)."""
+
+import html
+import math
+
+from django.utils.html import strip_tags
+
+# Words kept in BlogPost.excerpt; cards truncate further (10-30 words)
+EXCERPT_WORDS = 40
+WORDS_PER_MINUTE = 200
+
+
+def plain_words(value):
+    # Space before every tag so "</p><p>" doesn't glue words together
+    return html.unescape(strip_tags((value or '').replace('<', ' <'))).split()
+
+
+def derive(value):
+    """Field values for BlogPost.excerpt, word_count and reading_time"""
+    words = plain_words(value)
+    return {
+        'excerpt': ' '.join(words[:EXCERPT_WORDS]),
+        'word_count': len(words),
+        'reading_time': max(1, math.ceil(len(words) / WORDS_PER_MINUTE)),
+    }
@@ -0,0 +1,112 @@
+# blog/trending.py
+"""
+"Trending" ranking: recent views, exponentially decayed.
+
+The view counter flush (blog/view_counter.py) adds each batch of views to
+an ArticleViewBucket row per article per clock hour. rollup() then scores
+
+    score = sum(bucket.views * 0.5 ** (age_hours / HALF_LIFE_HOURS))
+
+over the last WINDOW of buckets and materializes the TOP_N published posts
+into TrendingArticle, so the featured slot and the "popular" sidebar read a
+few precomputed rows instead of sorting blog_blogpost by views.
+
+rollup() runs from `manage.py rollup_trending` (cron, or --loop).
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, FloatField, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from . import cache, page_cache
+
+HALF_LIFE_HOURS = 24
+WINDOW = timedelta(days=7)
+TOP_N = 20
+# Rows touched by a single UPDATE statement
+BATCH_SIZE = 500
+
+
+def current_hour(now=None):
+    return (now or timezone.now()).replace(minute=0, second=0, microsecond=0)
+
+
+def record_views(counts, now=None):
+    """Add {post_id: views} to this hour's buckets (call inside a transaction)"""
+    from .models import ArticleViewBucket
+
+    hour = current_hour(now)
+    items = sorted(counts.items())
+    for start in range(0, len(items), BATCH_SIZE):
+        batch = items[start:start + BATCH_SIZE]
+        # Make sure the rows exist, then increment: safe against a
+        # concurrent flusher creating the same (post, hour)
+        ArticleViewBucket.objects.bulk_create(
+            [ArticleViewBucket(post_id=post_id, hour=hour) for post_id, _ in batch],
+            ignore_conflicts=True,
+        )
+        delta = Case(
+            *[When(post_id=post_id, then=Value(n)) for post_id, n in batch],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        ArticleViewBucket.objects.filter(
+            hour=hour, post_id__in=[post_id for post_id, _ in batch]
+        ).update(views=F('views') + delta)
+
+
+def rollup(now=None):
+    """Recompute TrendingArticle and drop buckets older than WINDOW. Returns the rows."""
+    from .models import ArticleViewBucket, TrendingArticle
+
+    now = current_hour(now)
+    since = now - WINDOW
+    buckets = ArticleViewBucket.objects.filter(
+        hour__gte=since, post__status='published'
+    )
+
+    # One weight per hour in the window, so the decay is plain SQL arithmetic
+    hours = buckets.values_list('hour', flat=True).distinct()
+    weight = Case(
+        *[When(hour=hour, then=Value(0.5 ** ((now - hour) / timedelta(hours=HALF_LIFE_HOURS))))
+          for hour in hours],
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    scores = list(
+        buckets.values('post_id')
+        .annotate(score=Sum(F('views') * weight, output_field=FloatField()))
+        .order_by('-score', '-post_id')
+        .values_list('post_id', 'score')[:TOP_N]
+    )
+
+    with transaction.atomic():
+        TrendingArticle.objects.all().delete()
+        rows = TrendingArticle.objects.bulk_create([
+            TrendingArticle(rank=rank, post_id=post_id, score=score)
+            for rank, (post_id, score) in enumerate(scores, start=1)
+        ])
+        ArticleViewBucket.objects.filter(hour__lt=since).delete()
+    cache.bump(cache.TRENDING)
+    page_cache.purge_views('home', 'blog_list')
+    return rows
+
+
+def top(n):
+    """
+    The first `n` trending published posts, best first, ready for cards.
+    Before the first rollup, falls back to all-time views.
+    """
+    from .models import BlogPost, TrendingArticle
+
+    entries = (
+        TrendingArticle.objects.filter(post__status='published')
+        .select_related('post__author', 'post__category')
+        .defer('post__content', 'post__content_html')[:n]
+    )
+    posts = [entry.post for entry in entries]
+    if not posts:
+        return list(BlogPost.objects.published().for_cards().order_by('-views')[:n])
+    return posts
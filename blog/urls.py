@@ -1,17 +1,34 @@
 
 # blog/urls.py
 
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Async home/list/detail under ASGI (blog/async_views.py)
+if settings.ASYNC_VIEWS:
+    from . import async_views as public_views
+else:
+    public_views = views
+
 urlpatterns = [
-    path('', views.home, name='home'),
-    path('blog/', views.blog_list, name='blog_list'),
-    path('blog/<int:id>/', views.blog_detail, name='blog_detail'),
+    path('', public_views.home, name='home'),
+    path('blog/', public_views.blog_list, name='blog_list'),
+    path('blog/<int:id>/', public_views.blog_detail, name='blog_detail'),
+    path('blog/search/', views.search_articles, name='search_articles'),
     path('blog/categories/', views.category_list, name='category_list'),
     path('blog/category/<slug:slug>/', views.category_articles, name='category_articles'),
     # ← ADD THIS!
     path('blog/author/<str:username>/', views.author_articles, name='author_articles'),  
 ]
 
-
+# Max queries per request, enforced by the tests (vleaks_project/query_audit.py)
+QUERY_BUDGETS = {
+    'home': 5,
+    'blog_list': 7,
+    'blog_detail': 3,
+    'search_articles': 2,
+    'category_list': 1,
+    'category_articles': 2,
+    'author_articles': 3,
+}
@@ -0,0 +1,309 @@
+# blog/view_counter.py
+"""
+Buffered (write-behind) view counter for blog_detail.
+
+Instead of an UPDATE + SELECT on every page view, hits are accumulated in a
+buffer and written back in batched UPDATEs by flush(). flush() runs from a
+background thread in each web process and from the ``flush_view_counts``
+management command.
+
+Settings (see vleaks_project/settings.py):
+    VIEW_COUNTER_BACKEND           'local' (per-process) or 'cache' (shared cache)
+    VIEW_COUNTER_FLUSH_INTERVAL    seconds between flushes (0 = write-through)
+    VIEW_COUNTER_MAX_PENDING       flush inline once this many views are buffered
+    VIEW_COUNTER_BACKGROUND_FLUSH  start the flusher thread in web processes
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+logger = logging.getLogger(__name__)
+
+# Max rows touched by a single UPDATE statement
+BATCH_SIZE = 500
+
+
+# ============================================
+# BUFFERS
+# ============================================
+
+class LocalViewBuffer:
+    """Per-process accumulator. Cheapest option, only visible to this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._total = 0
+
+    def add(self, post_id, n=1):
+        with self._lock:
+            self._counts[post_id] += n
+            self._total += n
+
+    def pending(self, post_id):
+        return self._counts.get(post_id, 0)
+
+    def total(self):
+        return self._total
+
+    def drain(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._total = 0
+        return counts
+
+    def restore(self, counts):
+        for post_id, n in counts.items():
+            self.add(post_id, n)
+
+
+class CacheViewBuffer:
+    """
+    Accumulator stored in the Django cache, shared by every process that
+    talks to the same cache. Needs a backend with atomic incr/decr
+    (Memcached, Redis) to be exact.
+
+    Layout:
+        <prefix>:count:<id>   pending views for a post
+        <prefix>:dirty:<id>   marker: post is already queued for the next flush
+        <prefix>:slot:<n>     queue of dirty post ids, n = 1..<prefix>:seq
+        <prefix>:flushed      last slot consumed by a flush
+        <prefix>:missing:<n>  slot n was absent at a flush
+
+    add() takes a slot number before it writes the slot, so a flush can find
+    a slot empty because its write is still in flight. The flush stops short
+    of it and only skips it if it is still empty at the next flush (then it
+    was evicted). Markers expire after DIRTY_TIMEOUT, so a post whose slot
+    was lost is queued again by its next view.
+    """
+
+    prefix = 'viewcount'
+    # Seconds a post stays "queued" without being flushed
+    DIRTY_TIMEOUT = 600
+
+    def _key(self, *parts):
+        return ':'.join([self.prefix, *map(str, parts)])
+
+    def _incr(self, key, n=1):
+        try:
+            return cache.incr(key, n)
+        except ValueError:
+            if cache.add(key, n, timeout=None):
+                return n
+            return cache.incr(key, n)
+
+    def add(self, post_id, n=1):
+        self._incr(self._key('count', post_id), n)
+        self._incr(self._key('total'), n)
+        # First hit since the last flush: queue the id
+        dirty_timeout = max(self.DIRTY_TIMEOUT, 4 * settings.VIEW_COUNTER_FLUSH_INTERVAL)
+        if cache.add(self._key('dirty', post_id), 1, timeout=dirty_timeout):
+            slot = self._incr(self._key('seq'))
+            cache.set(self._key('slot', slot), post_id, timeout=None)
+
+    def pending(self, post_id):
+        return cache.get(self._key('count', post_id), 0)
+
+    def total(self):
+        return cache.get(self._key('total'), 0)
+
+    def drain(self):
+        lock_key = self._key('lock')
+        if not cache.add(lock_key, 1, timeout=60):
+            return Counter()  # another process is flushing
+        try:
+            head = cache.get(self._key('seq'), 0)
+            tail = cache.get(self._key('flushed'), 0)
+            found = cache.get_many([self._key('slot', n) for n in range(tail + 1, head + 1)])
+
+            consumed = tail
+            for n in range(tail + 1, head + 1):
+                if self._key('slot', n) not in found and cache.add(
+                    self._key('missing', n), 1, timeout=86400
+                ):
+                    break  # first sighting: the write may still be coming
+                consumed = n  # read, or missing twice (evicted)
+
+            consumed_range = range(tail + 1, consumed + 1)
+            slot_keys = [self._key('slot', n) for n in consumed_range]
+            post_ids = {found[key] for key in slot_keys if key in found}
+            cache.set(self._key('flushed'), consumed, timeout=None)
+            cache.delete_many(slot_keys + [self._key('missing', n) for n in consumed_range])
+
+            counts = Counter()
+            for post_id in post_ids:
+                # Clear the marker first so a concurrent hit re-queues the id
+                cache.delete(self._key('dirty', post_id))
+                n = cache.get(self._key('count', post_id), 0)
+                if n:
+                    cache.decr(self._key('count', post_id), n)
+                    counts[post_id] = n
+            if counts:
+                try:
+                    cache.decr(self._key('total'), sum(counts.values()))
+                except ValueError:
+                    pass
+            return counts
+        finally:
+            cache.delete(lock_key)
+
+    def restore(self, counts):
+        for post_id, n in counts.items():
+            self.add(post_id, n)
+
+
+BUFFERS = {
+    'local': LocalViewBuffer,
+    'cache': CacheViewBuffer,
+}
+
+_buffer = BUFFERS[settings.VIEW_COUNTER_BACKEND]()
+
+
+# ============================================
+# PUBLIC API
+# ============================================
+
+def record_view(post_id):
+    """Count one view of a published article."""
+    if settings.VIEW_COUNTER_FLUSH_INTERVAL <= 0:
+        _apply(Counter({post_id: 1}))
+        return
+
+    _ensure_flusher()
+    _buffer.add(post_id)
+    if _buffer.total() >= settings.VIEW_COUNTER_MAX_PENDING:
+        # Bound how many views a crashed process can lose
+        flush()
+
+
+# Keep references so pending tasks aren't garbage collected
+_background_tasks = set()
+
+
+def record_view_later(post_id):
+    """
+    record_view() from async code without waiting for it. Runs on a worker
+    thread, since it may write (write-through mode, or an inline flush).
+    """
+    task = asyncio.get_running_loop().create_task(
+        sync_to_async(record_view, thread_sensitive=False)(post_id)
+    )
+    _background_tasks.add(task)
+    task.add_done_callback(_view_recorded)
+
+
+def _view_recorded(task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error('Could not record a view', exc_info=task.exception())
+
+
+def pending_views(post_id):
+    """Views recorded for a post but not yet written to the database."""
+    return _buffer.pending(post_id)
+
+
+def pending_total():
+    """All buffered views not yet written to the database."""
+    return _buffer.total()
+
+
+def discard():
+    """Drop buffered views without writing them (the test runner's teardown)."""
+    return sum(_buffer.drain().values())
+
+
+def flush():
+    """Write buffered views to the database. Returns the number of views written."""
+    counts = _buffer.drain()
+    if not counts:
+        return 0
+    try:
+        _apply(counts)
+    except Exception:
+        _buffer.restore(counts)
+        raise
+    return sum(counts.values())
+
+
+def _apply(counts):
+    """One UPDATE ... SET views = views + CASE id ... per batch of posts."""
+    from .counters import adjust_site_stats
+    from .models import BlogPost
+    from .trending import record_views
+
+    # Sorted ids keep row-lock order stable between concurrent flushers
+    items = sorted(counts.items())
+    with transaction.atomic():
+        for start in range(0, len(items), BATCH_SIZE):
+            batch = items[start:start + BATCH_SIZE]
+            delta = Case(
+                *[When(id=post_id, then=Value(n)) for post_id, n in batch],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            BlogPost.objects.filter(
+                id__in=[post_id for post_id, _ in batch]
+            ).update(views=F('views') + delta)
+        adjust_site_stats(views=sum(counts.values()))
+        record_views(counts)  # hourly buckets for the trending rollup
+
+
+# ============================================
+# BACKGROUND FLUSHER
+# ============================================
+
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(settings.VIEW_COUNTER_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception:
+            logger.exception('View counter flush failed; will retry')
+        finally:
+            # The thread lives as long as the process: don't keep a dead connection
+            close_old_connections()
+
+
+def _ensure_flusher():
+    """
+    On the first view a process records: flush at exit, and start the
+    flusher thread (again after a fork). Processes that never count a view
+    (migrate, shell...) never touch the buffer.
+    """
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        if _flusher_pid is None:
+            atexit.register(_flush_at_exit)  # inherited by forked children
+        if settings.VIEW_COUNTER_BACKGROUND_FLUSH:
+            threading.Thread(
+                target=_flush_loop, name='view-counter-flush', daemon=True
+            ).start()
+        _flusher_pid = os.getpid()
+
+
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception('Could not flush view counts at exit')
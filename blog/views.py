@@ -1,57 +1,104 @@
 
 # blog/views.py
 
+from functools import partial
+
 from django.shortcuts import render, get_object_or_404  
-from django.core.paginator import Paginator
-from django.db.models import Sum, F  
 from django.contrib.auth.models import User  
-from .models import Category, BlogPost
-from django.http import Http404       # ← ADD THIS!
+from .models import Category, BlogPost, RelatedArticle, SiteStats
+from . import cache, search, trending, view_counter
+from .conditional import conditional_page, tag_validators, timestamp, validators
+from .pagination import KeysetPaginator
+from django.http import Http404, HttpResponseRedirect       # ← ADD THIS!
+
+# Page size for the category and author article grids
+ARTICLES_PER_PAGE = 10
+
+SEARCH_RESULTS_PER_PAGE = 10
+# Relevance-ranked results are paged by offset; don't let crawlers go deep
+SEARCH_MAX_PAGES = 20
+
+# What the blog_list sidebar shows: publishes, "recommended" toggles
+# (posts), category edits and trending rollups re-render it
+SIDEBAR_TAGS = [cache.POSTS, cache.CATEGORIES, cache.TRENDING]
+
+
+@conditional_page(tag_validators(cache.POSTS, cache.CATEGORIES, cache.TRENDING))
+def home(request):
+    context = cache.cached(
+        'home_context', [cache.POSTS, cache.CATEGORIES, cache.TRENDING],
+        build_home_context,
+    )
+    return render(request, 'blog/home.html', context)
 
 
-def home(request):    
-    # Featured article (most viewed published article)
-    featured_article = BlogPost.objects.filter(
-        status='published'
-    ).order_by('-views').first()
+def build_home_context():
+    """Everything home.html needs, fully evaluated so it can be cached"""
+    published = BlogPost.objects.published().for_cards()
+
+    # Featured article (top of the materialized trending list)
+    featured_article = next(iter(trending.top(1)), None)
     
     # Latest 6 articles (excluding featured if exists)
-    latest_articles = BlogPost.objects.filter(
-        status='published'
-    ).order_by('-created_at')[:6]
+    latest_articles = list(published.order_by('-created_at')[:6])
     
-    # All categories
-    categories = Category.objects.all()
+    # All categories (published_count is a denormalized counter)
+    categories = list(Category.objects.all())
     
-    # Stats
-    total_articles = BlogPost.objects.filter(status='published').count()
-    total_categories = Category.objects.count()
-    total_views = BlogPost.objects.filter(status='published').aggregate(
-        total=Sum('views')
-    )['total'] or 0
+    # Stats (one precomputed row, see blog/counters.py)
+    stats = SiteStats.load()
     
-    context = {
+    return {
         'featured_article': featured_article,
         'latest_articles': latest_articles,
         'categories': categories,
-        'total_articles': total_articles,
-        'total_categories': total_categories,
-        'total_views': total_views,
+        'total_articles': stats.total_articles,
+        'total_categories': stats.total_categories,
+        'total_views': stats.total_views,
     }
-    return render(request, 'blog/home.html', context)
 
 
+def legacy_page_redirect(request, paginator):
+    """
+    Send an old ?page=N link to the cursor URL of the same rows; None when
+    there is no ?page=. Unknown pages are a 404, not silently page 1.
+    """
+    if 'page' not in request.GET:
+        return None
+    try:
+        number = int(request.GET['page'])
+    except ValueError:
+        raise Http404('Invalid page number')
+    cursor = paginator.cursor_for_page(number) if number >= 1 else None
+    if cursor is None:
+        raise Http404('No such page')
+    query = request.GET.copy()
+    del query['page']
+    if cursor:
+        query['cursor'] = cursor
+    # Not permanent: which rows page N holds changes with every publish
+    return HttpResponseRedirect(f'{request.path}?{query.urlencode()}' if query else request.path)
+
+
+@conditional_page(tag_validators(*SIDEBAR_TAGS))
 def blog_list(request):    
-    all_articles = BlogPost.objects.filter(status='published').order_by('-created_at')
-    paginator = Paginator(all_articles, 5)
-    page_number = request.GET.get('page')
-    articles = paginator.get_page(page_number)         
-    latest_articles = BlogPost.objects.filter(status='published').order_by('-created_at')[:3]    
-    popular_articles = BlogPost.objects.filter(status='published').order_by('-views')[:5]
+    published = BlogPost.objects.published().for_cards()
+    paginator = KeysetPaginator(
+        published, 5, count=lambda: SiteStats.load().total_articles
+    )
+    if redirect := legacy_page_redirect(request, paginator):
+        return redirect
+    articles = paginator.get_page(request.GET.get('cursor'))         
+
+    # Sidebar: rendered once and kept in the {% cache %} fragment until a
+    # post, category or the trending list changes. The querysets below are
+    # lazy (trending.top is called by the template), so a cached fragment
+    # costs no queries.
+    latest_articles = published.order_by('-created_at')[:3]    
+    popular_articles = partial(trending.top, 5)
       
     # Recommended articles (for sidebar) 
-    recommended_articles = BlogPost.objects.filter(
-        status='published',
+    recommended_articles = published.filter(
         recommended=True
     ).order_by('-created_at')[:3]
     
@@ -64,14 +111,33 @@ def blog_list(request):
             'popular_articles': popular_articles,
             'recommended_articles': recommended_articles,
             'categories': categories,  # ← ADD THIS!
+            'sidebar_version': cache.version_key(*SIDEBAR_TAGS),
+            'sidebar_timeout': cache.DEFAULT_TIMEOUT,
         }
     return render(request, 'blog/list.html', context)
 
 
 
+def detail_validators(request, id):
+    """The article's updated_at plus what the sidebar shows; None for drafts/404"""
+    updated_at = BlogPost.objects.published().filter(id=id).values_list(
+        'updated_at', flat=True
+    ).first()
+    if updated_at is None:
+        return None
+    versions = cache.get_versions(cache.CATEGORIES, cache.RELATED)
+    return validators(
+        id, timestamps=[timestamp(updated_at), *(v / 1e9 for v in versions.values())]
+    )
+
+
+# A 304 is still a read
+@conditional_page(
+    detail_validators, on_not_modified=lambda request, id: view_counter.record_view(id)
+)
 def blog_detail(request, id):    
-    # Get article or 404
-    article = get_object_or_404(BlogPost, id=id)
+    # Get article or 404 (author and category are shown on the page)
+    article = get_object_or_404(BlogPost.objects.select_related('author', 'category'), id=id)
     
     # Only show published articles to the public
     if article.status != 'published':
@@ -79,51 +145,109 @@ def blog_detail(request, id):
         if request.user != article.author:
             raise Http404("Article not found")
     
-    # Increment view count (only for published articles)
+    # Increment view count (only for published articles).
+    # Buffered and written back in batches - see blog/view_counter.py
     if article.status == 'published':
-        article.views = F('views') + 1
-        article.save(update_fields=['views'])
-        article.refresh_from_db()
+        view_counter.record_view(article.id)
+        article.views += view_counter.pending_views(article.id)
+    
+    # "Read next": precomputed by blog/related.py, one query on (post, rank)
+    related_articles = [
+        entry.related for entry in RelatedArticle.objects.filter(
+            post=article, related__status='published'
+        ).select_related(
+            'related__author', 'related__category'
+        ).defer('related__content', 'related__content_html')
+    ]
     
-    context = {'article': article}
+    context = {
+        'article': article,
+        'article_body': article.safe_content,
+        'related_articles': related_articles,
+    }
     return render(request, 'blog/detail.html', context)
 
 
 
 
+@conditional_page(tag_validators(cache.CATEGORIES))
 def category_list(request):
     categories = Category.objects.all()
     return render(request, 'blog/categories.html', {'categories': categories})
 
 
+@conditional_page(tag_validators(cache.POSTS, cache.CATEGORIES))
 def category_articles(request, slug):    
     category = get_object_or_404(Category, slug=slug)
     
-    articles = BlogPost.objects.filter(
-        status='published',
+    articles = BlogPost.objects.published().for_cards().filter(
         category=category
-    ).order_by('-created_at')
+    )
+    paginator = KeysetPaginator(
+        articles, ARTICLES_PER_PAGE, count=category.published_count
+    )
+    if redirect := legacy_page_redirect(request, paginator):
+        return redirect
     
     context = {
         'category': category,
-        'articles': articles,
+        'articles': paginator.get_page(request.GET.get('cursor')),
     }
     return render(request, 'blog/category_articles.html', context)
 
 
+@conditional_page(tag_validators(cache.POSTS))
 def author_articles(request, username):    
     author = get_object_or_404(User, username=username)
     
-    articles = BlogPost.objects.filter(
-        status='published',
+    articles = BlogPost.objects.published().for_cards().filter(
         author=author
-    ).order_by('-created_at')
+    )
+    article_count = cache.cached(
+        f'author_article_count:{author.id}', [cache.POSTS], articles.count
+    )
+    paginator = KeysetPaginator(articles, ARTICLES_PER_PAGE, count=article_count)
+    if redirect := legacy_page_redirect(request, paginator):
+        return redirect
     
     context = {
         'author': author,
-        'articles': articles,
+        'articles': paginator.get_page(request.GET.get('cursor')),
+        'article_count': article_count,
     }
     return render(request, 'blog/author_articles.html', context)
 
 
+def search_articles(request):
+    """Full-text search over published articles (blog/search.py)"""
+    query = request.GET.get('q', '').strip()
+    try:
+        page = min(max(int(request.GET.get('page', 1)), 1), SEARCH_MAX_PAGES)
+    except ValueError:
+        page = 1
+
+    # One extra hit tells us whether there is a next page
+    hits = search.search(
+        query,
+        limit=SEARCH_RESULTS_PER_PAGE + 1,
+        offset=(page - 1) * SEARCH_RESULTS_PER_PAGE,
+    )
+    has_next = len(hits) > SEARCH_RESULTS_PER_PAGE and page < SEARCH_MAX_PAGES
+    hits = hits[:SEARCH_RESULTS_PER_PAGE]
+
+    posts = BlogPost.objects.for_cards().in_bulk([hit.post_id for hit in hits])
+    results = []
+    for hit in hits:
+        post = posts.get(hit.post_id)
+        if post:
+            post.search_snippet = hit.snippet
+            results.append(post)
 
+    context = {
+        'query': query,
+        'results': results,
+        'page': page,
+        'has_previous': page > 1,
+        'has_next': has_next,
+    }
+    return render(request, 'blog/search.html', context)
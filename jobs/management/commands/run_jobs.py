@@ -0,0 +1,73 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from jobs import worker
+from jobs.models import Job
+from jobs.tasks import claim_due_jobs, record_failure
+
+
+class Command(BaseCommand):
+    help = "Run queued jobs (image derivatives, file cleanup, ...) in a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2,
+                            help='Worker processes (default 2).')
+        parser.add_argument('--poll', type=float, default=2.0,
+                            help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once no job is due instead of polling.')
+        parser.add_argument('--purge-days', type=int, default=7,
+                            help='Delete finished jobs older than this many days.')
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        self.purge(options['purge_days'])
+
+        # 'spawn' so children open their own DB connections
+        pool = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=worker.init_worker,
+        )
+        running = {}
+        ok = failed = 0
+        with pool:
+            while True:
+                free = processes * 2 - len(running)
+                if free > 0:
+                    for pk in claim_due_jobs(free):
+                        running[pool.submit(worker.run, pk)] = pk
+
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll'])
+                    continue
+
+                done, _ = wait(running, timeout=options['poll'],
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    pk = running.pop(future)
+                    try:
+                        success = future.result()
+                    except Exception as e:  # worker process died
+                        success = False
+                        self.stderr.write(f'Job {pk}: worker crashed ({e})')
+                        record_failure(Job.objects.get(pk=pk), f'Worker crashed: {e!r}')
+                    if success:
+                        ok += 1
+                    else:
+                        failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'{ok} job(s) done, {failed} failed or retrying.'))
+
+    def purge(self, days):
+        cutoff = timezone.now() - timedelta(days=days)
+        deleted, _ = Job.objects.filter(status='done', updated_at__lt=cutoff).delete()
+        if deleted:
+            self.stdout.write(f'Purged {deleted} finished job(s).')
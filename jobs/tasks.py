@@ -0,0 +1,182 @@
+# jobs/tasks.py
+"""
+Task registry, enqueueing and execution.
+
+    # blog/tasks.py
+    from jobs.tasks import task
+
+    @task('blog.build_image_variants')
+    def build_image_variants(post_id):
+        ...
+
+    # anywhere, usually inside the transaction that saves the row
+    from jobs.tasks import enqueue
+    enqueue('blog.build_image_variants', post_id=post.id, dedupe_key=f'variants:{post.id}')
+
+The Job row is written in the caller's transaction, so a worker only sees it
+once the data it refers to is committed. Tasks must be idempotent: a job can
+run more than once (retries, a worker dying mid-task).
+"""
+
+import logging
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+# Retry delay: RETRY_BASE_SECONDS * 2 ** (attempt - 1)
+RETRY_BASE_SECONDS = 30
+# A 'running' job locked for longer than this is assumed orphaned
+LOCK_TIMEOUT = timedelta(minutes=15)
+# Running jobs refresh locked_at this often, so a long task (a related
+# articles rebuild) keeps its lock and only a dead worker's job goes stale
+HEARTBEAT = LOCK_TIMEOUT / 3
+
+
+def task(name, max_attempts=5):
+    """Register a function as a task under `name`"""
+    def decorator(func):
+        func.task_name = name
+        func.max_attempts = max_attempts
+        registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, dedupe_key='', delay=None, **payload):
+    """
+    Queue a task. With a dedupe_key, nothing is added if an identical key
+    is already pending. Returns the Job (or None if it ran eagerly).
+    """
+    from .models import Job
+
+    func = registry[name]
+    if settings.JOBS_EAGER:
+        # No worker: run once the caller's transaction commits (delay is
+        # ignored), at most once per dedupe_key per transaction
+        if dedupe_key and _eager_pending(dedupe_key):
+            return None
+        def run():
+            func(**payload)
+        run.dedupe_key = dedupe_key
+        transaction.on_commit(run)
+        return None
+
+    if dedupe_key:
+        existing = Job.objects.filter(dedupe_key=dedupe_key, status='pending').first()
+        if existing:
+            return existing
+
+    return Job.objects.create(
+        task=name,
+        payload=payload,
+        dedupe_key=dedupe_key,
+        max_attempts=func.max_attempts,
+        run_after=timezone.now() + (delay or timedelta()),
+    )
+
+
+def _eager_pending(dedupe_key):
+    """An eager task with this key already waits for the current commit"""
+    connection = transaction.get_connection()
+    return any(
+        getattr(func, 'dedupe_key', '') == dedupe_key
+        for _, func, _ in connection.run_on_commit
+    )
+
+
+# ============================================
+# WORKER SIDE
+# ============================================
+
+def claim_due_jobs(limit):
+    """Mark up to `limit` due jobs as running and return their ids"""
+    from .models import Job
+
+    now = timezone.now()
+    # Give orphaned jobs (worker killed mid-task) another go
+    Job.objects.filter(status='running', locked_at__lt=now - LOCK_TIMEOUT).update(
+        status='pending'
+    )
+
+    claimed = []
+    candidates = Job.objects.filter(
+        status='pending', run_after__lte=now
+    ).values_list('pk', flat=True)[:limit]
+    for pk in candidates:
+        # Optimistic claim: only one worker's UPDATE matches 'pending'
+        won = Job.objects.filter(pk=pk, status='pending').update(
+            status='running', locked_at=now, attempts=F('attempts') + 1
+        )
+        if won:
+            claimed.append(pk)
+    return claimed
+
+
+def run_job(pk):
+    """Execute one claimed job and record the outcome. Returns True on success."""
+    from .models import Job
+
+    job = Job.objects.get(pk=pk)
+    func = registry.get(job.task)
+    try:
+        if func is None:
+            raise LookupError(f'Unknown task {job.task!r}')
+        with _heartbeat(pk):
+            func(**job.payload)
+    except Exception:
+        record_failure(job, traceback.format_exc())
+        return False
+
+    job.status = 'done'
+    job.locked_at = None
+    job.last_error = ''
+    job.save(update_fields=['status', 'locked_at', 'last_error', 'updated_at'])
+    return True
+
+
+@contextmanager
+def _heartbeat(pk):
+    """Keep a running job's locked_at fresh while its task runs"""
+    from .models import Job
+
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(HEARTBEAT.total_seconds()):
+                Job.objects.filter(pk=pk, status='running').update(locked_at=timezone.now())
+        finally:
+            connections.close_all()  # this thread's own connections
+
+    thread = threading.Thread(target=beat, name=f'job-{pk}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def record_failure(job, error):
+    """Schedule a retry with exponential backoff, or give up after max_attempts"""
+    logger.warning('Job %s failed (attempt %s/%s)', job, job.attempts, job.max_attempts)
+    if job.attempts >= job.max_attempts:
+        job.status = 'failed'
+    else:
+        job.status = 'pending'
+        job.run_after = timezone.now() + timedelta(
+            seconds=RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+        )
+    job.last_error = error
+    job.locked_at = None
+    job.save(update_fields=['status', 'run_after', 'last_error', 'locked_at', 'updated_at'])
@@ -0,0 +1,44 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from . import tasks
+from .models import Job
+
+seen_locks = []
+
+
+@tasks.task('jobs.tests.slow')
+def slow(seconds):
+    """Sleep, then note the lock time the heartbeat left on this job"""
+    time.sleep(seconds)
+    seen_locks.append(Job.objects.get(task='jobs.tests.slow', status='running').locked_at)
+
+
+# The heartbeat thread writes on its own connection: rows must be committed
+class JobLockTests(TransactionTestCase):
+
+    def setUp(self):
+        seen_locks.clear()
+
+    def test_long_task_keeps_its_lock(self):
+        tasks.enqueue('jobs.tests.slow', seconds=0.5)
+        [pk] = tasks.claim_due_jobs(1)
+        claimed_at = Job.objects.get(pk=pk).locked_at
+
+        with mock.patch.object(tasks, 'HEARTBEAT', timedelta(seconds=0.1)):
+            self.assertTrue(tasks.run_job(pk))
+        self.assertGreater(seen_locks[0], claimed_at)
+        self.assertEqual(Job.objects.get(pk=pk).status, 'done')
+
+    def test_only_stale_locks_are_reclaimed(self):
+        job = tasks.enqueue('jobs.tests.slow', seconds=0)
+        tasks.claim_due_jobs(1)
+        self.assertEqual(tasks.claim_due_jobs(1), [])  # still locked
+
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - tasks.LOCK_TIMEOUT - timedelta(seconds=1))
+        self.assertEqual(tasks.claim_due_jobs(1), [job.pk])
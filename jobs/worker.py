@@ -0,0 +1,23 @@
+# jobs/worker.py
+"""
+Entry points for run_jobs' pool processes. Imported by freshly spawned
+interpreters before Django is set up, so nothing here may import models
+at module level.
+"""
+
+
+def init_worker():
+    import django
+    django.setup()
+
+
+def run(pk):
+    from django.db import close_old_connections
+
+    from .tasks import run_job
+
+    close_old_connections()
+    try:
+        return run_job(pk)
+    finally:
+        close_old_connections()
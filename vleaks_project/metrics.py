@@ -0,0 +1,360 @@
+# vleaks_project/metrics.py
+"""
+Prometheus-style request metrics.
+
+With METRICS_ENABLED, MetricsMiddleware records for every request:
+
+    vleaks_http_requests_total{view,status}       counter
+    vleaks_http_request_duration_seconds{view}     histogram
+    vleaks_db_queries_total{view}                  counter
+    vleaks_db_query_seconds_total{view}            counter
+    vleaks_cache_hits_total / _misses_total        counters (cache get/get_many)
+
+`view` is the URL name (home, blog_detail, writer_dashboard...); a page
+cache hit carries the name of the view it stands in for, anything that
+doesn't resolve is 'unresolved', so the label set stays small. DB and cache
+numbers come from the profiler's hooks (vleaks_project/profiling.py).
+
+/metrics serves them in the Prometheus text format, plus
+vleaks_cache_hit_ratio and vleaks_view_counter_pending (views buffered but
+not yet written), to requests carrying "Authorization: Bearer
+<METRICS_TOKEN>". Without a token configured it only answers with DEBUG.
+
+Preforked WSGI workers each have their own copy of these numbers, so every
+process writes a snapshot to METRICS_DIR/<pid>-<start>.json (atomically,
+at most every METRICS_FLUSH_INTERVAL seconds, and at exit) and /metrics
+adds up all the files: whatever worker answers the scrape reports the whole
+site, at most METRICS_FLUSH_INTERVAL seconds behind. The files of workers
+that have exited are folded into dead.json, so counters never go backwards
+across restarts; their gauges are dropped.
+"""
+
+import atexit
+import fcntl
+import hmac
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404, HttpResponse
+
+from . import profiling
+
+# Latency buckets, seconds (+Inf is implied)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEAD_FILE = 'dead.json'
+
+_lock = threading.Lock()
+
+
+# ============================================
+# REGISTRY
+# ============================================
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        # JSON list of label values -> value
+        self.values = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return json.dumps([str(labels[name]) for name in self.labels])
+
+    @staticmethod
+    def merge(total, value):
+        return (total or 0) + value
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Per process; /metrics adds up the live processes' values"""
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with _lock:
+            self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    """Stored as [per-bucket counts..., +Inf count, sum]; cumulative on output"""
+    type = 'histogram'
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+            counts[bisect_left(BUCKETS, value)] += 1
+            counts[-1] += value
+
+    @staticmethod
+    def merge(total, value):
+        if total is None:
+            return list(value)
+        return [a + b for a, b in zip(total, value)]
+
+
+REGISTRY = []
+
+REQUESTS = Counter(
+    'vleaks_http_requests_total', 'Requests by URL name and status code.', ['view', 'status'])
+LATENCY = Histogram(
+    'vleaks_http_request_duration_seconds', 'Request latency by URL name.', ['view'])
+DB_QUERIES = Counter(
+    'vleaks_db_queries_total', 'SQL statements run, by URL name.', ['view'])
+DB_TIME = Counter(
+    'vleaks_db_query_seconds_total', 'Time spent in SQL, by URL name.', ['view'])
+CACHE_HITS = Counter('vleaks_cache_hits_total', 'Cache keys read and found.')
+CACHE_MISSES = Counter('vleaks_cache_misses_total', 'Cache keys read and not found.')
+VIEWS_PENDING = Gauge(
+    'vleaks_view_counter_pending', 'Article views buffered, not yet written to the database.')
+
+
+# ============================================
+# PER-PROCESS SNAPSHOTS
+# ============================================
+
+_started = time.time_ns()
+_last_write = 0.0
+
+
+def _directory():
+    path = Path(settings.METRICS_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _own_file():
+    return _directory() / f'{os.getpid()}-{_started}.json'
+
+
+def _atomic_write(path, data):
+    tmp = path.with_name(f'.{path.name}.tmp')
+    tmp.write_text(json.dumps(data))
+    os.replace(tmp, path)
+
+
+def snapshot():
+    """{metric name: {label key: value}} for this process"""
+    if settings.VIEW_COUNTER_BACKEND == 'local':
+        from blog import view_counter
+        VIEWS_PENDING.set(view_counter.pending_total())
+    with _lock:
+        return {metric.name: dict(metric.values) for metric in REGISTRY if metric.values}
+
+
+def write_snapshot(force=False):
+    """Write this process's numbers, at most every METRICS_FLUSH_INTERVAL seconds"""
+    global _last_write
+    now = time.monotonic()
+    if not force and now - _last_write < settings.METRICS_FLUSH_INTERVAL:
+        return
+    _last_write = now
+    _atomic_write(_own_file(), snapshot())
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _merge(totals, data, gauges=True):
+    types = {metric.name: metric for metric in REGISTRY}
+    for name, values in data.items():
+        metric = types.get(name)
+        if metric is None or (metric.type == 'gauge' and not gauges):
+            continue
+        merged = totals.setdefault(name, {})
+        for key, value in values.items():
+            merged[key] = metric.merge(merged.get(key), value)
+    return totals
+
+
+def _fold_dead(directory):
+    """Move the files of exited processes into dead.json"""
+    dead = [
+        path for path in directory.glob('*-*.json')
+        if not _alive(int(path.name.split('-', 1)[0]))
+    ]
+    if not dead:
+        return
+    totals = _read(directory / DEAD_FILE)
+    for path in dead:
+        _merge(totals, _read(path), gauges=False)
+    _atomic_write(directory / DEAD_FILE, totals)
+    for path in dead:
+        path.unlink(missing_ok=True)
+
+
+def collect():
+    """Every process's numbers added up: {metric name: {label key: value}}"""
+    write_snapshot(force=True)
+    directory = _directory()
+    # One scrape at a time, so no file is folded twice or read half-folded
+    with open(directory / '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        _fold_dead(directory)
+        totals = {}
+        for path in directory.glob('*.json'):
+            _merge(totals, _read(path))
+    return totals
+
+
+@atexit.register
+def _write_at_exit():
+    # Only processes that served requests (not manage.py migrate...)
+    if settings.METRICS_ENABLED and REQUESTS.values:
+        write_snapshot(force=True)
+
+
+# ============================================
+# EXPOSITION
+# ============================================
+
+def _labels(metric, key, **extra):
+    pairs = list(zip(metric.labels, json.loads(key))) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (
+        (name, value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(totals):
+    lines = []
+    for metric in REGISTRY:
+        values = totals.get(metric.name, {})
+        if metric.name == VIEWS_PENDING.name and settings.VIEW_COUNTER_BACKEND != 'local':
+            # One buffer in the shared cache, not one per process
+            from blog import view_counter
+            values = {'[]': view_counter.pending_total()}
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for key, value in sorted(values.items()):
+            if metric.type != 'histogram':
+                lines.append(f'{metric.name}{_labels(metric, key)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), value[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else repr(bound)
+                lines.append(f'{metric.name}_bucket{_labels(metric, key, le=le)} {cumulative}')
+            lines.append(f'{metric.name}_sum{_labels(metric, key)} {_number(value[-1])}')
+            lines.append(f'{metric.name}_count{_labels(metric, key)} {cumulative}')
+
+    hits = totals.get(CACHE_HITS.name, {}).get('[]', 0)
+    misses = totals.get(CACHE_MISSES.name, {}).get('[]', 0)
+    lines.append('# HELP vleaks_cache_hit_ratio Share of cache reads that found their key.')
+    lines.append('# TYPE vleaks_cache_hit_ratio gauge')
+    lines.append(f'vleaks_cache_hit_ratio {_number(hits / (hits + misses) if hits + misses else 0.0)}')
+    return '\n'.join(lines) + '\n'
+
+
+def authorized(request):
+    if not settings.METRICS_TOKEN:
+        return settings.DEBUG
+    return hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(),
+        f'Bearer {settings.METRICS_TOKEN}'.encode(),
+    )
+
+
+def metrics_view(request):
+    """Text exposition for Prometheus; 404 unless METRICS_ENABLED"""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    if not authorized(request):
+        return HttpResponse('Unauthorized\n', status=401, content_type='text/plain')
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
+
+
+# ============================================
+# MIDDLEWARE
+# ============================================
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        profiling.install()
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with profiling.profile_request() as profile:
+            start = time.perf_counter()
+            response = self.get_response(request)
+        self.observe(request, response, profile, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        with profiling.profile_request() as profile:
+            start = time.perf_counter()
+            response = await self.get_response(request)
+        self.observe(request, response, profile, time.perf_counter() - start)
+        return response
+
+    def observe(self, request, response, profile, elapsed):
+        match = request.resolver_match
+        view = (
+            (match.url_name if match else None)
+            or getattr(request, 'page_cache_view', None)
+            or 'unresolved'
+        )
+        REQUESTS.inc(view=view, status=response.status_code)
+        LATENCY.observe(elapsed, view=view)
+        DB_QUERIES.inc(len(profile.queries), view=view)
+        DB_TIME.inc(sum(seconds for _, seconds in profile.queries), view=view)
+        CACHE_HITS.inc(sum(hits for hits, _, _ in profile.cache))
+        CACHE_MISSES.inc(sum(misses for _, misses, _ in profile.cache))
+        try:
+            write_snapshot()
+        except OSError:
+            pass  # a full or read-only disk must not fail the request
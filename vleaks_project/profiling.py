@@ -0,0 +1,255 @@
+# vleaks_project/profiling.py
+"""
+Sampling request profiler.
+
+With PROFILING_SAMPLE_RATE > 0, ProfilingMiddleware profiles that share of
+requests and reports, in a Server-Timing header (shown in the browser's
+network panel; only with DEBUG or to staff, since it tells anyone how the
+site spends its time):
+
+    total   whole request, middleware included
+    db      SQL time, desc = number of queries
+    tpl     top-level template rendering
+    cache   cache get/get_many time, desc = hits / misses
+    app     the rest (view code, middleware, sanitizing...)
+
+Sampled requests slower than PROFILING_SLOW_MS are also logged as one JSON
+line to the 'vleaks.profiling' logger, with their most expensive queries.
+
+With the rate at 0 the middleware removes itself (MiddlewareNotUsed) and
+nothing below is installed. Otherwise an unsampled request costs one
+random() call, and each query / render / cache read one ContextVar lookup.
+The current profile lives in a ContextVar, so work that async views hand to
+worker threads (sync_to_async copies the context) is counted too.
+"""
+
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('vleaks.profiling')
+
+# Queries listed in the slow-request log
+TOP_QUERIES = 5
+
+_profile = ContextVar('request_profile', default=None)
+# Set inside a profiled cache call, so get_many -> get isn't counted twice
+_in_cache_call = ContextVar('in_cache_call', default=False)
+
+
+class Profile:
+    """What one request spent its time on; lists of (..., seconds)"""
+
+    def __init__(self):
+        self.queries = []    # (sql, seconds)
+        self.templates = []  # seconds
+        self.cache = []      # (hits, misses, seconds)
+
+    def summary(self, total):
+        db = sum(seconds for _, seconds in self.queries)
+        tpl = sum(self.templates)
+        cache = sum(seconds for _, _, seconds in self.cache)
+        return {
+            'total_ms': total * 1000,
+            'db_ms': db * 1000,
+            'queries': len(self.queries),
+            'template_ms': tpl * 1000,
+            'cache_ms': cache * 1000,
+            'cache_hits': sum(hits for hits, _, _ in self.cache),
+            'cache_misses': sum(misses for _, misses, _ in self.cache),
+            'app_ms': max(0.0, total - db - tpl - cache) * 1000,
+        }
+
+    def top_queries(self, n=TOP_QUERIES):
+        """The n statements with the most total time (identical SQL grouped)"""
+        grouped = defaultdict(lambda: [0, 0.0])
+        for sql, seconds in self.queries:
+            grouped[sql][0] += 1
+            grouped[sql][1] += seconds
+        ranked = sorted(grouped.items(), key=lambda item: -item[1][1])[:n]
+        return [
+            {'sql': sql[:500], 'count': count, 'ms': round(seconds * 1000, 2)}
+            for sql, (count, seconds) in ranked
+        ]
+
+
+@contextmanager
+def profile_request():
+    """
+    The current request's Profile, started here unless an outer middleware
+    already did (ProfilingMiddleware and MetricsMiddleware share it)
+    """
+    profile = _profile.get()
+    if profile is not None:
+        yield profile
+        return
+    profile = Profile()
+    token = _profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _profile.reset(token)
+
+
+def server_timing(summary):
+    return ', '.join([
+        f"total;dur={summary['total_ms']:.1f}",
+        f"db;dur={summary['db_ms']:.1f};desc=\"{summary['queries']} queries\"",
+        f"tpl;dur={summary['template_ms']:.1f}",
+        f"cache;dur={summary['cache_ms']:.1f};"
+        f"desc=\"{summary['cache_hits']} hits, {summary['cache_misses']} misses\"",
+        f"app;dur={summary['app_ms']:.1f}",
+    ])
+
+
+# ============================================
+# HOOKS (installed once, by profiling or metrics)
+# ============================================
+
+def _record_query(execute, sql, params, many, context):
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.queries.append((sql, time.perf_counter() - start))
+
+
+def _add_query_hook(sender=None, connection=None, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _time_template_render(original):
+    @wraps(original)
+    def render(self, context=None, request=None):
+        profile = _profile.get()
+        if profile is None:
+            return original(self, context, request)
+        start = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            profile.templates.append(time.perf_counter() - start)
+    render.profiled = True
+    return render
+
+
+def _time_cache_read(original, many):
+    @wraps(original)
+    def read(self, keys, *args, **kwargs):
+        profile = _profile.get()
+        if profile is None or _in_cache_call.get():
+            return original(self, keys, *args, **kwargs)
+        token = _in_cache_call.set(True)
+        start = time.perf_counter()
+        try:
+            result = original(self, keys, *args, **kwargs)
+        finally:
+            _in_cache_call.reset(token)
+        if many:
+            hits = len(result)
+            misses = len(keys) - hits
+        else:
+            hits = int(result is not None)
+            misses = 1 - hits
+        profile.cache.append((hits, misses, time.perf_counter() - start))
+        return result
+    read.profiled = True
+    return read
+
+
+def install():
+    """Hook SQL, template rendering and cache reads (idempotent)"""
+    connection_created.connect(_add_query_hook, dispatch_uid='vleaks.profiling')
+    for connection in connections.all(initialized_only=True):
+        _add_query_hook(connection=connection)
+
+    from django.template.backends.django import Template
+    if not getattr(Template.render, 'profiled', False):
+        Template.render = _time_template_render(Template.render)
+
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        if not getattr(backend.get, 'profiled', False):
+            backend.get = _time_cache_read(backend.get, many=False)
+        if not getattr(backend.get_many, 'profiled', False):
+            backend.get_many = _time_cache_read(backend.get_many, many=True)
+
+
+# ============================================
+# MIDDLEWARE
+# ============================================
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.rate = settings.PROFILING_SAMPLE_RATE
+        if self.rate <= 0:
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if random.random() >= self.rate:
+            return self.get_response(request)
+
+        with profile_request() as profile:
+            start = time.perf_counter()
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+        # No request.user on page cache hits (answered before auth runs)
+        show = self.show_timing(getattr(request, 'user', None))
+        return self.report(request, response, profile, total, show)
+
+    async def __acall__(self, request):
+        if random.random() >= self.rate:
+            return await self.get_response(request)
+
+        with profile_request() as profile:
+            start = time.perf_counter()
+            response = await self.get_response(request)
+        total = time.perf_counter() - start
+        user = await request.auser() if hasattr(request, 'auser') else None
+        return self.report(request, response, profile, total, self.show_timing(user))
+
+    def show_timing(self, user):
+        return settings.DEBUG or bool(user and user.is_staff)
+
+    def report(self, request, response, profile, total, show_timing):
+        summary = profile.summary(total)
+        if show_timing:
+            response.headers['Server-Timing'] = server_timing(summary)
+        if summary['total_ms'] >= settings.PROFILING_SLOW_MS:
+            match = request.resolver_match
+            logger.warning(json.dumps({
+                'event': 'slow_request',
+                'method': request.method,
+                'path': request.path,
+                'view': match.view_name if match else None,
+                'status': response.status_code,
+                **{key: round(value, 2) for key, value in summary.items()},
+                'top_queries': profile.top_queries(),
+            }))
+        return response
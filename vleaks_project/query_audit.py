@@ -0,0 +1,152 @@
+# vleaks_project/query_audit.py
+"""
+N+1 query detection and per-URL query budgets.
+
+Every statement a request runs is reduced to a fingerprint (literals and
+placeholder lists collapsed), so "SELECT ... FROM auth_user WHERE id = 3"
+and "... id = 7" count as the same shape. A shape repeated
+NPLUSONE_THRESHOLD times or more in one request is almost always a lookup
+inside a template or Python loop.
+
+    QueryAuditMiddleware  development: logs repeated shapes to
+                          'vleaks.queries' (on with QUERY_AUDIT, which
+                          defaults to DEBUG)
+    QueryBudgetMixin      tests: each app's urls.py declares QUERY_BUDGETS
+                          {url name: max queries}; assertQueryBudget() fails
+                          a request that goes over, or repeats a shape
+
+Queries are recorded with execute_wrapper on the request thread's
+connections. Under ASGI the middleware uses the profiler's hooks instead
+(vleaks_project/profiling.py), which also see the queries async views hand
+to worker threads.
+"""
+
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import reverse
+
+from . import profiling
+
+logger = logging.getLogger('vleaks.queries')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LIST = re.compile(r'\((?:\s*(?:%s|\?|\$\d+)\s*,)*\s*(?:%s|\?|\$\d+)\s*\)')
+_SPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """SQL with literals replaced by ? and IN (...) lists collapsed"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _LIST.sub('(...)', sql.replace('%s', '?'))
+    return _SPACE.sub(' ', sql).strip()
+
+
+class QueryLog:
+    """Statements run on this thread while recording"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __len__(self):
+        return len(self.statements)
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements.append(sql)
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold=None):
+        """[(fingerprint, times)] for shapes run at least `threshold` times"""
+        threshold = threshold or settings.NPLUSONE_THRESHOLD
+        counts = Counter(fingerprint(sql) for sql in self.statements)
+        return [(shape, n) for shape, n in counts.most_common() if n >= threshold]
+
+
+@contextmanager
+def record_queries():
+    """Collect every statement run on this thread's connections"""
+    log = QueryLog()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(log))
+        yield log
+
+
+# ============================================
+# DEVELOPMENT MIDDLEWARE
+# ============================================
+
+class QueryAuditMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_AUDIT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            profiling.install()
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with record_queries() as log:
+            response = self.get_response(request)
+        self.report(request, log)
+        return response
+
+    async def __acall__(self, request):
+        with profiling.profile_request() as profile:
+            response = await self.get_response(request)
+        log = QueryLog()
+        log.statements = [sql for sql, _ in profile.queries]
+        self.report(request, log)
+        return response
+
+    def report(self, request, log):
+        for shape, times in log.repeated():
+            logger.warning(
+                'Possible N+1 on %s %s: %d x %s (%d queries in total)',
+                request.method, request.path, times, shape[:300], len(log),
+            )
+
+
+# ============================================
+# TESTS
+# ============================================
+
+class QueryBudgetMixin:
+    """
+    For django.test.TestCase subclasses:
+
+        self.assertQueryBudget(blog.urls.QUERY_BUDGETS, 'blog_detail', [post.pk])
+    """
+
+    def assertQueryBudget(self, budgets, name, args=(), method='get', **extra):
+        self.assertIn(name, budgets, f'{name} has no entry in QUERY_BUDGETS')
+        url = reverse(name, args=args)
+        with record_queries() as log:
+            response = getattr(self.client, method)(url, **extra)
+        self.assertLess(response.status_code, 500, url)
+        self.assertLessEqual(
+            len(log), budgets[name],
+            f'{url} ran {len(log)} queries, budget is {budgets[name]}:\n'
+            + '\n'.join(log.statements),
+        )
+        repeated = log.repeated()
+        self.assertFalse(
+            repeated,
+            f'{url} repeats query shapes (N+1?):\n'
+            + '\n'.join(f'{n} x {shape}' for shape, n in repeated),
+        )
+        return response
@@ -41,10 +41,15 @@ INSTALLED_APPS = [
     'django.contrib.humanize',  
     "blog",
     "writer",      # ← ADD THIS LINE!
+    "jobs",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "vleaks_project.profiling.ProfilingMiddleware",
+    "vleaks_project.metrics.MetricsMiddleware",
+    "blog.page_cache.PageCacheMiddleware",
+    "vleaks_project.query_audit.QueryAuditMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -145,6 +150,17 @@ STATICFILES_DIRS = [
 # Where collectstatic puts files for production
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# collectstatic also builds hashed WebP/AVIF/JPEG copies of the hero PNGs
+# (blog/static_images.py). Serve STATIC_ROOT/images/derived/ with
+# "Cache-Control: public, max-age=31536000, immutable".
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "blog.static_images.HeroImageStorage"},
+}
+# {% hero_image %} uses those copies; off by default in DEBUG, where
+# runserver serves static/ directly and the copies don't exist
+STATIC_IMAGE_VARIANTS = config('STATIC_IMAGE_VARIANTS', default=not DEBUG, cast=bool)
+
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -161,6 +177,86 @@ MESSAGE_TAGS = {
 LOGIN_URL = 'writer_login'  # ← ADD THIS!
 
 
+# ============================================
+# CACHE
+# ============================================
+# Local memory by default. Point this at Memcached/Redis to share the
+# cache (and the 'cache' view counter backend) between worker processes;
+# `check --deploy` warns while it is per process (blog/checks.py).
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND',
+                          default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='vleaks'),
+    }
+}
+
+
+# ============================================
+# VIEW COUNTER (blog/view_counter.py)
+# ============================================
+# 'local' buffers views per process, 'cache' buffers them in the shared cache
+# (a LocMem CACHE_BACKEND is rejected by the system checks)
+VIEW_COUNTER_BACKEND = config('VIEW_COUNTER_BACKEND', default='local')
+# Seconds between batched writes (0 = write every view immediately)
+VIEW_COUNTER_FLUSH_INTERVAL = config('VIEW_COUNTER_FLUSH_INTERVAL', default=30, cast=int)
+# Max buffered views before a flush is forced (upper bound on views lost in a crash)
+VIEW_COUNTER_MAX_PENDING = config('VIEW_COUNTER_MAX_PENDING', default=1000, cast=int)
+# Run the flusher thread inside web processes. Turn off when a separate
+# `manage.py flush_view_counts --loop` process does the flushing.
+VIEW_COUNTER_BACKGROUND_FLUSH = config('VIEW_COUNTER_BACKGROUND_FLUSH', default=True, cast=bool)
+# Tests never flush their buffered views into the real database
+TEST_RUNNER = 'vleaks_project.test_runner.VleaksTestRunner'
+
+
+# ============================================
+# PAGE CACHE (blog/page_cache.py)
+# ============================================
+# Seconds an anonymous page is served from the cache (0 = off). Edits purge
+# their pages right away; view counts and trending are this stale at most.
+PAGE_CACHE_TIMEOUT = config('PAGE_CACHE_TIMEOUT', default=60, cast=int)
+
+
+# ============================================
+# ASYNC VIEWS (blog/async_views.py)
+# ============================================
+# Serve home, blog list and article pages from async views. asgi.py turns
+# this on; under WSGI the sync views are faster.
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
+
+# ============================================
+# PROFILING (vleaks_project/profiling.py)
+# ============================================
+# Share of requests profiled, 0.0-1.0 (0 = middleware off). Profiled
+# responses carry a Server-Timing header with DEBUG or for staff users.
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+# Profiled requests slower than this (ms) are logged to 'vleaks.profiling'
+PROFILING_SLOW_MS = config('PROFILING_SLOW_MS', default=500, cast=int)
+
+
+# ============================================
+# N+1 DETECTION (vleaks_project/query_audit.py)
+# ============================================
+# Log query shapes a request repeats NPLUSONE_THRESHOLD+ times
+QUERY_AUDIT = config('QUERY_AUDIT', default=DEBUG, cast=bool)
+NPLUSONE_THRESHOLD = config('NPLUSONE_THRESHOLD', default=3, cast=int)
+
+
+# ============================================
+# METRICS (vleaks_project/metrics.py)
+# ============================================
+# Record request metrics and serve them at /metrics
+METRICS_ENABLED = config('METRICS_ENABLED', default=False, cast=bool)
+# /metrics requires "Authorization: Bearer <token>"; without a token it is
+# only served with DEBUG (it shows per-view latency and DB timings)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+# Each worker process writes its numbers here for /metrics to add up
+METRICS_DIR = config('METRICS_DIR', default=str(BASE_DIR / 'var' / 'metrics'))
+# Seconds between a worker's writes (how far behind /metrics can be)
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5, cast=int)
+
+
 
 
 
@@ -216,5 +312,17 @@ if not DEBUG:
     CSRF_COOKIE_SAMESITE = 'Lax'      # Prevent CSRF
 
 
+# ============================================
+# BACKGROUND JOBS (jobs app)
+# ============================================
+# Run tasks right after commit instead of queueing them for
+# `manage.py run_jobs`. Off by default, development included: image
+# variants and the related-articles rebuild would then slow every save.
+JOBS_EAGER = config('JOBS_EAGER', default=False, cast=bool)
 
 
+# ============================================
+# RELATED ARTICLES (blog/related.py)
+# ============================================
+# Saved TF-IDF model, so updates after an edit don't re-read every article
+RELATED_INDEX_PATH = config('RELATED_INDEX_PATH', default=str(BASE_DIR / 'var' / 'related_index.npz'))
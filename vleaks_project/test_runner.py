@@ -0,0 +1,27 @@
+# vleaks_project/test_runner.py
+"""
+Test runner (settings.TEST_RUNNER).
+
+Views the tests count are buffered by blog/view_counter.py. The runner
+keeps the flusher thread from starting and drops whatever is still
+buffered once the test databases are gone, so nothing is written to the
+real database after the run.
+"""
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class VleaksTestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._no_flusher = override_settings(VIEW_COUNTER_BACKGROUND_FLUSH=False)
+        self._no_flusher.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        from blog import view_counter
+
+        view_counter.discard()
+        self._no_flusher.disable()
+        super().teardown_test_environment(**kwargs)
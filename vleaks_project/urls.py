@@ -4,10 +4,13 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('blog.urls')),       # Blog URLs (home, blog/, etc.)
     path('writer/', include('writer.urls')),  # ← ADD THIS LINE!
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -1,3 +1,138 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from io import BytesIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from PIL import Image
+
+from blog.models import BlogPost, Category
+from vleaks_project.query_audit import QueryBudgetMixin
+
+from . import uploadhandlers, urls
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Writer pages stay within writer.urls.QUERY_BUDGETS whatever the row count"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.writer = User.objects.create_user('writer', password='x')
+        category = Category.objects.create(name='Category', slug='category')
+        cls.posts = [
+            BlogPost.objects.create(
+                title=f'Article {i}', slug=f'article-{i}', content=f'<p>Body {i}</p>',
+                author=cls.writer, category=category,
+                status='published' if i % 2 else 'draft',
+            )
+            for i in range(6)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.writer)
+
+    def assertBudget(self, name, args=(), **extra):
+        return self.assertQueryBudget(urls.QUERY_BUDGETS, name, args, **extra)
+
+    def test_every_url_has_a_budget(self):
+        names = {p.name for p in get_resolver(urls).url_patterns if p.name}
+        self.assertEqual(names, set(urls.QUERY_BUDGETS))
+
+    def test_writer_dashboard(self):
+        self.assertBudget('writer_dashboard')
+
+    def test_writer_login(self):
+        self.client.logout()
+        self.assertBudget('writer_login')
+
+    def test_writer_register(self):
+        self.client.logout()
+        self.assertBudget('writer_register')
+
+    def test_writer_logout(self):
+        self.assertBudget('writer_logout')
+
+    def test_profile_settings(self):
+        self.assertBudget('profile_settings')
+
+    def test_create_article(self):
+        self.assertBudget('create_article')
+
+    def test_preview_article(self):
+        self.assertBudget('preview_article', [self.posts[0].pk])
+
+    def test_edit_article(self):
+        self.assertBudget('edit_article', [self.posts[0].pk])
+
+    def test_delete_article(self):
+        self.assertBudget('delete_article', [self.posts[0].pk])
+
+
+class ImageUploadTests(TestCase):
+    """ImageUploadHandler and the CSRF check @image_uploads moves into the view"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.writer = User.objects.create_user('writer', password='x')
+        cls.category = Category.objects.create(name='Category', slug='category')
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.client.force_login(self.writer)
+
+    def create(self, data, client=None, **extra):
+        fields = {'title': 'Cover', 'slug': 'cover', 'category': self.category.pk,
+                  'content': '<p>x</p>', 'status': 'draft', **data}
+        return (client or self.client).post(reverse('create_article'), fields, **extra)
+
+    def png(self, name='cover.png'):
+        buffer = BytesIO()
+        Image.new('RGB', (40, 30), (200, 0, 0)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_valid_png_is_saved(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.create({'image': self.png()})
+        # Saved once: no second UPDATE re-running sanitizing, indexing and jobs
+        self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE "blog_blogpost"')])
+        self.assertRedirects(response, reverse('writer_dashboard'), fetch_redirect_response=False)
+        article = BlogPost.objects.get(slug='cover')
+        self.assertTrue(article.image.name.endswith('.png'))
+        self.assertEqual((article.image.width, article.image.height), (40, 30))
+
+    def test_bad_signature_is_rejected(self):
+        upload = SimpleUploadedFile('cover.png', b'<?php echo 1; ?>', content_type='image/png')
+        response = self.create({'image': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'not a JPEG, PNG, GIF or WebP')
+        self.assertFalse(BlogPost.objects.filter(slug='cover').exists())
+
+    def test_image_over_5mb_is_rejected(self):
+        upload = SimpleUploadedFile(
+            'cover.png', b'\x89PNG\r\n\x1a\n' + bytes(uploadhandlers.MAX_IMAGE_SIZE),
+            content_type='image/png',
+        )
+        response = self.create({'image': upload})
+        self.assertContains(response, 'Maximum size is 5MB')
+        self.assertFalse(BlogPost.objects.filter(slug='cover').exists())
+
+    def test_oversized_body_is_refused_unread(self):
+        response = self.create({'image': self.png()},
+                               CONTENT_LENGTH=uploadhandlers.MAX_REQUEST_SIZE + 1)
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(BlogPost.objects.filter(slug='cover').exists())
+
+    def test_missing_csrf_token_is_403(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.writer)
+        response = self.create({'image': self.png()}, client=client)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(BlogPost.objects.filter(slug='cover').exists())
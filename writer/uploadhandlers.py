@@ -0,0 +1,146 @@
+# writer/uploadhandlers.py
+"""
+Upload handling for the writer's image fields (article cover, avatar).
+
+Django's default handlers buffer a whole upload (in memory up to 2.5MB,
+then in a temp file) before the view can look at it. ImageUploadHandler
+checks as the bytes arrive instead:
+
+    1. the first chunk must start with a known image signature,
+    2. the stream is dropped as soon as it passes MAX_IMAGE_SIZE,
+    3. once complete, Pillow parses the header (format, dimensions)
+       before the file is handed to the view and storage.
+
+A rejected file is skipped (the rest of the form is still parsed) and the
+reason is left in request.rejected_uploads[field_name] for the view. The
+parser still reads a skipped file's remaining bytes off the socket, just
+without keeping them, so a request whose Content-Length already rules out
+a valid upload (MAX_REQUEST_SIZE) is refused with a 413 before any of it
+is read.
+
+Views opt in with @image_uploads, which must be applied before anything
+reads request.POST (so before CSRF checking, see the decorator).
+"""
+
+import io
+from functools import wraps
+
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image, UnidentifiedImageError
+
+MAX_IMAGE_SIZE = 5 * 1024 * 1024  # 5MB
+# The image plus the form's text fields and multipart framing
+MAX_REQUEST_SIZE = MAX_IMAGE_SIZE + 3 * 1024 * 1024
+# Larger images are refused before decoding (decompression bombs)
+MAX_IMAGE_PIXELS = 40_000_000
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+
+
+def validate_image_magic_bytes(file):
+
+    # Read first 8 bytes
+    file.seek(0)
+    header = file.read(8)
+    file.seek(0)  # Reset for later use
+
+    # Magic bytes for common image formats
+    signatures = {
+        b'\xff\xd8\xff': 'JPEG',
+        b'\x89PNG\r\n\x1a\n': 'PNG',
+        b'GIF87a': 'GIF',
+        b'GIF89a': 'GIF',
+        b'RIFF': 'WebP',  # WebP starts with RIFF
+    }
+
+    for magic, format_name in signatures.items():
+        if header.startswith(magic):
+            return True, format_name
+
+    return False, 'Unknown format'
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """Validate image uploads while streaming; keeps accepted files in memory"""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = io.BytesIO()
+        self.received = 0
+
+    def reject(self, message):
+        self.request.rejected_uploads[self.field_name] = message
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0:
+            is_valid, _ = validate_image_magic_bytes(io.BytesIO(raw_data))
+            if not is_valid:
+                self.reject('Invalid image! The file is not a JPEG, PNG, GIF or WebP image.')
+                raise SkipFile()
+
+        self.received += len(raw_data)
+        if self.received > MAX_IMAGE_SIZE:
+            self.reject('Image too large! Maximum size is 5MB.')
+            raise SkipFile()  # the parser reads the rest of this file and drops it
+
+        self.file.write(raw_data)
+        return None  # consumed: later handlers never see the data
+
+    def file_complete(self, file_size):
+        """Return the file, or None (left out of request.FILES) if rejected"""
+        self.file.seek(0)
+        try:
+            # Image.open only parses the header; pixels are not decoded
+            image = Image.open(self.file)
+            image_format, (width, height) = image.format, image.size
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError):
+            return self.reject('Invalid image! The file could not be read as an image.')
+        if image_format not in ALLOWED_FORMATS:
+            return self.reject('Invalid image format! Allowed: JPEG, PNG, GIF, WebP.')
+        if width * height > MAX_IMAGE_PIXELS:
+            return self.reject(f'Image dimensions too large ({width}x{height}).')
+
+        self.file.seek(0)
+        return InMemoryUploadedFile(
+            file=self.file,
+            field_name=self.field_name,
+            name=self.file_name,
+            # Trust what Pillow found, not the client's Content-Type
+            content_type=Image.MIME[image_format],
+            size=file_size,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+        )
+
+
+def image_uploads(view):
+    """
+    Parse this view's uploads with ImageUploadHandler.
+
+    Upload handlers can't be changed once request.POST has been read, and
+    CsrfViewMiddleware reads it before the view runs. So the view is marked
+    csrf_exempt for the middleware and the CSRF check is run here instead,
+    after the handler is installed.
+
+    Bodies over MAX_REQUEST_SIZE get a 413 without being parsed.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length > MAX_REQUEST_SIZE:
+            return HttpResponse(
+                'Upload too large! Maximum image size is 5MB.\n',
+                status=413, content_type='text/plain',
+            )
+        request.upload_handlers = [ImageUploadHandler(request)]
+        request.rejected_uploads = {}
+        return protected(request, *args, **kwargs)
+    return wrapper
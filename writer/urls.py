@@ -17,6 +17,15 @@ urlpatterns = [
     path('edit/<int:article_id>/', views.edit_article, name='edit_article'),  # ← ADD!
 ]
 
-
-
-
+# Max queries per request, enforced by the tests (vleaks_project/query_audit.py)
+QUERY_BUDGETS = {
+    'writer_dashboard': 5,
+    'writer_login': 0,
+    'writer_register': 0,
+    'writer_logout': 4,
+    'profile_settings': 4,
+    'create_article': 4,
+    'preview_article': 4,
+    'delete_article': 14,  # signals: counters, search index, page cache, job queue
+    'edit_article': 5,
+}
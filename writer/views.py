@@ -4,11 +4,17 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import Count, Q, Sum
 from blog.models import BlogPost, Category  
+from blog.pagination import KeysetPaginator
 from writer.models import Profile  
+from jobs.tasks import enqueue
+from writer.uploadhandlers import image_uploads
 import os 
 
+DASHBOARD_ARTICLES_PER_PAGE = 20
+
 
 def validate_image(file):
 
@@ -129,26 +135,23 @@ def dashboard(request):
     # Get this writer's articles
     articles = BlogPost.objects.filter(
         author=request.user
-    ).order_by('-created_at')    
-    # Count published articles
-    published_count = BlogPost.objects.filter(
-        author=request.user,
-        status='published'
-    ).count()    
-    # Count draft articles
-    draft_count = BlogPost.objects.filter(
-        author=request.user,
-        status='draft'
-    ).count()    
-    # Sum total views
-    total_views = BlogPost.objects.filter(
-        author=request.user
-    ).aggregate(Sum('views'))['views__sum'] or 0    
+    ).for_cards()
+    # All stats in one pass over the author's rows
+    stats = articles.aggregate(
+        article_count=Count('id'),
+        published_count=Count('id', filter=Q(status='published')),
+        draft_count=Count('id', filter=Q(status='draft')),
+        total_views=Sum('views'),
+    )
+    paginator = KeysetPaginator(
+        articles, DASHBOARD_ARTICLES_PER_PAGE, count=lambda: stats['article_count']
+    )
     context = {
-        'articles': articles,
-        'published_count': published_count,
-        'draft_count': draft_count,
-        'total_views': total_views,
+        'articles': paginator.get_page(request.GET.get('cursor')),
+        'article_count': stats['article_count'],
+        'published_count': stats['published_count'],
+        'draft_count': stats['draft_count'],
+        'total_views': stats['total_views'] or 0,
     }
     return render(request, 'writer/dashboard.html', context)
 
@@ -177,13 +180,17 @@ def writer_logout(request):
 
 
 @login_required
+@image_uploads
 def profile_settings(request):
     """Handle profile settings and avatar upload""" 
        
     # Get or create profile for current user
     profile, created = Profile.objects.get_or_create(user=request.user)    
     if request.method == 'POST':
-        # Handle avatar upload
+        # Handle avatar upload (already checked by ImageUploadHandler)
+        if 'avatar' in request.rejected_uploads:
+            messages.error(request, request.rejected_uploads['avatar'])
+            return redirect('profile_settings')
         if 'avatar' in request.FILES:
             profile.avatar = request.FILES['avatar']
         
@@ -202,6 +209,7 @@ def profile_settings(request):
 
 
 @login_required
+@image_uploads
 def create_article(request):    
     if request.method == 'POST':
         # Extract form data
@@ -216,36 +224,34 @@ def create_article(request):
         
         # === Validate image if uploaded ===
         image_file = None
-        if 'image' in request.FILES:
+        # Rejected while streaming (bad signature, over 5MB, unreadable)
+        error_message = request.rejected_uploads.get('image')
+        if not error_message and 'image' in request.FILES:
             image_file = request.FILES['image']
             is_valid, error_message = validate_image(image_file)            
-            if not is_valid:
-                messages.error(request, error_message)
-                # Return to form with data preserved
-                categories = Category.objects.all().order_by('name')
-                
-                return render(request, 'writer/create_article.html', {
-                    'categories': categories,
-                    'title': title,
-                    'slug': slug,
-                    'content': content,
-                    'selected_category': category_id,
-                })
+        if error_message:
+            messages.error(request, error_message)
+            # Return to form with data preserved
+            categories = Category.objects.all().order_by('name')
+            
+            return render(request, 'writer/create_article.html', {
+                'categories': categories,
+                'title': title,
+                'slug': slug,
+                'content': content,
+                'selected_category': category_id,
+            })
         
-        # Create the article (without image first)
-        article = BlogPost.objects.create(
+        # One save: sanitizing, search indexing and jobs run once
+        BlogPost.objects.create(
             title=title,
             slug=slug,
             category_id=category_id,
             content=content,
             author=request.user,
-            status=status
-        )        
-       
-        # Save valid image
-        if image_file:
-            article.image = image_file
-            article.save()
+            status=status,
+            image=image_file,
+        )
         
         # Success message
         if status == 'published':
@@ -283,34 +289,12 @@ def generate_slug(title):
 
 
 
-def validate_image_magic_bytes(file):
-        
-    # Read first 8 bytes
-    file.seek(0)
-    header = file.read(8)
-    file.seek(0)  # Reset for later use
-    
-    # Magic bytes for common image formats
-    signatures = {
-        b'\xff\xd8\xff': 'JPEG',
-        b'\x89PNG\r\n\x1a\n': 'PNG',
-        b'GIF87a': 'GIF',
-        b'GIF89a': 'GIF',
-        b'RIFF': 'WebP',  # WebP starts with RIFF
-    }
-    
-    for magic, format_name in signatures.items():
-        if header.startswith(magic):
-            return True, format_name
-    
-    return False, 'Unknown format'
-
-
-
 @login_required
 def preview_article(request, article_id):    
     # Get article or 404
-    article = get_object_or_404(BlogPost, id=article_id)
+    article = get_object_or_404(
+        BlogPost.objects.select_related('author', 'category'), id=article_id
+    )
     
     # Only allow author to preview their own articles
     if article.author != request.user:
@@ -327,7 +311,9 @@ def preview_article(request, article_id):
 @login_required
 def delete_article(request, article_id):    
     # Get the article or 404
-    article = get_object_or_404(BlogPost, id=article_id)
+    article = get_object_or_404(
+        BlogPost.objects.select_related('author', 'category'), id=article_id
+    )
     
     # Security check: Only author can delete their own articles!
     if article.author != request.user:
@@ -349,9 +335,12 @@ def delete_article(request, article_id):
 
 
 @login_required
+@image_uploads
 def edit_article(request, article_id):
     # Get the article or 404
-    article = get_object_or_404(BlogPost, id=article_id)    
+    article = get_object_or_404(
+        BlogPost.objects.select_related('author', 'category'), id=article_id
+    )
     # Security check: Only author can edit their own articles
     if article.author != request.user:
         messages.error(request, "You can only edit your own articles!")
@@ -383,7 +372,9 @@ def edit_article(request, article_id):
         # VALIDATE IMAGE (if uploaded)
         # ========================================
         new_image = None
-        if 'image' in request.FILES:
+        if 'image' in request.rejected_uploads:
+            errors.append(request.rejected_uploads['image'])
+        elif 'image' in request.FILES:
             new_image = request.FILES['image']
             is_valid, error_message = validate_image(new_image)
             
@@ -421,12 +412,10 @@ def edit_article(request, article_id):
         # ========================================
         # UPDATE IMAGE (if new one uploaded)
         # ========================================
+        old_image_name = None
         if new_image:
-            # Optional: Delete old image file to save space
-            if article.image:
-                old_image_path = article.image.path
-                if os.path.exists(old_image_path):
-                    os.remove(old_image_path)
+            # Old file is deleted by the job worker once the save commits
+            old_image_name = article.image.name
             
             # Set new image
             article.image = new_image        
@@ -434,7 +423,10 @@ def edit_article(request, article_id):
         # ========================================
         # SAVE CHANGES
         # ========================================
-        article.save()
+        with transaction.atomic():
+            article.save()
+            if old_image_name:
+                enqueue('blog.delete_files', paths=[old_image_name])
         
         # Success message
         if new_image: